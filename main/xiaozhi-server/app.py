@@ -1,4 +1,5 @@
 import sys
+import time
 import uuid
 import signal
 import asyncio
@@ -10,6 +11,15 @@ from core.http_server import SimpleHttpServer
 from core.websocket_server import WebSocketServer
 from core.utils.util import check_ffmpeg_installed
 from core.utils.gc_manager import get_gc_manager
+from core.utils.worker_pool import get_worker_pool
+from core.utils.ws_pool import get_pool_summary
+from core.utils.model_server import model_server_active, run_model_server
+from core.utils.worker_supervisor import (
+    WorkerSupervisor,
+    get_worker_count,
+    read_process_stats,
+    reuse_port_supported,
+)
 
 TAG = __name__
 logger = setup_logging()
@@ -43,8 +53,8 @@ async def monitor_stdin():
         await ainput()  # Chờ đầu vào bất đồng bộ, tiêu thụ phím Enter
 
 
-async def main():
-    check_ffmpeg_installed()
+def prepare_config():
+    """Đọc và chuẩn bị cấu hình ở tiến trình chính (dùng chung cho mọi worker trong chế độ đa process)"""
     config = load_config()
 
     # Thứ tự ưu tiên auth_key: server.auth_key trong config > manager-api.secret > tự động tạo
@@ -61,20 +71,22 @@ async def main():
     
     config["server"]["auth_key"] = auth_key
 
-    # Thêm task giám sát stdin
-    stdin_task = asyncio.create_task(monitor_stdin())
+    mcp_endpoint = config.get("mcp_endpoint", None)
+    if mcp_endpoint is not None and "你" not in mcp_endpoint:
+        # Kiểm tra định dạng điểm truy cập MCP
+        if validate_mcp_endpoint(mcp_endpoint):
+            logger.bind(tag=TAG).info("Điểm truy cập mcp là\t{}", mcp_endpoint)
+            # Chuyển địa chỉ điểm truy cập mcp thành điểm gọi
+            mcp_endpoint = mcp_endpoint.replace("/mcp/", "/call/")
+            config["mcp_endpoint"] = mcp_endpoint
+        else:
+            logger.bind(tag=TAG).error("Điểm truy cập mcp không đúng định dạng")
+            config["mcp_endpoint"] = "địa chỉ websocket điểm truy cập của bạn"
 
-    # Khởi động trình quản lý GC toàn cục (dọn dẹp mỗi 5 phút)
-    gc_manager = get_gc_manager(interval_seconds=300)
-    await gc_manager.start()
+    return config
 
-    # Khởi động WebSocket server
-    ws_server = WebSocketServer(config)
-    ws_task = asyncio.create_task(ws_server.start())
-    # Khởi động Simple http server
-    ota_server = SimpleHttpServer(config)
-    ota_task = asyncio.create_task(ota_server.start())
 
+def log_server_addresses(config):
     read_config_from_api = config.get("read_config_from_api", False)
     port = int(config["server"].get("http_port", 8003))
     if not read_config_from_api:
@@ -88,18 +100,6 @@ async def main():
         get_local_ip(),
         port,
     )
-    mcp_endpoint = config.get("mcp_endpoint", None)
-    if mcp_endpoint is not None and "你" not in mcp_endpoint:
-        # Kiểm tra định dạng điểm truy cập MCP
-        if validate_mcp_endpoint(mcp_endpoint):
-            logger.bind(tag=TAG).info("Điểm truy cập mcp là\t{}", mcp_endpoint)
-            # Chuyển địa chỉ điểm truy cập mcp thành điểm gọi
-            mcp_endpoint = mcp_endpoint.replace("/mcp/", "/call/")
-            config["mcp_endpoint"] = mcp_endpoint
-        else:
-            logger.bind(tag=TAG).error("Điểm truy cập mcp không đúng định dạng")
-            config["mcp_endpoint"] = "địa chỉ websocket điểm truy cập của bạn"
-
     # Lấy cấu hình WebSocket, sử dụng giá trị mặc định an toàn
     websocket_port = 8000
     server_config = config.get("server", {})
@@ -122,6 +122,67 @@ async def main():
         "=============================================================\n"
     )
 
+
+async def report_worker_stats(worker_id, config, ws_server, stats_queue, interval):
+    """Gửi thống kê của worker cho tiến trình giám sát theo chu kỳ"""
+    while True:
+        stats = read_process_stats()
+        pool_stats = get_worker_pool(config).get_stats()
+        ws_pool_stats = get_pool_summary()
+        try:
+            stats_queue.put_nowait(
+                {
+                    "worker": worker_id,
+                    "connections": ws_server.active_connections,
+                    "threads": stats["threads"],
+                    "rss_mb": stats["rss_mb"],
+                    "pool_threads": pool_stats["threads"],
+                    "pool_pending": pool_stats["pending"],
+                    "rejected": ws_server.admission.rejected_total(),
+                    "ws_pool_hits": ws_pool_stats["hits"],
+                    "ws_pool_misses": ws_pool_stats["misses"],
+                    "ws_pool_hit_rate": ws_pool_stats["hit_rate"],
+                    "time": time.time(),
+                }
+            )
+        except Exception:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def serve(config, worker_id=None, stats_queue=None):
+    """Chạy WebSocket server và HTTP server trong process hiện tại cho đến khi nhận tín hiệu thoát"""
+    is_worker = worker_id is not None
+    # Chế độ đơn process mới giám sát stdin, worker không gắn với terminal
+    stdin_task = None if is_worker else asyncio.create_task(monitor_stdin())
+
+    # Khởi động trình quản lý GC toàn cục (dọn dẹp mỗi 5 phút)
+    gc_manager = get_gc_manager(interval_seconds=300)
+    await gc_manager.start()
+
+    # Khởi động WebSocket server
+    ws_server = WebSocketServer(config)
+    ws_task = asyncio.create_task(ws_server.start())
+    # Khởi động Simple http server
+    ota_server = SimpleHttpServer(config)
+    ota_task = asyncio.create_task(ota_server.start())
+
+    stats_task = None
+    if is_worker and stats_queue is not None:
+        interval = float(config["server"].get("worker_stats_interval", 60) or 0)
+        if interval > 0:
+            # Gửi thống kê thường xuyên hơn chu kỳ ghi log để tiến trình chính luôn có số liệu mới
+            stats_task = asyncio.create_task(
+                report_worker_stats(
+                    worker_id, config, ws_server, stats_queue, max(1.0, interval / 2)
+                )
+            )
+
+    if is_worker:
+        logger.bind(tag=TAG).info(f"Worker {worker_id} sẵn sàng nhận kết nối")
+    else:
+        log_server_addresses(config)
+
     try:
         await wait_for_exit()  # Chặn cho đến khi nhận được tín hiệu thoát
     except asyncio.CancelledError:
@@ -131,22 +192,49 @@ async def main():
         await gc_manager.stop()
 
         # Hủy tất cả task (điểm sửa lỗi quan trọng)
-        stdin_task.cancel()
-        ws_task.cancel()
-        if ota_task:
-            ota_task.cancel()
+        tasks = [t for t in (stdin_task, stats_task, ws_task, ota_task) if t]
+        for task in tasks:
+            task.cancel()
 
         # Chờ task kết thúc (phải thêm timeout)
         await asyncio.wait(
-            [stdin_task, ws_task, ota_task] if ota_task else [stdin_task, ws_task],
+            tasks,
             timeout=3.0,
             return_when=asyncio.ALL_COMPLETED,
         )
         print("Server đã đóng, chương trình thoát.")
 
 
+def run_worker(worker_id, config, stats_queue):
+    """Điểm vào của worker process (chế độ đa process)"""
+    try:
+        asyncio.run(serve(config, worker_id, stats_queue))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    check_ffmpeg_installed()
+    config = prepare_config()
+
+    workers = get_worker_count(config)
+    if workers > 1:
+        if reuse_port_supported():
+            config["server"]["reuse_port"] = True
+            log_server_addresses(config)
+            services = {}
+            if model_server_active(config):
+                services["model-server"] = run_model_server
+            WorkerSupervisor(config, workers, run_worker, services).run()
+            return
+        logger.bind(tag=TAG).warning(
+            "Hệ điều hành không hỗ trợ SO_REUSEPORT, chạy ở chế độ một process"
+        )
+    asyncio.run(serve(config))
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except KeyboardInterrupt:
         print("Ngắt thủ công, chương trình kết thúc.")
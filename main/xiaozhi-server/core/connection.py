@@ -26,10 +26,11 @@ from core.utils.modules_initialize import (
 )
 from core.handle.reportHandle import report
 from core.providers.tts.default import DefaultTTS
-from concurrent.futures import ThreadPoolExecutor
 from core.utils.dialogue import Message, Dialogue
 from core.providers.asr.dto.dto import InterfaceType
+from core.providers.asr.speculative import speculative_stats
 from core.handle.textHandle import handleTextMessage
+from core.handle.sendAudioHandle import AUDIO_FRAME_DURATION
 from core.providers.tools.unified_tool_handler import UnifiedToolHandler
 from plugins_func.loadplugins import auto_import_modules
 from plugins_func.register import Action
@@ -40,6 +41,17 @@ from config.logger import setup_logging, build_module_string, create_connection_
 from config.manage_api_client import DeviceNotFoundException, DeviceBindException
 from core.utils.prompt_manager import PromptManager
 from core.utils.voiceprint_provider import VoiceprintProvider
+from core.utils.audio_ring_buffer import PcmRingBuffer, FrameRingBuffer
+from core.utils.loop_queue import LoopQueue
+from core.utils.worker_pool import get_llm_pool, get_worker_pool, run_in_worker_loop
+from core.utils.worker_supervisor import request_supervisor_restart, running_as_worker
+from core.utils.provider_scheduler import (
+    PRIORITY_FIRST,
+    PRIORITY_NORMAL,
+    get_provider_scheduler,
+    limit_stream,
+    limit_async_stream,
+)
 from core.utils.util import get_system_error_response
 from core.utils import textUtils
 
@@ -53,6 +65,28 @@ class TTSException(RuntimeError):
     pass
 
 
+class ChatStreamState:
+    """Trạng thái xử lý phản hồi streaming của một lượt gọi LLM"""
+
+    __slots__ = (
+        "tool_call_flag",
+        "tool_calls_list",
+        "content_arguments",
+        "emotion_flag",
+        "response_message",
+        "response_received",
+    )
+
+    def __init__(self):
+        self.tool_call_flag = False
+        # Hỗ trợ nhiều gọi công cụ song song - sử dụng danh sách lưu trữ
+        self.tool_calls_list = []  # Định dạng: [{"id": "", "name": "", "arguments": ""}]
+        self.content_arguments = ""
+        self.emotion_flag = True
+        self.response_message = []
+        self.response_received = False  # Đánh dấu đã nhận được phản hồi từ LLM
+
+
 class ConnectionHandler:
     def __init__(
         self,
@@ -97,11 +131,14 @@ class ConnectionHandler:
         # Nhiệm vụ thread liên quan
         self.loop = None  # Lấy event loop đang chạy trong handle_connection
         self.stop_event = threading.Event()
-        self.executor = ThreadPoolExecutor(max_workers=5)
-
-        # Thêm thread pool báo cáo
-        self.report_queue = queue.Queue()
-        self.report_thread = None
+        # Việc chặn của kết nối được gửi vào thread pool dùng chung của process (chia lượt công bằng giữa các kết nối)
+        self.executor = get_worker_pool(self.config).executor_for()
+        # Lượt LLM đồng bộ giữ thread suốt thời gian trả lời, chạy trong pool riêng
+        self.llm_executor = get_llm_pool(self.config).executor_for()
+
+        # Hàng đợi báo cáo, được xử lý bởi task trên event loop của kết nối
+        self.report_queue = LoopQueue()
+        self.report_task = None
         # Trong tương lai có thể điều chỉnh báo cáo ASR và TTS bằng cách sửa đổi ở đây, hiện tại mặc định đều bật
         self.report_asr_enable = self.read_config_from_api
         self.report_tts_enable = self.read_config_from_api
@@ -120,7 +157,7 @@ class ConnectionHandler:
         self.voiceprint_provider = None
 
         # Biến liên quan đến VAD
-        self.client_audio_buffer = bytearray()
+        self.client_audio_buffer = PcmRingBuffer()
         self.client_have_voice = False
         self.client_voice_window = deque(maxlen=5)
         self.first_activity_time = 0.0  # Ghi lại thời gian hoạt động đầu tiên (mili giây)
@@ -131,13 +168,25 @@ class ConnectionHandler:
         # Biến liên quan đến ASR
         # Vì khi triển khai thực tế có thể sử dụng ASR local công cộng, không thể để biến lộ ra cho ASR công cộng
         # Nên các biến liên quan đến ASR cần được định nghĩa ở đây, thuộc về biến riêng của connection
-        self.asr_audio = []
-        self.asr_audio_queue = queue.Queue()
+        # Có giới hạn theo asr_max_utterance_s (tính theo frame 60ms), khi quá thì bỏ các frame cũ nhất
+        self.asr_buffer_frames = self._asr_buffer_frames()
+        self.asr_audio = deque(maxlen=self.asr_buffer_frames)
+        # PCM đã giải mã của từng gói trong asr_audio (giải mã một lần, dùng chung cho VAD/ASR/nhận dạng giọng nói/báo cáo)
+        self.asr_pcm = deque(maxlen=self.asr_buffer_frames)
+        # Pre-roll: vài frame gần nhất trước khi có giọng nói, lưu trong bộ đệm vòng cố định
+        self.asr_preroll = FrameRingBuffer(capacity=10)
+        # Nhận dạng suy đoán đang chạy (speculative_asr)
+        self.asr_speculation = None
+        self.opus_decoder = None
+        self.asr_audio_queue = LoopQueue()
+        self.asr_priority_task = None
         self.current_speaker = None  # Lưu trữ người nói hiện tại
         self.current_language_tag = None  # Lưu trữ nhãn ngôn ngữ được ASR nhận dạng hiện tại
 
         # Biến liên quan đến LLM
         self.dialogue = Dialogue()
+        # Các lượt chat_async đang chạy trên loop (giữ tham chiếu để task không bị thu hồi)
+        self.chat_tasks = set()
 
         # Biến liên quan đến TTS
         self.sentence_id = None
@@ -248,24 +297,17 @@ class ConnectionHandler:
                 # Sử dụng thread pool để lưu bộ nhớ bất đồng bộ
                 def save_memory_task():
                     try:
-                        # Tạo event loop mới (tránh xung đột với vòng lặp chính)
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        loop.run_until_complete(
+                        # Chạy trên event loop riêng của thread worker (tránh xung đột với vòng lặp chính)
+                        run_in_worker_loop(
                             self.memory.save_memory(
                                 self.dialogue.dialogue, self.session_id
                             )
                         )
                     except Exception as e:
                         self.logger.bind(tag=TAG).error(f"Lưu bộ nhớ thất bại: {e}")
-                    finally:
-                        try:
-                            loop.close()
-                        except Exception:
-                            pass
-
-                # Khởi động thread lưu bộ nhớ, không chờ hoàn thành
-                threading.Thread(target=save_memory_task, daemon=True).start()
+
+                # Gửi vào thread pool dùng chung, không chờ hoàn thành
+                self.executor.submit(save_memory_task)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"Lưu bộ nhớ thất bại: {e}")
         finally:
@@ -410,6 +452,11 @@ class ConnectionHandler:
                 """Phương thức thực thi khởi động lại thực tế"""
                 time.sleep(1)
                 self.logger.bind(tag=TAG).info("Thực thi khởi động lại server...")
+                if running_as_worker(self.config):
+                    # Chế độ đa process: để tiến trình giám sát dừng mọi worker rồi khởi động lại,
+                    # tự chạy app.py ở đây sẽ tạo cây server thứ hai trong khi worker này lại được khởi động lại
+                    request_supervisor_restart()
+                    return
                 subprocess.Popen(
                     [sys.executable, "app.py"],
                     stdin=sys.stdin,
@@ -498,17 +545,18 @@ class ConnectionHandler:
             self.logger.bind(tag=TAG).debug("Prompt hệ thống đã được tăng cường cập nhật")
 
     def _init_report_threads(self):
-        """Khởi tạo thread báo cáo ASR và TTS"""
+        """Khởi tạo task báo cáo ASR và TTS (chạy trên event loop của kết nối, không tạo thread riêng)"""
         if not self.read_config_from_api or self.need_bind:
             return
         if self.chat_history_conf == 0:
             return
-        if self.report_thread is None or not self.report_thread.is_alive():
-            self.report_thread = threading.Thread(
-                target=self._report_worker, daemon=True
-            )
-            self.report_thread.start()
-            self.logger.bind(tag=TAG).info("Thread báo cáo TTS đã khởi động")
+        self.loop.call_soon_threadsafe(self._start_report_task)
+
+    def _start_report_task(self):
+        if self.report_task is None or self.report_task.done():
+            self.report_queue.bind(self.loop)
+            self.report_task = self.loop.create_task(self._report_worker())
+            self.logger.bind(tag=TAG).info("Task báo cáo TTS đã khởi động")
 
     def _initialize_tts(self):
         """Khởi tạo TTS"""
@@ -671,7 +719,7 @@ class ConnectionHandler:
         # Sử dụng run_in_executor để thực thi initialize_modules trong thread pool, tránh chặn vòng lặp chính
         try:
             modules = await self.loop.run_in_executor(
-                None,  # Sử dụng thread pool mặc định
+                self.executor,  # Sử dụng thread pool dùng chung
                 initialize_modules,
                 self.logger,
                 private_config,
@@ -794,7 +842,23 @@ class ConnectionHandler:
         # Cập nhật prompt hệ thống vào ngữ cảnh
         self.dialogue.update_system_message(self.prompt)
 
-    def chat(self, query, depth=0):
+    def submit_chat(self, query):
+        """Bắt đầu một lượt trò chuyện: LLM có giao diện streaming bất đồng bộ thì chạy trên event loop, ngược lại chạy trong thread pool riêng cho LLM"""
+        admission = getattr(self.server, "admission", None)
+        if self.llm is not None and self.llm.has_async_stream():
+            task = self.loop.create_task(self.chat_async(query))
+            self.chat_tasks.add(task)
+            task.add_done_callback(self.chat_tasks.discard)
+        else:
+            task = self.llm_executor.submit(self.chat, query)
+        # Đếm số lượt trò chuyện đang chạy để kiểm soát tiếp nhận kết nối mới
+        if admission is not None:
+            admission.turn_started()
+            task.add_done_callback(admission.turn_finished)
+        return task
+
+    def _prepare_chat(self, query, depth):
+        """Phần chuẩn bị chung của chat/chat_async, trả về danh sách functions (None nếu không dùng gọi công cụ)"""
         if query is not None:
             self.logger.bind(tag=TAG).info(f"Mô hình lớn nhận được tin nhắn người dùng: {query}")
 
@@ -836,258 +900,330 @@ class ConnectionHandler:
             and not force_final_answer
         ):
             functions = self.func_handler.get_functions()
-        response_message = []
+        return functions
 
-        try:
-            # Sử dụng cuộc trò chuyện có bộ nhớ
-            memory_str = None
-            # Chỉ truy vấn bộ nhớ khi query không rỗng (đại diện cho câu hỏi của người dùng)
-            if self.memory is not None and query:
-                future = asyncio.run_coroutine_threadsafe(
-                    self.memory.query_memory(query), self.loop
+    def _open_llm_stream(self, memory_str, functions, use_async=False, depth=0):
+        """Mở luồng phản hồi của LLM (generator đồng bộ hoặc async generator)"""
+        dialogue = self.dialogue.get_llm_dialogue_with_memory(
+            memory_str, self.config.get("voiceprint", {})
+        )
+        if self.intent_type == "function_call" and functions is not None:
+            # Sử dụng interface streaming hỗ trợ functions
+            self.logger.bind(tag=TAG).debug("Sử dụng LLM với function calling")
+            if use_async:
+                stream = self.llm.response_with_functions_async(
+                    self.session_id, dialogue, functions=functions
                 )
-                memory_str = future.result()
-
-            if self.intent_type == "function_call" and functions is not None:
-                # Sử dụng interface streaming hỗ trợ functions
-                llm_responses = self.llm.response_with_functions(
-                    self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(
-                        memory_str, self.config.get("voiceprint", {})
-                    ),
-                    functions=functions,
+            else:
+                stream = self.llm.response_with_functions(
+                    self.session_id, dialogue, functions=functions
                 )
-                self.logger.bind(tag=TAG).debug("Sử dụng LLM với function calling")
+        else:
+            self.logger.bind(tag=TAG).debug("Sử dụng LLM response thông thường")
+            if use_async:
+                stream = self.llm.response_async(self.session_id, dialogue)
+            else:
+                stream = self.llm.response(self.session_id, dialogue)
+
+        # Yêu cầu đầu tiên của lượt trò chuyện (chờ token đầu tiên) được ưu tiên hơn lượt gọi lại sau công cụ
+        limiter = get_provider_scheduler().limiter("LLM", self.llm)
+        priority = PRIORITY_FIRST if depth == 0 else PRIORITY_NORMAL
+        if use_async:
+            return limit_async_stream(limiter, priority, stream)
+        return limit_stream(limiter, priority, stream)
+
+    def _log_llm_open_error(self, query, e):
+        # Xử lý exception message an toàn với Unicode
+        try:
+            error_msg = str(e)
+            if isinstance(error_msg, bytes):
+                error_msg = error_msg.decode('utf-8', errors='replace')
             else:
-                llm_responses = self.llm.response(
-                    self.session_id,
-                    self.dialogue.get_llm_dialogue_with_memory(
-                        memory_str, self.config.get("voiceprint", {})
-                    ),
+                error_msg = str(error_msg).encode('utf-8', errors='replace').decode('utf-8')
+        except Exception:
+            error_msg = repr(e)
+        try:
+            query_safe = str(query).encode('utf-8', errors='replace').decode('utf-8') if query else "None"
+            log_msg = f"LLM xử lý lỗi {query_safe}: {error_msg}"
+            log_msg.encode('utf-8')
+            self.logger.bind(tag=TAG).error(log_msg)
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            self.logger.bind(tag=TAG).error(f"LLM xử lý lỗi: {repr(error_msg)}")
+
+    def _handle_llm_chunk(self, state, response, functions):
+        """Xử lý một phần phản hồi streaming của LLM: gom gọi công cụ, lấy cảm xúc, đẩy văn bản sang TTS"""
+        if self.intent_type == "function_call" and functions is not None:
+            content, tools_call = response
+            if "content" in response:
+                content = response["content"]
+                tools_call = None
+            # Đảm bảo content là string và hỗ trợ Unicode
+            if content is not None:
+                if not isinstance(content, str):
+                    content = str(content)
+                # Đảm bảo content có thể xử lý Unicode
+                try:
+                    content.encode('utf-8')
+                except (UnicodeEncodeError, UnicodeDecodeError):
+                    # Nếu có lỗi encoding, bỏ qua content này
+                    content = None
+            if content is not None and len(content) > 0:
+                state.content_arguments += content
+
+            if not state.tool_call_flag and state.content_arguments.startswith("<tool_call>"):
+                state.tool_call_flag = True
+
+            if tools_call is not None and len(tools_call) > 0:
+                state.tool_call_flag = True
+                self._merge_tool_calls(state.tool_calls_list, tools_call)
+        else:
+            content = response
+            # Đảm bảo content là string và hỗ trợ Unicode
+            if content is not None:
+                if not isinstance(content, str):
+                    content = str(content)
+                # Đảm bảo content có thể xử lý Unicode
+                try:
+                    content.encode('utf-8')
+                except (UnicodeEncodeError, UnicodeDecodeError):
+                    # Nếu có lỗi encoding, bỏ qua content này
+                    content = None
+
+        # Lấy biểu cảm cảm xúc trong phản hồi llm, một vòng trò chuyện chỉ lấy một lần ở đầu
+        if state.emotion_flag and content is not None and content.strip():
+            try:
+                asyncio.run_coroutine_threadsafe(
+                    textUtils.get_emotion(self, content),
+                    self.loop,
                 )
-                self.logger.bind(tag=TAG).debug("Sử dụng LLM response thông thường")
-        except Exception as e:
-            # Xử lý exception message an toàn với Unicode
+            except Exception as emotion_error:
+                # Bỏ qua lỗi emotion, không ảnh hưởng đến luồng chính
+                self.logger.bind(tag=TAG).debug(f"Lỗi xử lý emotion: {emotion_error}")
+            state.emotion_flag = False
+
+        if content is not None and len(content) > 0:
+            if not state.tool_call_flag:
+                state.response_message.append(content)
+                self.tts.tts_text_queue.put(
+                    TTSMessageDTO(
+                        sentence_id=self.sentence_id,
+                        sentence_type=SentenceType.MIDDLE,
+                        content_type=ContentType.TEXT,
+                        content_detail=content,
+                    )
+                )
+
+    def _handle_llm_stream_error(self, e, depth):
+        # Xử lý exception message an toàn với Unicode
+        try:
+            error_msg = str(e)
+            # Đảm bảo error message có thể được encode thành UTF-8
+            if isinstance(error_msg, bytes):
+                error_msg = error_msg.decode('utf-8', errors='replace')
+            else:
+                # Chuyển đổi sang string và đảm bảo encoding UTF-8
+                error_msg = str(error_msg).encode('utf-8', errors='replace').decode('utf-8')
+        except (UnicodeEncodeError, UnicodeDecodeError) as encoding_err:
+            # Nếu có lỗi encoding, sử dụng repr để tránh lỗi
             try:
-                error_msg = str(e)
-                if isinstance(error_msg, bytes):
-                    error_msg = error_msg.decode('utf-8', errors='replace')
-                else:
-                    error_msg = str(error_msg).encode('utf-8', errors='replace').decode('utf-8')
-            except Exception:
                 error_msg = repr(e)
-            try:
-                query_safe = str(query).encode('utf-8', errors='replace').decode('utf-8') if query else "None"
-                log_msg = f"LLM xử lý lỗi {query_safe}: {error_msg}"
-                log_msg.encode('utf-8')
-                self.logger.bind(tag=TAG).error(log_msg)
-            except (UnicodeEncodeError, UnicodeDecodeError):
-                self.logger.bind(tag=TAG).error(f"LLM xử lý lỗi: {repr(error_msg)}")
-            return None
+            except Exception:
+                error_msg = "Lỗi xử lý Unicode trong exception message"
+        except Exception:
+            # Nếu vẫn lỗi, sử dụng fallback
+            error_msg = "Lỗi không xác định khi xử lý exception"
 
-        # Xử lý phản hồi streaming
-        tool_call_flag = False
-        # Hỗ trợ nhiều gọi công cụ song song - sử dụng danh sách lưu trữ
-        tool_calls_list = []  # Định dạng: [{"id": "", "name": "", "arguments": ""}]
-        content_arguments = ""
-        self.client_abort = False
-        emotion_flag = True
-        response_received = False  # Đánh dấu đã nhận được phản hồi từ LLM
+        # Đảm bảo log message cũng được xử lý an toàn
         try:
-            for response in llm_responses:
-                response_received = True
-                if self.client_abort:
-                    break
-                if self.intent_type == "function_call" and functions is not None:
-                    content, tools_call = response
-                    if "content" in response:
-                        content = response["content"]
-                        tools_call = None
-                    # Đảm bảo content là string và hỗ trợ Unicode
-                    if content is not None:
-                        if not isinstance(content, str):
-                            content = str(content)
-                        # Đảm bảo content có thể xử lý Unicode
-                        try:
-                            content.encode('utf-8')
-                        except (UnicodeEncodeError, UnicodeDecodeError):
-                            # Nếu có lỗi encoding, bỏ qua content này
-                            content = None
-                    if content is not None and len(content) > 0:
-                        content_arguments += content
-
-                    if not tool_call_flag and content_arguments.startswith("<tool_call>"):
-                        # print("content_arguments", content_arguments)
-                        tool_call_flag = True
-
-                    if tools_call is not None and len(tools_call) > 0:
-                        tool_call_flag = True
-                        self._merge_tool_calls(tool_calls_list, tools_call)
-                else:
-                    content = response
-                    # Đảm bảo content là string và hỗ trợ Unicode
-                    if content is not None:
-                        if not isinstance(content, str):
-                            content = str(content)
-                        # Đảm bảo content có thể xử lý Unicode
-                        try:
-                            content.encode('utf-8')
-                        except (UnicodeEncodeError, UnicodeDecodeError):
-                            # Nếu có lỗi encoding, bỏ qua content này
-                            content = None
-
-                # Lấy biểu cảm cảm xúc trong phản hồi llm, một vòng trò chuyện chỉ lấy một lần ở đầu
-                if emotion_flag and content is not None and content.strip():
-                    try:
-                        asyncio.run_coroutine_threadsafe(
-                            textUtils.get_emotion(self, content),
-                            self.loop,
-                        )
-                    except Exception as emotion_error:
-                        # Bỏ qua lỗi emotion, không ảnh hưởng đến luồng chính
-                        self.logger.bind(tag=TAG).debug(f"Lỗi xử lý emotion: {emotion_error}")
-                    emotion_flag = False
-
-                if content is not None and len(content) > 0:
-                    if not tool_call_flag:
-                        response_message.append(content)
-                        self.tts.tts_text_queue.put(
-                            TTSMessageDTO(
-                                sentence_id=self.sentence_id,
-                                sentence_type=SentenceType.MIDDLE,
-                                content_type=ContentType.TEXT,
-                                content_detail=content,
-                            )
-                        )
-            
-            # Log số lượng phản hồi đã nhận được
-            if response_received:
-                self.logger.bind(tag=TAG).debug(
-                    f"Đã nhận {len(response_message)} đoạn phản hồi từ LLM, "
-                    f"tổng độ dài: {sum(len(m) for m in response_message)} ký tự"
+            log_msg = f"LLM stream processing error: {error_msg}"
+            # Kiểm tra xem log message có thể encode được không
+            log_msg.encode('utf-8')
+            self.logger.bind(tag=TAG).error(log_msg)
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            # Nếu vẫn lỗi, sử dụng ASCII-safe message
+            self.logger.bind(tag=TAG).error(f"LLM stream processing error: {repr(error_msg)}")
+        self.tts.tts_text_queue.put(
+            TTSMessageDTO(
+                sentence_id=self.sentence_id,
+                sentence_type=SentenceType.MIDDLE,
+                content_type=ContentType.TEXT,
+                content_detail=get_system_error_response(self.config),
+            )
+        )
+        if depth == 0:
+            self.tts.tts_text_queue.put(
+                TTSMessageDTO(
+                    sentence_id=self.sentence_id,
+                    sentence_type=SentenceType.LAST,
+                    content_type=ContentType.ACTION,
                 )
-        except Exception as e:
-            # Xử lý exception message an toàn với Unicode
-            try:
-                error_msg = str(e)
-                # Đảm bảo error message có thể được encode thành UTF-8
-                if isinstance(error_msg, bytes):
-                    error_msg = error_msg.decode('utf-8', errors='replace')
-                else:
-                    # Chuyển đổi sang string và đảm bảo encoding UTF-8
-                    error_msg = str(error_msg).encode('utf-8', errors='replace').decode('utf-8')
-            except (UnicodeEncodeError, UnicodeDecodeError) as encoding_err:
-                # Nếu có lỗi encoding, sử dụng repr để tránh lỗi
-                try:
-                    error_msg = repr(e)
-                except Exception:
-                    error_msg = "Lỗi xử lý Unicode trong exception message"
-            except Exception:
-                # Nếu vẫn lỗi, sử dụng fallback
-                error_msg = "Lỗi không xác định khi xử lý exception"
-            
-            # Đảm bảo log message cũng được xử lý an toàn
-            try:
-                log_msg = f"LLM stream processing error: {error_msg}"
-                # Kiểm tra xem log message có thể encode được không
-                log_msg.encode('utf-8')
-                self.logger.bind(tag=TAG).error(log_msg)
-            except (UnicodeEncodeError, UnicodeDecodeError):
-                # Nếu vẫn lỗi, sử dụng ASCII-safe message
-                self.logger.bind(tag=TAG).error(f"LLM stream processing error: {repr(error_msg)}")
+            )
+
+    def _handle_empty_llm_response(self, query, depth):
+        self.logger.bind(tag=TAG).warning(
+            f"LLM không trả về phản hồi nào cho tin nhắn: {query}"
+        )
+        # Gửi phản hồi lỗi mặc định
+        error_response = get_system_error_response(self.config)
+        if error_response:
             self.tts.tts_text_queue.put(
                 TTSMessageDTO(
                     sentence_id=self.sentence_id,
                     sentence_type=SentenceType.MIDDLE,
                     content_type=ContentType.TEXT,
-                    content_detail=get_system_error_response(self.config),
+                    content_detail=error_response,
                 )
             )
-            if depth == 0:
-                self.tts.tts_text_queue.put(
-                    TTSMessageDTO(
-                        sentence_id=self.sentence_id,
-                        sentence_type=SentenceType.LAST,
-                        content_type=ContentType.ACTION,
-                    )
+        if depth == 0:
+            self.tts.tts_text_queue.put(
+                TTSMessageDTO(
+                    sentence_id=self.sentence_id,
+                    sentence_type=SentenceType.LAST,
+                    content_type=ContentType.ACTION,
                 )
-            return
-        
-        # Kiểm tra xem LLM có trả về phản hồi không
-        if not response_received:
-            self.logger.bind(tag=TAG).warning(
-                f"LLM không trả về phản hồi nào cho tin nhắn: {query}"
             )
-            # Gửi phản hồi lỗi mặc định
-            error_response = get_system_error_response(self.config)
-            if error_response:
-                self.tts.tts_text_queue.put(
-                    TTSMessageDTO(
-                        sentence_id=self.sentence_id,
-                        sentence_type=SentenceType.MIDDLE,
-                        content_type=ContentType.TEXT,
-                        content_detail=error_response,
+
+    def _collect_tool_calls(self, state):
+        """Chuẩn hóa các gọi công cụ đã gom được, trả về danh sách cần thực thi (rỗng nếu không có hoặc lỗi)"""
+        bHasError = False
+        tool_calls_list = state.tool_calls_list
+        response_message = state.response_message
+        content_arguments = state.content_arguments
+        # Xử lý định dạng gọi công cụ dựa trên văn bản
+        if len(tool_calls_list) == 0 and content_arguments:
+            a = extract_json_from_string(content_arguments)
+            if a is not None:
+                try:
+                    content_arguments_json = json.loads(a)
+                    tool_calls_list.append(
+                        {
+                            "id": str(uuid.uuid4().hex),
+                            "name": content_arguments_json["name"],
+                            "arguments": json.dumps(
+                                content_arguments_json["arguments"],
+                                ensure_ascii=False,
+                            ),
+                        }
                     )
+                except Exception as e:
+                    bHasError = True
+                    response_message.append(a)
+            else:
+                bHasError = True
+                response_message.append(content_arguments)
+            if bHasError:
+                self.logger.bind(tag=TAG).error(
+                    f"function call error: {content_arguments}"
                 )
-            if depth == 0:
-                self.tts.tts_text_queue.put(
-                    TTSMessageDTO(
-                        sentence_id=self.sentence_id,
-                        sentence_type=SentenceType.LAST,
-                        content_type=ContentType.ACTION,
-                    )
+
+        if bHasError or len(tool_calls_list) == 0:
+            return []
+
+        # Nếu cần mô hình lớn xử lý một vòng trước, thêm tình huống log sau khi xử lý liên quan
+        if len(response_message) > 0:
+            text_buff = "".join(response_message)
+            self.tts_MessageText = text_buff
+            self.dialogue.put(Message(role="assistant", content=text_buff))
+        response_message.clear()
+
+        self.logger.bind(tag=TAG).debug(
+            f"Phát hiện {len(tool_calls_list)} lần gọi công cụ"
+        )
+        for tool_call_data in tool_calls_list:
+            self.logger.bind(tag=TAG).debug(
+                f"function_name={tool_call_data['name']}, function_id={tool_call_data['id']}, function_arguments={tool_call_data['arguments']}"
+            )
+        return tool_calls_list
+
+    def _finish_chat(self, state, query, depth):
+        # Lưu trữ nội dung cuộc trò chuyện
+        if len(state.response_message) > 0:
+            text_buff = "".join(state.response_message)
+            self.tts_MessageText = text_buff
+            self.dialogue.put(Message(role="assistant", content=text_buff))
+        else:
+            # Cảnh báo khi không có nội dung phản hồi
+            if not state.tool_call_flag:
+                self.logger.bind(tag=TAG).warning(
+                    f"LLM trả về phản hồi rỗng cho tin nhắn: {query}. "
+                    f"response_received={state.response_received}, tool_call_flag={state.tool_call_flag}"
                 )
-            return None
-        
-        # Xử lý function call
-        if tool_call_flag:
-            bHasError = False
-            # Xử lý định dạng gọi công cụ dựa trên văn bản
-            if len(tool_calls_list) == 0 and content_arguments:
-                a = extract_json_from_string(content_arguments)
-                if a is not None:
-                    try:
-                        content_arguments_json = json.loads(a)
-                        tool_calls_list.append(
-                            {
-                                "id": str(uuid.uuid4().hex),
-                                "name": content_arguments_json["name"],
-                                "arguments": json.dumps(
-                                    content_arguments_json["arguments"],
-                                    ensure_ascii=False,
-                                ),
-                            }
-                        )
-                    except Exception as e:
-                        bHasError = True
-                        response_message.append(a)
-                else:
-                    bHasError = True
-                    response_message.append(content_arguments)
-                if bHasError:
-                    self.logger.bind(tag=TAG).error(
-                        f"function call error: {content_arguments}"
-                    )
+        if depth == 0:
+            self.tts.tts_text_queue.put(
+                TTSMessageDTO(
+                    sentence_id=self.sentence_id,
+                    sentence_type=SentenceType.LAST,
+                    content_type=ContentType.ACTION,
+                )
+            )
+            # Sử dụng lambda tính toán trễ, chỉ thực thi get_llm_dialogue() ở mức DEBUG
+            self.logger.bind(tag=TAG).debug(
+                lambda: json.dumps(
+                    self.dialogue.get_llm_dialogue(), indent=4, ensure_ascii=False
+                )
+            )
+
+    def _log_llm_received(self, state):
+        # Log số lượng phản hồi đã nhận được
+        if state.response_received:
+            self.logger.bind(tag=TAG).debug(
+                f"Đã nhận {len(state.response_message)} đoạn phản hồi từ LLM, "
+                f"tổng độ dài: {sum(len(m) for m in state.response_message)} ký tự"
+            )
 
-            if not bHasError and len(tool_calls_list) > 0:
-                # Nếu cần mô hình lớn xử lý một vòng trước, thêm tình huống log sau khi xử lý liên quan
-                if len(response_message) > 0:
-                    text_buff = "".join(response_message)
-                    self.tts_MessageText = text_buff
-                    self.dialogue.put(Message(role="assistant", content=text_buff))
-                response_message.clear()
+    def chat(self, query, depth=0):
+        """Trò chuyện bằng giao diện LLM đồng bộ, chạy trong thread pool"""
+        functions = self._prepare_chat(query, depth)
 
-                self.logger.bind(tag=TAG).debug(
-                    f"Phát hiện {len(tool_calls_list)} lần gọi công cụ"
+        try:
+            # Sử dụng cuộc trò chuyện có bộ nhớ
+            memory_str = None
+            # Chỉ truy vấn bộ nhớ khi query không rỗng (đại diện cho câu hỏi của người dùng)
+            if self.memory is not None and query:
+                future = asyncio.run_coroutine_threadsafe(
+                    self.memory.query_memory(query), self.loop
                 )
+                memory_str = future.result()
+
+            llm_responses = self._open_llm_stream(memory_str, functions, depth=depth)
+        except Exception as e:
+            self._log_llm_open_error(query, e)
+            return None
+
+        # Xử lý phản hồi streaming
+        state = ChatStreamState()
+        self.client_abort = False
+        try:
+            for response in llm_responses:
+                state.response_received = True
+                if self.client_abort:
+                    break
+                self._handle_llm_chunk(state, response, functions)
+            self._log_llm_received(state)
+        except Exception as e:
+            self._handle_llm_stream_error(e, depth)
+            return
+        finally:
+            # Đóng luồng phản hồi để trả lại chỗ đồng thời của provider khi bị ngắt giữa chừng
+            close = getattr(llm_responses, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+        # Kiểm tra xem LLM có trả về phản hồi không
+        if not state.response_received:
+            self._handle_empty_llm_response(query, depth)
+            return None
 
+        # Xử lý function call
+        if state.tool_call_flag:
+            tool_calls_list = self._collect_tool_calls(state)
+            if tool_calls_list:
                 # Thu thập tất cả Future của gọi công cụ
                 futures_with_data = []
                 for tool_call_data in tool_calls_list:
-                    self.logger.bind(tag=TAG).debug(
-                        f"function_name={tool_call_data['name']}, function_id={tool_call_data['id']}, function_arguments={tool_call_data['arguments']}"
-                    )
-
                     future = asyncio.run_coroutine_threadsafe(
                         self.func_handler.handle_llm_function_call(
                             self, tool_call_data
@@ -1106,36 +1242,81 @@ class ConnectionHandler:
                 if tool_results:
                     self._handle_function_result(tool_results, depth=depth)
 
-        # Lưu trữ nội dung cuộc trò chuyện
-        if len(response_message) > 0:
-            text_buff = "".join(response_message)
-            self.tts_MessageText = text_buff
-            self.dialogue.put(Message(role="assistant", content=text_buff))
-        else:
-            # Cảnh báo khi không có nội dung phản hồi
-            if not tool_call_flag:
-                self.logger.bind(tag=TAG).warning(
-                    f"LLM trả về phản hồi rỗng cho tin nhắn: {query}. "
-                    f"response_received={response_received}, tool_call_flag={tool_call_flag}"
-                )
-        if depth == 0:
-            self.tts.tts_text_queue.put(
-                TTSMessageDTO(
-                    sentence_id=self.sentence_id,
-                    sentence_type=SentenceType.LAST,
-                    content_type=ContentType.ACTION,
-                )
+        self._finish_chat(state, query, depth)
+        return True
+
+    async def chat_async(self, query, depth=0):
+        """Trò chuyện bằng giao diện streaming bất đồng bộ của LLM, chạy trực tiếp trên event loop, không giữ thread"""
+        functions = self._prepare_chat(query, depth)
+
+        try:
+            # Sử dụng cuộc trò chuyện có bộ nhớ
+            memory_str = None
+            # Chỉ truy vấn bộ nhớ khi query không rỗng (đại diện cho câu hỏi của người dùng)
+            if self.memory is not None and query:
+                memory_str = await self.memory.query_memory(query)
+
+            llm_responses = self._open_llm_stream(
+                memory_str, functions, use_async=True, depth=depth
             )
-            # Sử dụng lambda tính toán trễ, chỉ thực thi get_llm_dialogue() ở mức DEBUG
-            self.logger.bind(tag=TAG).debug(
-                lambda: json.dumps(
-                    self.dialogue.get_llm_dialogue(), indent=4, ensure_ascii=False
+        except Exception as e:
+            self._log_llm_open_error(query, e)
+            return None
+
+        # Xử lý phản hồi streaming
+        state = ChatStreamState()
+        self.client_abort = False
+        try:
+            async for response in llm_responses:
+                state.response_received = True
+                if self.client_abort:
+                    break
+                self._handle_llm_chunk(state, response, functions)
+            self._log_llm_received(state)
+        except Exception as e:
+            self._handle_llm_stream_error(e, depth)
+            return
+        finally:
+            # Đóng luồng phản hồi để giải phóng kết nối HTTP khi bị ngắt giữa chừng
+            aclose = getattr(llm_responses, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception:
+                    pass
+
+        # Kiểm tra xem LLM có trả về phản hồi không
+        if not state.response_received:
+            self._handle_empty_llm_response(query, depth)
+            return None
+
+        # Xử lý function call
+        if state.tool_call_flag:
+            tool_calls_list = self._collect_tool_calls(state)
+            if tool_calls_list:
+                # Thực thi song song tất cả gọi công cụ (thời gian chờ thực tế là của cái chậm nhất)
+                results = await asyncio.gather(
+                    *(
+                        self.func_handler.handle_llm_function_call(self, tool_call_data)
+                        for tool_call_data in tool_calls_list
+                    )
                 )
-            )
+                tool_results = list(zip(results, tool_calls_list))
+
+                # Xử lý thống nhất tất cả kết quả gọi công cụ
+                if tool_results:
+                    if self._apply_function_results(tool_results):
+                        await self.chat_async(None, depth=depth + 1)
 
+        self._finish_chat(state, query, depth)
         return True
 
     def _handle_function_result(self, tool_results, depth):
+        if self._apply_function_results(tool_results):
+            self.chat(None, depth=depth + 1)
+
+    def _apply_function_results(self, tool_results):
+        """Xử lý kết quả gọi công cụ, trả về True nếu cần LLM trả lời tiếp"""
         need_llm_tools = []
 
         for result, tool_call_data in tool_results:
@@ -1187,41 +1368,31 @@ class ConnectionHandler:
                         )
                     )
 
-            self.chat(None, depth=depth + 1)
+            return True
+        return False
 
-    def _report_worker(self):
-        """聊天记录上报工作线程"""
+    async def _report_worker(self):
+        """聊天记录上报任务"""
         while not self.stop_event.is_set():
             try:
-                # 从队列获取数据，设置超时以便定期检查停止事件
-                item = self.report_queue.get(timeout=1)
+                item = await self.report_queue.get()
                 if item is None:  # 检测毒丸对象
                     break
-                try:
-                    # 检查线程池状态
-                    if self.executor is None:
-                        continue
-                    # 提交任务到线程池
-                    self.executor.submit(self._process_report, *item)
-                except Exception as e:
-                    self.logger.bind(tag=TAG).error(f"聊天记录上报线程异常: {e}")
-            except queue.Empty:
-                continue
+                await self._process_report(*item)
+            except asyncio.CancelledError:
+                break
             except Exception as e:
-                self.logger.bind(tag=TAG).error(f"聊天记录上报工作线程异常: {e}")
+                self.logger.bind(tag=TAG).error(f"聊天记录上报任务异常: {e}")
 
-        self.logger.bind(tag=TAG).info("聊天记录上报线程已退出")
+        self.logger.bind(tag=TAG).info("聊天记录上报任务已退出")
 
-    def _process_report(self, type, text, audio_data, report_time):
+    async def _process_report(self, type, text, audio_data, report_time):
         """处理上报任务"""
         try:
-            # 执行异步上报（在事件循环中运行）
-            asyncio.run(report(self, type, text, audio_data, report_time))
+            # 直接在连接的事件循环中执行异步上报，音频转换在共享线程池中完成
+            await report(self, type, text, audio_data, report_time)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"上报处理异常: {e}")
-        finally:
-            # 标记任务完成
-            self.report_queue.task_done()
 
     def clearSpeakStatus(self):
         self.client_is_speaking = False
@@ -1252,6 +1423,23 @@ class ConnectionHandler:
                         f"清理工具处理器时出错: {cleanup_error}"
                     )
 
+            # 记录VAD统计（如能量门跳过的推理次数）
+            if self.vad:
+                try:
+                    vad_stats = self.vad.get_connection_stats(self)
+                    if vad_stats:
+                        self.logger.bind(tag=TAG).info(f"VAD统计: {vad_stats}")
+                except Exception as stats_error:
+                    self.logger.bind(tag=TAG).debug(f"获取VAD统计失败: {stats_error}")
+
+            # 记录ASR推测识别统计（命中率、节省的延迟）
+            spec_stats = speculative_stats.get_stats()
+            if spec_stats["started"]:
+                self.logger.bind(tag=TAG).info(f"ASR推测识别统计: {spec_stats}")
+
+            # 释放共享的Opus解码器
+            self.opus_decoder = None
+
             # 触发停止事件
             if self.stop_event:
                 self.stop_event.set()
@@ -1295,7 +1483,20 @@ class ConnectionHandler:
             except Exception as ws_error:
                 self.logger.bind(tag=TAG).error(f"关闭WebSocket连接时出错: {ws_error}")
 
+            # 停止ASR音频处理任务和上报任务
+            for task in (self.asr_priority_task, self.report_task):
+                if task and not task.done():
+                    task.cancel()
+            self.asr_priority_task = None
+            self.report_task = None
+            # 取消正在进行的异步对话
+            for task in list(self.chat_tasks):
+                task.cancel()
+            self.chat_tasks.clear()
+
             if self.tts:
+                # 先停止TTS文本处理和音频播放任务
+                await self.tts.stop_audio_channels()
                 await self.tts.close()
             if self.asr:
                 await self.asr.close()
@@ -1309,6 +1510,14 @@ class ConnectionHandler:
                         f"关闭线程池时出错: {executor_error}"
                     )
                 self.executor = None
+            if self.llm_executor:
+                try:
+                    self.llm_executor.shutdown(wait=False)
+                except Exception as executor_error:
+                    self.logger.bind(tag=TAG).error(
+                        f"关闭线程池时出错: {executor_error}"
+                    )
+                self.llm_executor = None
             self.logger.bind(tag=TAG).info("连接资源已释放")
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"关闭连接时出错: {e}")
@@ -1347,6 +1556,18 @@ class ConnectionHandler:
                 f"清理结束: TTS队列大小={self.tts.tts_text_queue.qsize()}, 音频队列大小={self.tts.tts_audio_queue.qsize()}"
             )
 
+    def _asr_buffer_frames(self) -> int:
+        max_utterance_s = self.config.get("asr_max_utterance_s", "60")
+        max_utterance_s = float(max_utterance_s) if max_utterance_s else 60.0
+        return max(1, int(max_utterance_s * 1000 / AUDIO_FRAME_DURATION))
+
+    def take_asr_audio(self):
+        """Lấy toàn bộ audio của câu nói hiện tại (gói gốc, PCM) và thay bằng bộ đệm mới, không sao chép"""
+        asr_audio, asr_pcm = self.asr_audio, self.asr_pcm
+        self.asr_audio = deque(maxlen=self.asr_buffer_frames)
+        self.asr_pcm = deque(maxlen=self.asr_buffer_frames)
+        return asr_audio, asr_pcm
+
     def reset_audio_states(self):
         """
         重置所有音频相关状态(VAD + ASR)
@@ -1360,6 +1581,12 @@ class ConnectionHandler:
 
         # Clear ASR buffers
         self.asr_audio.clear()
+        self.asr_pcm.clear()
+        self.asr_preroll.clear()
+        if self.asr_speculation is not None:
+            self.asr_speculation.cancel()
+            self.asr_speculation = None
+            speculative_stats.record_discard()
 
         self.logger.bind(tag=TAG).debug("All audio states reset.")
 
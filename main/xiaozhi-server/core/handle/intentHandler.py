@@ -120,7 +120,7 @@ async def process_intent_result(
                     response = conn.intent.replyResult(context_prompt, original_text)
                     speak_txt(conn, response)
 
-                conn.executor.submit(process_context_result)
+                conn.llm_executor.submit(process_context_result)
                 return True
 
             function_args = {}
@@ -187,8 +187,8 @@ async def process_intent_result(
                         if text is not None:
                             speak_txt(conn, text)
 
-            # Đặt việc thực thi hàm vào thread pool
-            conn.executor.submit(process_function_call)
+            # Đặt việc thực thi hàm vào thread pool của LLM (có thể gọi LLM tạo phản hồi)
+            conn.llm_executor.submit(process_function_call)
             return True
         return False
     except json.JSONDecodeError as e:
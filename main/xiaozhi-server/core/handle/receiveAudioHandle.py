@@ -1,7 +1,8 @@
 import time
 import json
 import asyncio
-from typing import TYPE_CHECKING
+import opuslib_next
+from typing import Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from core.connection import ConnectionHandler
@@ -14,9 +15,25 @@ from core.handle.sendAudioHandle import send_stt_message, SentenceType
 TAG = __name__
 
 
+def decode_audio_packet(conn: "ConnectionHandler", audio) -> Optional[bytes]:
+    """Giải mã một gói audio thành PCM 16kHz 16-bit, mỗi gói chỉ giải mã một lần cho cả VAD và ASR"""
+    if conn.audio_format == "pcm":
+        return audio
+    if conn.opus_decoder is None:
+        conn.opus_decoder = opuslib_next.Decoder(16000, 1)
+    try:
+        return conn.opus_decoder.decode(audio, 960)
+    except opuslib_next.OpusError as e:
+        conn.logger.bind(tag=TAG).info(f"Lỗi giải mã: {e}")
+        return None
+
+
 async def handleAudioMessage(conn: "ConnectionHandler", audio):
+    pcm_frame = decode_audio_packet(conn, audio)
+    if pcm_frame is None:
+        return
     # Đoạn hiện tại có người nói không
-    have_voice = conn.vad.is_vad(conn, audio)
+    have_voice = await conn.vad.is_vad_async(conn, pcm_frame)
     # Nếu thiết bị vừa được đánh thức, tạm thời bỏ qua phát hiện VAD
     if hasattr(conn, "just_woken_up") and conn.just_woken_up:
         have_voice = False
@@ -31,7 +48,7 @@ async def handleAudioMessage(conn: "ConnectionHandler", audio):
     # Phát hiện thiết bị rảnh rỗi lâu, dùng để nói tạm biệt
     await no_voice_close_connect(conn, have_voice)
     # Nhận âm thanh
-    await conn.asr.receive_audio(conn, audio, have_voice)
+    await conn.asr.receive_audio(conn, audio, have_voice, pcm_frame)
 
 
 async def resume_vad_detection(conn: "ConnectionHandler"):
@@ -97,7 +114,7 @@ async def startToChat(conn: "ConnectionHandler", text):
 
     # Ý định chưa được xử lý, tiếp tục quy trình trò chuyện thông thường, sử dụng nội dung văn bản thực tế
     await send_stt_message(conn, actual_text)
-    conn.executor.submit(conn.chat, actual_text)
+    conn.submit_chat(actual_text)
 
 
 async def no_voice_close_connect(conn: "ConnectionHandler", have_voice):
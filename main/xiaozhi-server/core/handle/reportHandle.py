@@ -2,14 +2,15 @@
 Chức năng báo cáo TTS đã được tích hợp vào lớp ConnectionHandler.
 
 Chức năng báo cáo bao gồm:
-1. Mỗi đối tượng kết nối có hàng đợi báo cáo và luồng xử lý riêng
-2. Vòng đời luồng báo cáo được liên kết với đối tượng kết nối
+1. Mỗi đối tượng kết nối có hàng đợi báo cáo và task xử lý riêng trên event loop
+2. Vòng đời task báo cáo được liên kết với đối tượng kết nối
 3. Sử dụng phương thức ConnectionHandler.enqueue_tts_report để báo cáo
 
 Vui lòng tham khảo mã liên quan trong core/connection.py để biết cách triển khai cụ thể.
 """
 
 import time
+import asyncio
 import opuslib_next
 from typing import TYPE_CHECKING
 
@@ -28,12 +29,18 @@ async def report(conn: "ConnectionHandler", type, text, opus_data, report_time):
         conn: Đối tượng kết nối
         type: Loại báo cáo, 1 là người dùng, 2 là tác nhân thông minh
         text: Văn bản tổng hợp
-        opus_data: Dữ liệu âm thanh opus
+        opus_data: Dữ liệu âm thanh opus, hoặc bytes PCM đã giải mã
         report_time: Thời gian báo cáo
     """
     try:
-        if opus_data:
-            audio_data = opus_to_wav(conn, opus_data)
+        # Chuyển đổi audio tốn CPU, thực hiện trong thread pool dùng chung để không chặn event loop
+        loop = asyncio.get_running_loop()
+        if isinstance(opus_data, (bytes, bytearray)):
+            audio_data = await loop.run_in_executor(conn.executor, pcm_to_wav, opus_data)
+        elif opus_data:
+            audio_data = await loop.run_in_executor(
+                conn.executor, opus_to_wav, conn, opus_data
+            )
         else:
             audio_data = None
         # Thực thi báo cáo bất đồng bộ
@@ -74,28 +81,7 @@ def opus_to_wav(conn: "ConnectionHandler", opus_data):
         if not pcm_data:
             raise ValueError("Không có dữ liệu PCM hợp lệ")
 
-        # Tạo header tệp WAV
-        pcm_data_bytes = b"".join(pcm_data)
-        num_samples = len(pcm_data_bytes) // 2  # 16-bit samples
-
-        # Header tệp WAV
-        wav_header = bytearray()
-        wav_header.extend(b"RIFF")  # ChunkID
-        wav_header.extend((36 + len(pcm_data_bytes)).to_bytes(4, "little"))  # ChunkSize
-        wav_header.extend(b"WAVE")  # Format
-        wav_header.extend(b"fmt ")  # Subchunk1ID
-        wav_header.extend((16).to_bytes(4, "little"))  # Subchunk1Size
-        wav_header.extend((1).to_bytes(2, "little"))  # AudioFormat (PCM)
-        wav_header.extend((1).to_bytes(2, "little"))  # NumChannels
-        wav_header.extend((16000).to_bytes(4, "little"))  # SampleRate
-        wav_header.extend((32000).to_bytes(4, "little"))  # ByteRate
-        wav_header.extend((2).to_bytes(2, "little"))  # BlockAlign
-        wav_header.extend((16).to_bytes(2, "little"))  # BitsPerSample
-        wav_header.extend(b"data")  # Subchunk2ID
-        wav_header.extend(len(pcm_data_bytes).to_bytes(4, "little"))  # Subchunk2Size
-
-        # Trả về dữ liệu WAV đầy đủ
-        return bytes(wav_header) + pcm_data_bytes
+        return pcm_to_wav(b"".join(pcm_data))
     finally:
         if decoder is not None:
             try:
@@ -104,6 +90,35 @@ def opus_to_wav(conn: "ConnectionHandler", opus_data):
                 conn.logger.bind(tag=TAG).debug(f"Lỗi khi giải phóng tài nguyên decoder: {e}")
 
 
+def pcm_to_wav(pcm_data_bytes):
+    """Đóng gói dữ liệu PCM 16kHz 16-bit đơn kênh thành luồng byte định dạng WAV
+
+    Args:
+        pcm_data_bytes: Dữ liệu PCM
+
+    Returns:
+        bytes: Dữ liệu âm thanh định dạng WAV
+    """
+    # Header tệp WAV
+    wav_header = bytearray()
+    wav_header.extend(b"RIFF")  # ChunkID
+    wav_header.extend((36 + len(pcm_data_bytes)).to_bytes(4, "little"))  # ChunkSize
+    wav_header.extend(b"WAVE")  # Format
+    wav_header.extend(b"fmt ")  # Subchunk1ID
+    wav_header.extend((16).to_bytes(4, "little"))  # Subchunk1Size
+    wav_header.extend((1).to_bytes(2, "little"))  # AudioFormat (PCM)
+    wav_header.extend((1).to_bytes(2, "little"))  # NumChannels
+    wav_header.extend((16000).to_bytes(4, "little"))  # SampleRate
+    wav_header.extend((32000).to_bytes(4, "little"))  # ByteRate
+    wav_header.extend((2).to_bytes(2, "little"))  # BlockAlign
+    wav_header.extend((16).to_bytes(2, "little"))  # BitsPerSample
+    wav_header.extend(b"data")  # Subchunk2ID
+    wav_header.extend(len(pcm_data_bytes).to_bytes(4, "little"))  # Subchunk2Size
+
+    # Trả về dữ liệu WAV đầy đủ
+    return bytes(wav_header) + pcm_data_bytes
+
+
 def enqueue_tts_report(conn: "ConnectionHandler", text, opus_data):
     if not conn.read_config_from_api or conn.need_bind or not conn.report_tts_enable:
         return
@@ -132,7 +147,7 @@ def enqueue_tts_report(conn: "ConnectionHandler", text, opus_data):
         conn.logger.bind(tag=TAG).error(f"Thêm vào hàng đợi báo cáo TTS thất bại: {text}, {e}")
 
 
-def enqueue_asr_report(conn: "ConnectionHandler", text, opus_data):
+def enqueue_asr_report(conn: "ConnectionHandler", text, opus_data, pcm_data=None):
     if not conn.read_config_from_api or conn.need_bind or not conn.report_asr_enable:
         return
     if conn.chat_history_conf == 0:
@@ -143,11 +158,13 @@ def enqueue_asr_report(conn: "ConnectionHandler", text, opus_data):
         conn: Đối tượng kết nối
         text: Văn bản tổng hợp
         opus_data: Dữ liệu âm thanh opus
+        pcm_data: PCM đã giải mã của đoạn audio (nếu có thì không cần giải mã lại)
     """
     try:
         # Sử dụng hàng đợi của đối tượng kết nối, truyền văn bản và dữ liệu nhị phân thay vì đường dẫn tệp
         if conn.chat_history_conf == 2:
-            conn.report_queue.put((1, text, opus_data, int(time.time())))
+            audio = pcm_data if pcm_data else opus_data
+            conn.report_queue.put((1, text, audio, int(time.time())))
             conn.logger.bind(tag=TAG).debug(
                 f"Dữ liệu ASR đã được thêm vào hàng đợi báo cáo: {conn.device_id}, kích thước âm thanh: {len(opus_data)} "
             )
@@ -39,11 +39,11 @@ class ListenTextMessageHandler(TextMessageHandler):
             else:
                 # Chế độ không luồng: kích hoạt nhận dạng ASR trực tiếp
                 if len(conn.asr_audio) > 0:
-                    asr_audio_task = conn.asr_audio.copy()
+                    asr_audio_task, pcm_task = conn.take_asr_audio()
                     conn.reset_audio_states()
 
                     if len(asr_audio_task) > 0:
-                        await conn.asr.handle_voice_stop(conn, asr_audio_task)
+                        await conn.asr.handle_voice_stop(conn, asr_audio_task, pcm_task)
         elif msg_json["state"] == "detect":
             conn.client_have_voice = False
             conn.reset_audio_states()
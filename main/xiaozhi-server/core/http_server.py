@@ -78,7 +78,12 @@ class SimpleHttpServer:
                 # Chạy dịch vụ
                 runner = web.AppRunner(app)
                 await runner.setup()
-                site = web.TCPSite(runner, host, port)
+                site = web.TCPSite(
+                    runner,
+                    host,
+                    port,
+                    reuse_port=bool(server_config.get("reuse_port", False)) or None,
+                )
                 await site.start()
 
                 # Duy trì dịch vụ chạy
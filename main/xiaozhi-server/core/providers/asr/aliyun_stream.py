@@ -6,12 +6,13 @@ import base64
 import hashlib
 import asyncio
 import requests
+import threading
 import websockets
-import opuslib_next
 from urllib import parse
 from datetime import datetime
 from config.logger import setup_logging
 from core.providers.asr.base import ASRProviderBase
+from core.utils.ws_pool import get_ws_pool
 from core.providers.asr.dto.dto import InterfaceType
 from typing import TYPE_CHECKING
 
@@ -68,13 +69,97 @@ class AccessToken:
         return None, None
 
 
+class SharedToken:
+    """Token dùng chung cho mọi phiên có cùng access_key_id, tự làm mới khi sắp hết hạn"""
+
+    def __init__(self, access_key_id=None, access_key_secret=None, token=None):
+        self.access_key_id = access_key_id
+        self.access_key_secret = access_key_secret
+        self.token = token
+        self.expire_time = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self):
+        """Token chưa có hoặc đã hết hạn và có thể làm mới bằng access_key"""
+        return bool(
+            self.access_key_id
+            and self.access_key_secret
+            and (not self.token or self._is_token_expired())
+        )
+
+    def get_token(self):
+        """Lấy Token hiện tại, làm mới nếu chưa có hoặc đã hết hạn (gọi HTTP chặn, không gọi trên event loop)"""
+        with self._lock:
+            if self.needs_refresh():
+                self._refresh_token()
+            return self.token
+
+    async def get_token_async(self):
+        """Lấy Token trên event loop, làm mới trong thread để không chặn loop"""
+        if self.needs_refresh():
+            return await asyncio.to_thread(self.get_token)
+        return self.token
+
+    def _refresh_token(self):
+        """Làm mới Token"""
+        token, expire_time_str = AccessToken.create_token(self.access_key_id, self.access_key_secret)
+        if not token:
+            raise ValueError("Không thể lấy Token truy cập hợp lệ")
+        self.token = token
+
+        try:
+            expire_str = str(expire_time_str).strip()
+            if expire_str.isdigit():
+                expire_time = datetime.fromtimestamp(int(expire_str))
+            else:
+                expire_time = datetime.strptime(expire_str, "%Y-%m-%dT%H:%M:%SZ")
+            self.expire_time = expire_time.timestamp() - 60
+        except:
+            self.expire_time = None
+
+    def _is_token_expired(self):
+        """Kiểm tra xem Token có hết hạn không"""
+        return self.expire_time and time.time() > self.expire_time
+
+
+_shared_tokens = {}
+_shared_tokens_lock = threading.Lock()
+
+
+def get_shared_token(access_key_id=None, access_key_secret=None, token=None) -> SharedToken:
+    """Lấy Token dùng chung của cả process theo thông tin xác thực"""
+    key = (access_key_id, access_key_secret, token)
+    with _shared_tokens_lock:
+        shared = _shared_tokens.get(key)
+        if shared is None:
+            shared = SharedToken(access_key_id, access_key_secret, token)
+            _shared_tokens[key] = shared
+        return shared
+
+
+def make_connect(ws_url, shared_token: SharedToken):
+    """Tạo hàm kết nối cho pool, chỉ giữ URL và Token dùng chung (không giữ provider)"""
+
+    async def connect():
+        headers = {"X-NLS-Token": await shared_token.get_token_async()}
+        return await websockets.connect(
+            ws_url,
+            additional_headers=headers,
+            max_size=1000000000,
+            ping_interval=None,
+            ping_timeout=None,
+            close_timeout=5,
+        )
+
+    return connect
+
+
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
         self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False
@@ -96,42 +181,28 @@ class ASRProvider(ASRProviderBase):
         self.max_sentence_silence = config.get("max_sentence_silence")
         self.output_dir = config.get("output_dir", "./audio_output")
         self.delete_audio_file = delete_audio_file
-        self.expire_time = None
 
         self.task_id = uuid.uuid4().hex
 
         # Quản lý Token
-        if self.access_key_id and self.access_key_secret:
-            self._refresh_token()
-        elif not self.token:
+        if not (self.access_key_id and self.access_key_secret) and not self.token:
             raise ValueError("Phải cung cấp access_key_id+access_key_secret hoặc trực tiếp cung cấp token")
-
-    def _refresh_token(self):
-        """Làm mới Token"""
-        self.token, expire_time_str = AccessToken.create_token(self.access_key_id, self.access_key_secret)
-        if not self.token:
-            raise ValueError("Không thể lấy Token truy cập hợp lệ")
-        
-        try:
-            expire_str = str(expire_time_str).strip()
-            if expire_str.isdigit():
-                expire_time = datetime.fromtimestamp(int(expire_str))
-            else:
-                expire_time = datetime.strptime(expire_str, "%Y-%m-%dT%H:%M:%SZ")
-            self.expire_time = expire_time.timestamp() - 60
-        except:
-            self.expire_time = None
-
-    def _is_token_expired(self):
-        """Kiểm tra xem Token có hết hạn không"""
-        return self.expire_time and time.time() > self.expire_time
+        self.shared_token = get_shared_token(self.access_key_id, self.access_key_secret, self.token)
+        self.shared_token.get_token()
+
+        # Pool kết nối đã bắt tay TLS và xác thực sẵn, dùng chung cho cả process
+        self.ws_pool = get_ws_pool(
+            f"aliyun_stream:{self.ws_url}:{self.appkey}:{self.access_key_id}:{self.access_key_secret}:{self.token}",
+            make_connect(self.ws_url, self.shared_token),
+            config,
+        )
 
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
 
-    async def receive_audio(self, conn, audio, audio_have_voice):
+    async def receive_audio(self, conn, audio, audio_have_voice, pcm_frame=None):
         # Gọi phương thức của lớp cha để xử lý logic cơ bản trước
-        await super().receive_audio(conn, audio, audio_have_voice)
+        await super().receive_audio(conn, audio, audio_have_voice, pcm_frame)
 
         # Chỉ thiết lập kết nối khi có âm thanh và chưa có kết nối (loại trừ trường hợp đang dừng)
         if audio_have_voice and not self.is_processing and not self.asr_ws:
@@ -144,7 +215,6 @@ class ASRProvider(ASRProviderBase):
 
         if self.asr_ws and self.is_processing and self.server_ready:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
                 await self.asr_ws.send(pcm_frame)
             except Exception as e:
                 logger.bind(tag=TAG).warning(f"Gửi âm thanh thất bại: {str(e)}")
@@ -152,19 +222,8 @@ class ASRProvider(ASRProviderBase):
 
     async def _start_recognition(self, conn: "ConnectionHandler"):
         """Bắt đầu phiên nhận dạng"""
-        if self._is_token_expired():
-            self._refresh_token()
-        
-        # Thiết lập kết nối
-        headers = {"X-NLS-Token": self.token}
-        self.asr_ws = await websockets.connect(
-            self.ws_url,
-            additional_headers=headers,
-            max_size=1000000000,
-            ping_interval=None,
-            ping_timeout=None,
-            close_timeout=5,
-        )
+        # Lấy kết nối từ pool (không có sẵn thì kết nối mới)
+        self.asr_ws = await self.ws_pool.acquire()
 
         self.task_id = uuid.uuid4().hex
 
@@ -232,9 +291,8 @@ class ASRProvider(ASRProviderBase):
 
                         # Gửi âm thanh đã lưu vào bộ đệm
                         if conn.asr_audio:
-                            for cached_audio in conn.asr_audio[-10:]:
+                            for pcm_frame in self.get_cached_pcm(conn, 10):
                                 try:
-                                    pcm_frame = self.decoder.decode(cached_audio, 960)
                                     await self.asr_ws.send(pcm_frame)
                                 except Exception as e:
                                     logger.bind(tag=TAG).warning(f"Gửi âm thanh đã lưu vào bộ đệm thất bại: {e}")
@@ -337,10 +395,3 @@ class ASRProvider(ASRProviderBase):
     async def close(self):
         """Đóng tài nguyên"""
         await self._cleanup()
-        if hasattr(self, 'decoder') and self.decoder is not None:
-            try:
-                del self.decoder
-                self.decoder = None
-                logger.bind(tag=TAG).debug("Tài nguyên Aliyun decoder đã được giải phóng")
-            except Exception as e:
-                logger.bind(tag=TAG).debug(f"Xảy ra lỗi khi giải phóng tài nguyên Aliyun decoder: {e}")
@@ -2,7 +2,6 @@ import json
 import uuid
 import asyncio
 import websockets
-import opuslib_next
 from typing import List, TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -10,19 +9,38 @@ if TYPE_CHECKING:
 
 from config.logger import setup_logging
 from core.providers.asr.base import ASRProviderBase
+from core.utils.ws_pool import get_ws_pool
 from core.providers.asr.dto.dto import InterfaceType
 
 TAG = __name__
 logger = setup_logging()
 
 
+def make_connect(ws_url, api_key):
+    """Tạo hàm kết nối cho pool, chỉ giữ URL và khóa API (không giữ provider)"""
+
+    async def connect():
+        headers = {
+            "Authorization": f"Bearer {api_key}"
+        }
+        return await websockets.connect(
+            ws_url,
+            additional_headers=headers,
+            max_size=1000000000,
+            ping_interval=None,
+            ping_timeout=None,
+            close_timeout=5,
+        )
+
+    return connect
+
+
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
         self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False
@@ -52,12 +70,19 @@ class ASRProvider(ASRProviderBase):
         self.output_dir = config.get("output_dir", "./audio_output")
         self.delete_audio_file = delete_audio_file
 
+        # Pool kết nối đã bắt tay TLS và xác thực sẵn, dùng chung cho cả process
+        self.ws_pool = get_ws_pool(
+            f"aliyunbl_stream:{self.ws_url}:{self.api_key}",
+            make_connect(self.ws_url, self.api_key),
+            config,
+        )
+
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
 
-    async def receive_audio(self, conn, audio, audio_have_voice):
+    async def receive_audio(self, conn, audio, audio_have_voice, pcm_frame=None):
         # Gọi phương thức của lớp cha để xử lý logic cơ bản trước
-        await super().receive_audio(conn, audio, audio_have_voice)
+        await super().receive_audio(conn, audio, audio_have_voice, pcm_frame)
 
         # Chỉ thiết lập kết nối khi có âm thanh và chưa có kết nối
         if audio_have_voice and not self.is_processing and not self.asr_ws:
@@ -71,7 +96,6 @@ class ASRProvider(ASRProviderBase):
         # Gửi dữ liệu âm thanh
         if self.asr_ws and self.is_processing and self.server_ready:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
                 # Gửi trực tiếp dữ liệu âm thanh PCM (nhị phân)
                 await self.asr_ws.send(pcm_frame)
             except Exception as e:
@@ -88,21 +112,9 @@ class ASRProvider(ASRProviderBase):
             self.is_processing = True
             self.task_id = uuid.uuid4().hex
 
-            # Thiết lập kết nối WebSocket
-            headers = {
-                "Authorization": f"Bearer {self.api_key}"
-            }
-
+            # Lấy kết nối WebSocket từ pool (không có sẵn thì kết nối mới)
             logger.bind(tag=TAG).debug(f"Đang kết nối dịch vụ ASR Alibaba Bailian, task_id: {self.task_id}")
-
-            self.asr_ws = await websockets.connect(
-                self.ws_url,
-                additional_headers=headers,
-                max_size=1000000000,
-                ping_interval=None,
-                ping_timeout=None,
-                close_timeout=5,
-            )
+            self.asr_ws = await self.ws_pool.acquire()
 
             logger.bind(tag=TAG).debug("Kết nối WebSocket được thiết lập thành công")
 
@@ -179,9 +191,8 @@ class ASRProvider(ASRProviderBase):
 
                         # Gửi âm thanh đã lưu vào bộ đệm
                         if conn.asr_audio:
-                            for cached_audio in conn.asr_audio[-10:]:
+                            for pcm_frame in self.get_cached_pcm(conn, 10):
                                 try:
-                                    pcm_frame = self.decoder.decode(cached_audio, 960)
                                     await self.asr_ws.send(pcm_frame)
                                 except Exception as e:
                                     logger.bind(tag=TAG).warning(f"Gửi âm thanh đã lưu vào bộ đệm thất bại: {e}")
@@ -320,11 +331,4 @@ class ASRProvider(ASRProviderBase):
 
     async def close(self):
         """Đóng tài nguyên"""
-        await self._cleanup()
-        if hasattr(self, 'decoder') and self.decoder is not None:
-            try:
-                del self.decoder
-                self.decoder = None
-                logger.bind(tag=TAG).debug("Tài nguyên Aliyun BL decoder đã được giải phóng")
-            except Exception as e:
-                logger.bind(tag=TAG).debug(f"Xảy ra lỗi khi giải phóng tài nguyên Aliyun BL decoder: {e}")
\ No newline at end of file
+        await self._cleanup()
\ No newline at end of file
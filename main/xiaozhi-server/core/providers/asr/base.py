@@ -4,21 +4,22 @@ import wave
 import uuid
 import json
 import time
-import queue
 import shutil
 import asyncio
 import tempfile
 import traceback
-import threading
 import opuslib_next
 
 from abc import ABC, abstractmethod
+from itertools import islice
 from config.logger import setup_logging
 from core.providers.asr.dto.dto import InterfaceType
+from core.providers.asr.speculative import Speculation, speculative_stats
 from core.handle.receiveAudioHandle import startToChat
 from core.handle.reportHandle import enqueue_asr_report
 from core.utils.util import remove_punctuation_and_length
-from core.handle.receiveAudioHandle import handleAudioMessage
+from core.utils.provider_scheduler import PRIORITY_FIRST, get_provider_scheduler
+from core.handle.receiveAudioHandle import handleAudioMessage, decode_audio_packet
 from typing import Optional, Tuple, List, NamedTuple, TYPE_CHECKING
 
 
@@ -28,6 +29,9 @@ if TYPE_CHECKING:
 TAG = __name__
 logger = setup_logging()
 
+# Thư mục tmpfs dùng cho file tạm của provider bắt buộc phải có đường dẫn
+SHM_DIR = "/dev/shm"
+
 
 class ASRProviderBase(ABC):
     def __init__(self):
@@ -35,23 +39,19 @@ class ASRProviderBase(ABC):
 
     # Mở kênh audio
     async def open_audio_channels(self, conn: "ConnectionHandler"):
-        conn.asr_priority_thread = threading.Thread(
-            target=self.asr_text_priority_thread, args=(conn,), daemon=True
-        )
-        conn.asr_priority_thread.start()
+        # Xử lý audio bằng task trên event loop của kết nối, không tạo thread riêng
+        loop = asyncio.get_running_loop()
+        conn.asr_audio_queue.bind(loop)
+        conn.asr_priority_task = loop.create_task(self.asr_text_priority_task(conn))
 
     # Xử lý audio ASR theo thứ tự
-    def asr_text_priority_thread(self, conn: "ConnectionHandler"):
+    async def asr_text_priority_task(self, conn: "ConnectionHandler"):
         while not conn.stop_event.is_set():
             try:
-                message = conn.asr_audio_queue.get(timeout=1)
-                future = asyncio.run_coroutine_threadsafe(
-                    handleAudioMessage(conn, message),
-                    conn.loop,
-                )
-                future.result()
-            except queue.Empty:
-                continue
+                message = await conn.asr_audio_queue.get()
+                await handleAudioMessage(conn, message)
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản ASR thất bại: {str(e)}, loại: {type(e).__name__}, stack: {traceback.format_exc()}"
@@ -59,62 +59,182 @@ class ASRProviderBase(ABC):
                 continue
 
     # Nhận audio
-    async def receive_audio(self, conn: "ConnectionHandler", audio, audio_have_voice):
-        if conn.client_listen_mode == "manual":
-            # Chế độ thủ công: cache audio để nhận dạng ASR
-            conn.asr_audio.append(audio)
-        else:
-            # Chế độ tự động/thời gian thực: sử dụng phát hiện VAD
-            conn.asr_audio.append(audio)
-
-            # Nếu không có giọng nói, và trước đó cũng không có âm thanh, cache một phần audio
-            if not audio_have_voice and not conn.client_have_voice:
-                conn.asr_audio = conn.asr_audio[-10:]
-                return
-
+    async def receive_audio(
+        self, conn: "ConnectionHandler", audio, audio_have_voice, pcm_frame=None
+    ):
+        """Nhận một gói audio, pcm_frame là PCM đã giải mã của gói (giải mã một lần trong handleAudioMessage)"""
+        if pcm_frame is None:
+            pcm_frame = decode_audio_packet(conn, audio) or b""
+
+        # Chế độ tự động/thời gian thực: nếu không có giọng nói, và trước đó cũng không có âm thanh,
+        # chỉ giữ vài frame gần nhất trong bộ đệm vòng pre-roll
+        if (
+            conn.client_listen_mode != "manual"
+            and not audio_have_voice
+            and not conn.client_have_voice
+        ):
+            conn.asr_preroll.push(audio, pcm_frame)
+            return
+
+        # Bắt đầu một câu nói: đưa pre-roll vào đầu đoạn audio
+        if len(conn.asr_preroll) > 0:
+            conn.asr_audio.extend(conn.asr_preroll.frames())
+            conn.asr_pcm.extend(conn.asr_preroll.pcm_frames())
+            conn.asr_preroll.clear()
+
+        # conn.asr_pcm luôn song song với conn.asr_audio
+        conn.asr_audio.append(audio)
+        conn.asr_pcm.append(pcm_frame)
+
+        if conn.client_listen_mode != "manual":
             # Trong chế độ tự động, khi phát hiện VAD phát hiện giọng nói dừng thì kích hoạt nhận dạng
             if conn.asr.interface_type != InterfaceType.STREAM and conn.client_voice_stop:
-                asr_audio_task = conn.asr_audio.copy()
+                asr_audio_task, pcm_task = conn.take_asr_audio()
+                speculation = conn.asr_speculation
+                conn.asr_speculation = None
                 conn.reset_audio_states()
 
                 if len(asr_audio_task) > 15:
-                    await self.handle_voice_stop(conn, asr_audio_task)
+                    await self.handle_voice_stop(
+                        conn, asr_audio_task, pcm_task, speculation
+                    )
+                elif speculation is not None:
+                    speculation.cancel()
+                    speculative_stats.record_discard()
+            elif conn.asr.interface_type != InterfaceType.STREAM:
+                self._update_speculation(conn)
+
+    @staticmethod
+    def _speculative_min_pause_ms(conn: "ConnectionHandler") -> Optional[float]:
+        """Khoảng lặng tối thiểu (ms) để bắt đầu nhận dạng suy đoán, None nếu chưa bật"""
+        spec_config = conn.config.get("speculative_asr") or {}
+        if str(spec_config.get("enabled", False)).lower() not in ("true", "1", "yes"):
+            return None
+        min_pause_ms = spec_config.get("min_pause_ms", "100")
+        return float(min_pause_ms) if min_pause_ms else 100.0
+
+    def _update_speculation(self, conn: "ConnectionHandler"):
+        """Bắt đầu nhận dạng suy đoán khi có khoảng lặng ngắn, hủy nếu người dùng nói tiếp"""
+        speculation = conn.asr_speculation
+        if conn.last_is_voice:
+            # Có giọng nói mới, kết quả suy đoán không còn đúng
+            if speculation is not None:
+                speculation.cancel()
+                conn.asr_speculation = None
+                speculative_stats.record_discard()
+            return
+
+        if speculation is not None or not conn.client_have_voice:
+            return
+        min_pause_ms = self._speculative_min_pause_ms(conn)
+        if min_pause_ms is None or len(conn.asr_audio) <= 15:
+            return
+        if time.time() * 1000 - conn.last_activity_time < min_pause_ms:
+            return
+
+        asr_audio_task = list(conn.asr_audio)
+        pcm_data = self._resolve_pcm(conn, asr_audio_task, list(conn.asr_pcm))
+        task = asyncio.create_task(self._recognize(conn, asr_audio_task, pcm_data))
+        conn.asr_speculation = Speculation(task, len(asr_audio_task))
+        speculative_stats.record_start()
+        logger.bind(tag=TAG).debug(
+            f"Bắt đầu nhận dạng suy đoán, số frame: {len(asr_audio_task)}"
+        )
+
+    async def _recognize(
+        self,
+        conn: "ConnectionHandler",
+        asr_audio_task: List[bytes],
+        pcm_data: List[bytes],
+    ):
+        """Chạy song song ASR và nhận dạng giọng nói, trả về (kết quả ASR, kết quả nhận dạng giọng nói)"""
+        combined_pcm_data = b"".join(pcm_data)
+
+        # Chuẩn bị trước dữ liệu WAV
+        wav_data = None
+        if conn.voiceprint_provider and combined_pcm_data:
+            wav_data = self._pcm_to_wav(combined_pcm_data)
+
+        # Định nghĩa tác vụ ASR
+        asr_task = self.speech_to_text_wrapper(
+            asr_audio_task, conn.session_id, conn.audio_format, pcm_data
+        )
+
+        if conn.voiceprint_provider and wav_data:
+            voiceprint_task = conn.voiceprint_provider.identify_speaker(
+                wav_data, conn.session_id
+            )
+            # Chờ đồng thời hai kết quả
+            asr_result, voiceprint_result = await asyncio.gather(
+                asr_task, voiceprint_task, return_exceptions=True
+            )
+        else:
+            try:
+                asr_result = await asr_task
+            except Exception as e:
+                asr_result = e
+            voiceprint_result = None
+        return asr_result, voiceprint_result
+
+    def get_cached_pcm(
+        self, conn: "ConnectionHandler", last: Optional[int] = None
+    ) -> List[bytes]:
+        """Lấy PCM tương ứng với conn.asr_audio (hoặc chỉ `last` frame cuối), đã được giải mã khi nhận gói"""
+        if len(conn.asr_pcm) != len(conn.asr_audio):
+            pcm = self._resolve_pcm(conn, conn.asr_audio, None)
+            return pcm if last is None else pcm[-last:]
+        if last is None:
+            return list(conn.asr_pcm)
+        # Chỉ duyệt `last` frame cuối của deque, không sao chép cả bộ đệm
+        return list(islice(reversed(conn.asr_pcm), last))[::-1]
+
+    def _resolve_pcm(
+        self,
+        conn: "ConnectionHandler",
+        asr_audio_task: List[bytes],
+        pcm_task: Optional[List[bytes]],
+    ) -> List[bytes]:
+        """Trả về PCM của đoạn audio, chỉ giải mã lại khi không có PCM dùng chung"""
+        if pcm_task is not None and len(pcm_task) == len(asr_audio_task):
+            return [frame for frame in pcm_task if frame]
+        if asr_audio_task is conn.asr_audio and len(conn.asr_pcm) == len(
+            conn.asr_audio
+        ):
+            return [frame for frame in conn.asr_pcm if frame]
+        if conn.audio_format == "pcm":
+            return list(asr_audio_task)
+        return self.decode_opus(asr_audio_task)
 
     # Xử lý giọng nói dừng
-    async def handle_voice_stop(self, conn: "ConnectionHandler", asr_audio_task: List[bytes]):
+    async def handle_voice_stop(
+        self,
+        conn: "ConnectionHandler",
+        asr_audio_task: List[bytes],
+        pcm_task: Optional[List[bytes]] = None,
+        speculation: Optional[Speculation] = None,
+    ):
         """Xử lý song song ASR và nhận dạng giọng nói"""
         try:
             total_start_time = time.monotonic()
 
-            # Chuẩn bị dữ liệu audio
-            if conn.audio_format == "pcm":
-                pcm_data = asr_audio_task
-            else:
-                pcm_data = self.decode_opus(asr_audio_task)
+            # Chuẩn bị dữ liệu audio: dùng PCM đã giải mã khi nhận gói, không giải mã lại
+            pcm_data = self._resolve_pcm(conn, asr_audio_task, pcm_task)
+            asr_audio_task = list(asr_audio_task)
 
             combined_pcm_data = b"".join(pcm_data)
 
-            # Chuẩn bị trước dữ liệu WAV
-            wav_data = None
-            if conn.voiceprint_provider and combined_pcm_data:
-                wav_data = self._pcm_to_wav(combined_pcm_data)
-
-            # Định nghĩa tác vụ ASR
-            asr_task = self.speech_to_text_wrapper(
-                asr_audio_task, conn.session_id, conn.audio_format
-            )
-
-            if conn.voiceprint_provider and wav_data:
-                voiceprint_task = conn.voiceprint_provider.identify_speaker(
-                    wav_data, conn.session_id
-                )
-                # Chờ đồng thời hai kết quả
-                asr_result, voiceprint_result = await asyncio.gather(
-                    asr_task, voiceprint_task, return_exceptions=True
+            if speculation is not None:
+                # Không có giọng nói mới kể từ lúc suy đoán, dùng luôn kết quả đã (hoặc đang) nhận dạng
+                saved_ms = speculation.saved_ms()
+                asr_result, voiceprint_result = await speculation.task
+                speculative_stats.record_hit(saved_ms)
+                logger.bind(tag=TAG).debug(
+                    f"Dùng kết quả nhận dạng suy đoán, tiết kiệm {saved_ms:.0f}ms, thống kê: {speculative_stats.get_stats()}"
                 )
             else:
-                asr_result = await asr_task
-                voiceprint_result = None
+                asr_result, voiceprint_result = await self._recognize(
+                    conn, asr_audio_task, pcm_data
+                )
 
             # Ghi lại kết quả nhận dạng - kiểm tra có phải ngoại lệ không
             if isinstance(asr_result, Exception):
@@ -170,8 +290,9 @@ class ASRProviderBase(ABC):
             if text_len > 0:
                 # Sử dụng module tùy chỉnh để báo cáo
                 await startToChat(conn, enhanced_text)
-                audio_snapshot = asr_audio_task.copy()
-                enqueue_asr_report(conn, enhanced_text, audio_snapshot)
+                enqueue_asr_report(
+                    conn, enhanced_text, asr_audio_task, combined_pcm_data
+                )
         except Exception as e:
             logger.bind(tag=TAG).error(f"Xử lý giọng nói dừng thất bại: {e}")
             import traceback
@@ -228,7 +349,9 @@ class ASRProviderBase(ABC):
         file_path: Optional[str]
         """Đường dẫn file WAV"""
         temp_path: Optional[str]
-        """Đường dẫn file WAV tạm thời"""
+        """Đường dẫn file WAV tạm thời (nằm trên bộ nhớ /dev/shm nếu có)"""
+        wav_bytes: Optional[bytes] = None
+        """Dữ liệu WAV trong bộ nhớ, chỉ có khi provider accepts_in_memory()"""
 
     def get_current_artifacts(self) -> Optional["ASRProviderBase.AudioArtifacts"]:
         return self._current_artifacts
@@ -241,9 +364,22 @@ class ASRProviderBase(ABC):
         """Có ưu tiên sử dụng file tạm thời không"""
         return False
 
+    def accepts_in_memory(self) -> bool:
+        """Provider cần file có thể nhận WAV trong bộ nhớ (artifacts.wav_bytes) thay cho file trên đĩa không"""
+        return False
+
+    @staticmethod
+    def _memory_temp_dir() -> Optional[str]:
+        """Thư mục tạm nằm trên bộ nhớ (tmpfs), file tạm không đi qua đĩa"""
+        if os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+            return SHM_DIR
+        return None
+
     def build_temp_file(self, pcm_bytes: bytes) -> Optional[str]:
         try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+            with tempfile.NamedTemporaryFile(
+                suffix=".wav", delete=False, dir=self._memory_temp_dir()
+            ) as temp_file:
                 temp_path = temp_file.name
             with wave.open(temp_path, "wb") as wav_file:
                 wav_file.setnchannels(1)
@@ -270,27 +406,40 @@ class ASRProviderBase(ABC):
         return file_path
 
     async def speech_to_text_wrapper(
-        self, opus_data: List[bytes], session_id: str, audio_format="opus"
+        self,
+        opus_data: List[bytes],
+        session_id: str,
+        audio_format="opus",
+        pcm_data: Optional[List[bytes]] = None,
     ) -> Tuple[Optional[str], Optional[str]]:
         file_path = None
         temp_path = None
         try:
-            if audio_format == "pcm":
-                pcm_data = opus_data
-            else:
-                pcm_data = self.decode_opus(opus_data)
+            if pcm_data is None:
+                if audio_format == "pcm":
+                    pcm_data = opus_data
+                else:
+                    pcm_data = self.decode_opus(opus_data)
             combined_pcm_data = b"".join(pcm_data)
 
-            free_space = shutil.disk_usage(self.output_dir).free
-            if free_space < len(combined_pcm_data) * 2:
-                raise OSError("Không đủ dung lượng đĩa")
+            in_memory = self.requires_file() and self.accepts_in_memory()
+            keep_file = hasattr(self, "delete_audio_file") and not self.delete_audio_file
+            need_file = keep_file or (
+                self.requires_file()
+                and not self.prefers_temp_file()
+                and not in_memory
+            )
+
+            # Chỉ kiểm tra dung lượng đĩa khi thực sự ghi file vào output_dir
+            if need_file:
+                free_space = shutil.disk_usage(self.output_dir).free
+                if free_space < len(combined_pcm_data) * 2:
+                    raise OSError("Không đủ dung lượng đĩa")
 
-            if self.requires_file() and self.prefers_temp_file():
+            if self.requires_file() and self.prefers_temp_file() and not in_memory:
                 temp_path = self.build_temp_file(combined_pcm_data)
 
-            if (hasattr(self, "delete_audio_file") and not self.delete_audio_file) or (
-                self.requires_file() and not self.prefers_temp_file()
-            ):
+            if need_file:
                 file_path = self.save_audio_to_file(pcm_data, session_id)
 
             if len(combined_pcm_data) == 0:
@@ -301,11 +450,29 @@ class ASRProviderBase(ABC):
                     pcm_bytes=combined_pcm_data,
                     file_path=file_path,
                     temp_path=temp_path,
+                    wav_bytes=(
+                        self._pcm_to_wav(combined_pcm_data) if in_memory else None
+                    ),
                 )
 
-            text, _ = await self.speech_to_text(
-                opus_data, session_id, audio_format, artifacts
-            )
+            # ASR local không gọi nhà cung cấp bên ngoài, ASR streaming đã nhận dạng xong trong lúc nói
+            # (speech_to_text chỉ trả về văn bản đã có), chỉ giới hạn ASR gửi cả câu nói lên nhà cung cấp
+            limiter = None
+            if getattr(self, "interface_type", None) not in (
+                InterfaceType.LOCAL,
+                InterfaceType.STREAM,
+            ):
+                limiter = get_provider_scheduler().limiter("ASR", self)
+            if limiter is not None:
+                # Người dùng đang chờ kết quả nhận dạng, luôn ưu tiên cao
+                await limiter.acquire(PRIORITY_FIRST)
+            try:
+                text, _ = await self.speech_to_text(
+                    opus_data, session_id, audio_format, artifacts
+                )
+            finally:
+                if limiter is not None:
+                    limiter.release()
             return text, file_path
         except OSError as e:
             logger.bind(tag=TAG).error(f"Lỗi thao tác file: {e}")
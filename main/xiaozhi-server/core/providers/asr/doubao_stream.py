@@ -3,8 +3,8 @@ import gzip
 import uuid
 import asyncio
 import websockets
-import opuslib_next
 from core.providers.asr.base import ASRProviderBase
+from core.utils.ws_pool import get_ws_pool
 from config.logger import setup_logging
 from core.providers.asr.dto.dto import InterfaceType
 from typing import TYPE_CHECKING
@@ -16,13 +16,38 @@ TAG = __name__
 logger = setup_logging()
 
 
+def token_auth_headers(appid, access_token):
+    return {
+        "X-Api-App-Key": appid,
+        "X-Api-Access-Key": access_token,
+        "X-Api-Resource-Id": "volc.bigasr.sauc.duration",
+        "X-Api-Connect-Id": str(uuid.uuid4()),
+    }
+
+
+def make_connect(ws_url, appid, access_token, auth_method):
+    """Tạo hàm kết nối cho pool, chỉ giữ URL và thông tin xác thực (không giữ provider)"""
+
+    async def connect():
+        headers = token_auth_headers(appid, access_token) if auth_method == "token" else None
+        return await websockets.connect(
+            ws_url,
+            additional_headers=headers,
+            max_size=1000000000,
+            ping_interval=None,
+            ping_timeout=None,
+            close_timeout=10,
+        )
+
+    return connect
+
+
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
         self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False  # Thêm cờ trạng thái xử lý
@@ -62,29 +87,27 @@ class ASRProvider(ASRProviderBase):
         end_window_size = config.get("end_window_size")
         self.end_window_size = int(end_window_size) if end_window_size else 200
 
+        # Pool kết nối đã bắt tay TLS và xác thực sẵn, dùng chung cho cả process
+        self.ws_pool = get_ws_pool(
+            f"doubao_stream:{self.ws_url}:{self.appid}:{self.auth_method}:{self.access_token}",
+            make_connect(self.ws_url, self.appid, self.access_token, self.auth_method),
+            config,
+        )
+
     async def open_audio_channels(self, conn):
         await super().open_audio_channels(conn)
 
-    async def receive_audio(self, conn: "ConnectionHandler", audio, audio_have_voice):
+    async def receive_audio(self, conn: "ConnectionHandler", audio, audio_have_voice, pcm_frame=None):
         # Gọi phương thức lớp cha để xử lý logic cơ bản trước
-        await super().receive_audio(conn, audio, audio_have_voice)
+        await super().receive_audio(conn, audio, audio_have_voice, pcm_frame)
         
         # Nếu lần này có âm thanh, và trước đó chưa thiết lập kết nối
         if audio_have_voice and self.asr_ws is None and not self.is_processing:
             try:
                 self.is_processing = True
-                # Thiết lập kết nối WebSocket mới
-                headers = self.token_auth() if self.auth_method == "token" else None
-                logger.bind(tag=TAG).info(f"Đang kết nối dịch vụ ASR, headers: {headers}")
-
-                self.asr_ws = await websockets.connect(
-                    self.ws_url,
-                    additional_headers=headers,
-                    max_size=1000000000,
-                    ping_interval=None,
-                    ping_timeout=None,
-                    close_timeout=10,
-                )
+                # Lấy kết nối WebSocket từ pool (không có sẵn thì kết nối mới)
+                logger.bind(tag=TAG).info("Đang kết nối dịch vụ ASR")
+                self.asr_ws = await self.ws_pool.acquire()
 
                 # Gửi yêu cầu khởi tạo
                 request_params = self.construct_request(str(uuid.uuid4()))
@@ -120,9 +143,8 @@ class ASRProvider(ASRProviderBase):
 
                 # Gửi dữ liệu audio đã cache
                 if conn.asr_audio and len(conn.asr_audio) > 0:
-                    for cached_audio in conn.asr_audio[-10:]:
+                    for pcm_frame in self.get_cached_pcm(conn, 10):
                         try:
-                            pcm_frame = self.decoder.decode(cached_audio, 960)
                             payload = gzip.compress(pcm_frame)
                             audio_request = bytearray(
                                 self.generate_audio_default_header()
@@ -148,7 +170,6 @@ class ASRProvider(ASRProviderBase):
         # Gửi dữ liệu audio hiện tại
         if self.asr_ws and self.is_processing:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
                 payload = gzip.compress(pcm_frame)
                 audio_request = bytearray(self.generate_audio_default_header())
                 audio_request.extend(len(payload).to_bytes(4, "big"))
@@ -317,12 +338,7 @@ class ASRProvider(ASRProviderBase):
         return req
 
     def token_auth(self):
-        return {
-            "X-Api-App-Key": self.appid,
-            "X-Api-Access-Key": self.access_token,
-            "X-Api-Resource-Id": "volc.bigasr.sauc.duration",
-            "X-Api-Connect-Id": str(uuid.uuid4()),
-        }
+        return token_auth_headers(self.appid, self.access_token)
 
     def generate_header(
         self,
@@ -417,12 +433,3 @@ class ASRProvider(ASRProviderBase):
                 pass
             self.forward_task = None
         self.is_processing = False
-
-        # Giải phóng tài nguyên decoder một cách rõ ràng
-        if hasattr(self, "decoder") and self.decoder is not None:
-            try:
-                del self.decoder
-                self.decoder = None
-                logger.bind(tag=TAG).debug("Doubao decoder resources released")
-            except Exception as e:
-                logger.bind(tag=TAG).debug(f"Lỗi khi giải phóng tài nguyên decoder Doubao: {e}")
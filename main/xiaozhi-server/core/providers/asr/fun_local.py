@@ -12,6 +12,7 @@ from typing import Optional, Tuple, List
 from core.providers.asr.utils import lang_tag_filter
 from core.providers.asr.base import ASRProviderBase
 from core.providers.asr.dto.dto import InterfaceType
+from core.utils.batch_scheduler import BatchScheduler
 
 TAG = __name__
 logger = setup_logging()
@@ -63,6 +64,30 @@ class ASRProvider(ASRProviderBase):
                 # device="cuda:0",  # Bật tăng tốc GPU
             )
 
+        # Gom các câu nói đã kết thúc của nhiều kết nối thành một lần generate theo lô
+        batch_enabled = config.get("batch_enabled", False)
+        batch_max_size = config.get("batch_max_size", "8")
+        batch_max_wait_ms = config.get("batch_max_wait_ms", "30")
+        self.batch_scheduler = None
+        if str(batch_enabled).lower() in ("true", "1", "yes"):
+            self.batch_scheduler = BatchScheduler(
+                "fun_local",
+                self._generate_batch,
+                max_batch_size=int(batch_max_size) if batch_max_size else 8,
+                max_wait_ms=float(batch_max_wait_ms) if batch_max_wait_ms else 30,
+            )
+
+    def _generate_batch(self, pcm_list: List[bytes]) -> List[dict]:
+        """Nhận dạng một lô audio PCM bằng một lần gọi generate"""
+        results = self.model.generate(
+            input=pcm_list,
+            cache={},
+            language="auto",
+            use_itn=True,
+            batch_size=len(pcm_list),
+        )
+        return [lang_tag_filter(result["text"]) for result in results]
+
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus", artifacts=None
     ) -> Tuple[Optional[str], Optional[str]]:
@@ -76,6 +101,14 @@ class ASRProvider(ASRProviderBase):
 
                 # Nhận dạng giọng nói - sử dụng thread pool để tránh chặn event loop
                 start_time = time.time()
+                if self.batch_scheduler is not None:
+                    text = await self.batch_scheduler.submit(artifacts.pcm_bytes)
+                    logger.bind(tag=TAG).debug(
+                        f"Thời gian nhận dạng giọng nói: {time.time() - start_time:.3f}s | Kết quả: {text['content']} | "
+                        f"Hàng đợi: {self.batch_scheduler.queue_depth()}"
+                    )
+                    return text, artifacts.file_path
+
                 result = await asyncio.to_thread(
                     self.model.generate,
                     input=artifacts.pcm_bytes,
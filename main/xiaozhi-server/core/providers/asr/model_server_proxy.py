@@ -0,0 +1,35 @@
+import os
+from typing import Optional, Tuple, List
+from .base import ASRProviderBase
+from config.logger import setup_logging
+from core.providers.asr.dto.dto import InterfaceType
+
+TAG = __name__
+logger = setup_logging()
+
+
+class ASRProvider(ASRProviderBase):
+    """ASR local chạy trong model server dùng chung, worker chỉ gửi PCM và nhận văn bản"""
+
+    def __init__(self, config: dict, delete_audio_file: bool, client):
+        super().__init__()
+        self.interface_type = InterfaceType.LOCAL
+        self.output_dir = config.get("output_dir", "tmp/")
+        self.delete_audio_file = delete_audio_file
+        self.client = client
+
+        # Đảm bảo thư mục đầu ra tồn tại
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    async def speech_to_text(
+        self, opus_data: List[bytes], session_id: str, audio_format="opus", artifacts=None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Gửi PCM tới model server để nhận dạng"""
+        if artifacts is None:
+            return "", None
+        try:
+            text = await self.client.recognize(artifacts.pcm_bytes, session_id)
+            return text, artifacts.file_path
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Nhận dạng qua model server thất bại: {e}")
+            return "", None
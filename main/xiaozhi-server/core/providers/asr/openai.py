@@ -24,6 +24,9 @@ class ASRProvider(ASRProviderBase):
     def requires_file(self) -> bool:
         return True
 
+    def accepts_in_memory(self) -> bool:
+        return True
+
     async def speech_to_text(self, opus_data: List[bytes], session_id: str, audio_format="opus", artifacts=None) -> Tuple[Optional[str], Optional[str]]:
         file_path = None
         try:
@@ -31,7 +34,8 @@ class ASRProvider(ASRProviderBase):
                 return "", None
             file_path = artifacts.file_path
                 
-            logger.bind(tag=TAG).info(f"Đường dẫn file: {file_path}")
+            if file_path:
+                logger.bind(tag=TAG).info(f"Đường dẫn file: {file_path}")
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
             }
@@ -42,21 +46,26 @@ class ASRProvider(ASRProviderBase):
             }
 
 
-            with open(file_path, "rb") as audio_file:  # Sử dụng with để đảm bảo file được đóng
-                files = {
-                    "file": audio_file
-                }
+            # Ưu tiên gửi WAV trong bộ nhớ, không cần đọc lại file từ đĩa
+            if artifacts.wav_bytes:
+                audio_file = ("audio.wav", artifacts.wav_bytes, "audio/wav")
+            else:
+                with open(file_path, "rb") as f:  # Sử dụng with để đảm bảo file được đóng
+                    audio_file = (os.path.basename(file_path), f.read(), "audio/wav")
+            files = {
+                "file": audio_file
+            }
 
-                start_time = time.time()
-                response = requests.post(
-                    self.api_url,
-                    files=files,
-                    data=data,
-                    headers=headers
-                )
-                logger.bind(tag=TAG).debug(
-                    f"Thời gian nhận dạng giọng nói: {time.time() - start_time:.3f}s | Kết quả: {response.text}"
-                )
+            start_time = time.time()
+            response = requests.post(
+                self.api_url,
+                files=files,
+                data=data,
+                headers=headers
+            )
+            logger.bind(tag=TAG).debug(
+                f"Thời gian nhận dạng giọng nói: {time.time() - start_time:.3f}s | Kết quả: {response.text}"
+            )
 
             if response.status_code == 200:
                 text = response.json().get("text", "")
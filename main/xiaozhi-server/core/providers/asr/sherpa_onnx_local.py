@@ -123,6 +123,9 @@ class ASRProvider(ASRProviderBase):
     def requires_file(self) -> bool:
         return True
 
+    def accepts_in_memory(self) -> bool:
+        return True
+
     async def speech_to_text(
         self, opus_data: List[bytes], session_id: str, audio_format="opus", artifacts=None
     ) -> Tuple[Optional[str], Optional[str]]:
@@ -135,7 +138,15 @@ class ASRProvider(ASRProviderBase):
 
             start_time = time.time()
             s = self.model.create_stream()
-            samples, sample_rate = self.read_wave(file_path)
+            if file_path:
+                samples, sample_rate = self.read_wave(file_path)
+            else:
+                # Đọc trực tiếp từ PCM trong bộ nhớ, không qua file WAV
+                samples = (
+                    np.frombuffer(artifacts.pcm_bytes, dtype=np.int16).astype(np.float32)
+                    / 32768
+                )
+                sample_rate = 16000
             s.accept_waveform(sample_rate, samples)
             self.model.decode_stream(s)
             text = s.result.text
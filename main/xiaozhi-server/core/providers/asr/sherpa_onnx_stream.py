@@ -0,0 +1,252 @@
+import os
+import io
+import sys
+import time
+import asyncio
+import threading
+import numpy as np
+import sherpa_onnx
+
+from config.logger import setup_logging
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+from core.providers.asr.base import ASRProviderBase
+from core.providers.asr.dto.dto import InterfaceType
+from core.utils.batch_scheduler import BatchScheduler
+
+if TYPE_CHECKING:
+    from core.connection import ConnectionHandler
+
+TAG = __name__
+logger = setup_logging()
+
+# Đệm im lặng ở cuối câu để model streaming xuất nốt các token cuối
+TAIL_PADDING_SECONDS = 0.5
+
+
+# Bắt đầu đầu ra tiêu chuẩn
+class CaptureOutput:
+    def __enter__(self):
+        self._output = io.StringIO()
+        self._original_stdout = sys.stdout
+        sys.stdout = self._output
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        sys.stdout = self._original_stdout
+        self.output = self._output.getvalue()
+        self._output.close()
+
+        # Xuất nội dung đã bắt được qua logger
+        if self.output:
+            logger.bind(tag=TAG).info(self.output.strip())
+
+
+class SharedOnlineRecognizer:
+    """OnlineRecognizer dùng chung cho tất cả kết nối, giải mã nhiều stream trong một lần gọi"""
+
+    _instances: Dict[tuple, "SharedOnlineRecognizer"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, config: dict):
+        model_dir = config.get("model_dir")
+        model_type = config.get("model_type", "transducer")
+        num_threads = config.get("num_threads", "2")
+        num_threads = int(num_threads) if num_threads else 2
+        tokens = os.path.join(model_dir, config.get("tokens", "tokens.txt"))
+
+        with CaptureOutput():
+            if model_type == "paraformer":
+                self.recognizer = sherpa_onnx.OnlineRecognizer.from_paraformer(
+                    tokens=tokens,
+                    encoder=os.path.join(model_dir, config.get("encoder", "encoder.onnx")),
+                    decoder=os.path.join(model_dir, config.get("decoder", "decoder.onnx")),
+                    num_threads=num_threads,
+                    sample_rate=16000,
+                    feature_dim=80,
+                    decoding_method="greedy_search",
+                    enable_endpoint_detection=False,
+                )
+            elif model_type == "zipformer2_ctc":
+                self.recognizer = sherpa_onnx.OnlineRecognizer.from_zipformer2_ctc(
+                    tokens=tokens,
+                    model=os.path.join(model_dir, config.get("model", "model.onnx")),
+                    num_threads=num_threads,
+                    sample_rate=16000,
+                    feature_dim=80,
+                    decoding_method="greedy_search",
+                    enable_endpoint_detection=False,
+                )
+            else:  # transducer
+                self.recognizer = sherpa_onnx.OnlineRecognizer.from_transducer(
+                    tokens=tokens,
+                    encoder=os.path.join(model_dir, config.get("encoder", "encoder.onnx")),
+                    decoder=os.path.join(model_dir, config.get("decoder", "decoder.onnx")),
+                    joiner=os.path.join(model_dir, config.get("joiner", "joiner.onnx")),
+                    num_threads=num_threads,
+                    sample_rate=16000,
+                    feature_dim=80,
+                    decoding_method="greedy_search",
+                    enable_endpoint_detection=False,
+                )
+
+        # Gom các stream đang chờ giải mã của nhiều kết nối, mỗi nhịp gọi decode_streams một lần
+        batch_max_size = config.get("batch_max_size", "32")
+        batch_max_wait_ms = config.get("batch_max_wait_ms", "10")
+        self.scheduler = BatchScheduler(
+            "sherpa_onnx_stream",
+            self._decode_batch,
+            max_batch_size=int(batch_max_size) if batch_max_size else 32,
+            max_wait_ms=float(batch_max_wait_ms) if batch_max_wait_ms else 10,
+        )
+
+    @classmethod
+    def get(cls, config: dict) -> "SharedOnlineRecognizer":
+        """Lấy instance dùng chung theo cấu hình model, chỉ tải model một lần cho mỗi process"""
+        key = (
+            config.get("model_dir"),
+            config.get("model_type", "transducer"),
+            config.get("encoder"),
+            config.get("model"),
+        )
+        with cls._instances_lock:
+            instance = cls._instances.get(key)
+            if instance is None:
+                logger.bind(tag=TAG).info(f"Đang tải model sherpa-onnx streaming: {key[0]}")
+                instance = cls(config)
+                cls._instances[key] = instance
+            return instance
+
+    def create_stream(self):
+        return self.recognizer.create_stream()
+
+    def _decode_batch(self, streams: List) -> List[str]:
+        """Giải mã tất cả stream đã đủ dữ liệu, trả về kết quả hiện tại của từng stream"""
+        ready = [s for s in streams if self.recognizer.is_ready(s)]
+        while ready:
+            self.recognizer.decode_streams(ready)
+            ready = [s for s in ready if self.recognizer.is_ready(s)]
+        return [self.recognizer.get_result(s) for s in streams]
+
+    async def decode(self, stream) -> str:
+        return await self.scheduler.submit(stream)
+
+
+class ASRProvider(ASRProviderBase):
+    def __init__(self, config: dict, delete_audio_file: bool):
+        super().__init__()
+        self.interface_type = InterfaceType.STREAM
+        self.config = config
+        self.text = ""
+        self.output_dir = config.get("output_dir", "tmp/")
+        self.delete_audio_file = delete_audio_file
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.engine = SharedOnlineRecognizer.get(config)
+        self.stream = None
+        self.conn = None
+        self.is_processing = False
+        # Tuần tự hóa việc đưa audio vào stream và hoàn tất câu nói: OnlineStream không an toàn khi
+        # input_finished/decode cuối chạy song song với một lần decode đang dở
+        self._stream_lock = asyncio.Lock()
+
+    async def open_audio_channels(self, conn: "ConnectionHandler"):
+        self.conn = conn
+        await super().open_audio_channels(conn)
+
+    @staticmethod
+    def _to_float(pcm_frames: List[bytes]) -> np.ndarray:
+        samples = np.frombuffer(b"".join(pcm_frames), dtype=np.int16)
+        return samples.astype(np.float32) / 32768
+
+    async def _accept(self, pcm_frames: List[bytes]):
+        """Đưa PCM vào stream và giải mã phần đã đủ dữ liệu, caller phải giữ _stream_lock"""
+        samples = self._to_float(pcm_frames)
+        if len(samples) == 0:
+            return
+        stream = self.stream
+        stream.accept_waveform(16000, samples)
+        text = await self.engine.decode(stream)
+        # Stream đã được thay/hủy trong lúc giải mã (close) thì bỏ kết quả tạm thời
+        if stream is not self.stream:
+            return
+        if text and text != self.text:
+            self.text = text
+            logger.bind(tag=TAG).debug(f"Kết quả nhận dạng tạm thời: {text}")
+
+    async def receive_audio(
+        self, conn: "ConnectionHandler", audio, audio_have_voice, pcm_frame=None
+    ):
+        # Gọi phương thức lớp cha để xử lý logic cơ bản trước
+        await super().receive_audio(conn, audio, audio_have_voice, pcm_frame)
+        self.conn = conn
+
+        async with self._stream_lock:
+            try:
+                if self.stream is None:
+                    # Bắt đầu câu nói mới: tạo stream và đưa vào audio đã cache (bao gồm frame hiện tại)
+                    if not audio_have_voice and conn.client_listen_mode != "manual":
+                        return
+                    self.stream = self.engine.create_stream()
+                    self.text = ""
+                    self.is_processing = True
+                    await self._accept(self.get_cached_pcm(conn))
+                elif pcm_frame:
+                    await self._accept([pcm_frame])
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Giải mã streaming thất bại: {e}")
+                self.stream = None
+                self.is_processing = False
+                return
+
+        # Chế độ tự động: VAD phát hiện dừng nói thì hoàn tất câu nói
+        if conn.client_listen_mode != "manual" and conn.client_voice_stop:
+            await self._finish_utterance(conn)
+
+    async def _finish_utterance(self, conn: "ConnectionHandler"):
+        """Kết thúc stream hiện tại, lấy kết quả cuối cùng và chuyển cho luồng xử lý chung"""
+        # Chờ lần _accept đang dở (nếu có) xong rồi mới kết thúc stream, tránh giải mã song song
+        # và tránh kết quả tạm thời ghi đè kết quả cuối
+        async with self._stream_lock:
+            if self.stream is None:
+                return
+            stream = self.stream
+            self.stream = None
+            asr_audio_task, pcm_task = conn.take_asr_audio()
+            conn.reset_audio_states()
+
+            try:
+                start_time = time.monotonic()
+                tail = np.zeros(int(TAIL_PADDING_SECONDS * 16000), dtype=np.float32)
+                stream.accept_waveform(16000, tail)
+                stream.input_finished()
+                self.text = await self.engine.decode(stream)
+                logger.bind(tag=TAG).debug(
+                    f"Thời gian giải mã phần cuối: {time.monotonic() - start_time:.3f}s | Kết quả: {self.text}"
+                )
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Hoàn tất nhận dạng streaming thất bại: {e}")
+            finally:
+                self.is_processing = False
+
+        if conn.client_listen_mode == "manual" or len(asr_audio_task) > 15:
+            await self.handle_voice_stop(conn, asr_audio_task, pcm_task)
+        else:
+            self.text = ""
+
+    async def _send_stop_request(self):
+        """Chế độ thủ công: khách hàng kết thúc ghi âm"""
+        if self.conn is not None:
+            await self._finish_utterance(self.conn)
+
+    async def speech_to_text(
+        self, opus_data: List[bytes], session_id: str, audio_format="opus", artifacts=None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Lấy kết quả nhận dạng"""
+        result = self.text
+        self.text = ""
+        return result, None
+
+    async def close(self):
+        """Giải phóng stream của kết nối, recognizer dùng chung vẫn được giữ lại"""
+        self.stream = None
+        self.conn = None
+        self.is_processing = False
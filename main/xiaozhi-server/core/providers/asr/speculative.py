@@ -0,0 +1,74 @@
+"""
+Nhận dạng ASR suy đoán (speculative) khi kết thúc lượt nói
+Khi VAD vừa báo có khoảng lặng ngắn thì bắt đầu nhận dạng audio đã cache,
+kết quả chỉ được dùng nếu không có giọng nói mới trước khi hết min_silence_duration_ms, ngược lại bị hủy
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+
+class Speculation:
+    """Một lần nhận dạng suy đoán đang chạy của kết nối"""
+
+    def __init__(self, task: asyncio.Task, frame_count: int):
+        self.task = task
+        self.frame_count = frame_count
+        self.start_time = time.monotonic()
+        self.done_time: Optional[float] = None
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, _task):
+        self.done_time = time.monotonic()
+
+    def saved_ms(self) -> float:
+        """Thời gian tiết kiệm được: phần nhận dạng đã chạy trước khi VAD xác nhận dừng nói"""
+        end = self.done_time if self.done_time is not None else time.monotonic()
+        return (end - self.start_time) * 1000
+
+    def cancel(self):
+        if not self.task.done():
+            self.task.cancel()
+
+
+class SpeculativeStats:
+    """Thống kê dùng chung của cả process: số lần trúng, số lần hủy, thời gian tiết kiệm"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.hits = 0
+        self.discards = 0
+        self.latency_saved_ms = 0.0
+
+    def record_start(self):
+        with self._lock:
+            self.started += 1
+
+    def record_hit(self, saved_ms: float):
+        with self._lock:
+            self.hits += 1
+            self.latency_saved_ms += saved_ms
+
+    def record_discard(self):
+        with self._lock:
+            self.discards += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            finished = self.hits + self.discards
+            return {
+                "started": self.started,
+                "hits": self.hits,
+                "discards": self.discards,
+                "hit_rate": round(self.hits / finished, 3) if finished else 0,
+                "latency_saved_ms": round(self.latency_saved_ms, 1),
+                "avg_latency_saved_ms": (
+                    round(self.latency_saved_ms / self.hits, 1) if self.hits else 0
+                ),
+            }
+
+
+speculative_stats = SpeculativeStats()
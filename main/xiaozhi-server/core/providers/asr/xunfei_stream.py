@@ -4,18 +4,18 @@ import base64
 import hashlib
 import asyncio
 import websockets
-import opuslib_next
 import gc
 from time import mktime
 from datetime import datetime
 from urllib.parse import urlencode
-from typing import List, TYPE_CHECKING
+from typing import List, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from core.connection import ConnectionHandler
 from config.logger import setup_logging
 from wsgiref.handlers import format_date_time
 from core.providers.asr.base import ASRProviderBase
+from core.utils.ws_pool import get_ws_pool
 from core.providers.asr.dto.dto import InterfaceType
 
 TAG = __name__
@@ -27,13 +27,67 @@ STATUS_CONTINUE_FRAME = 1  # Định danh frame giữa
 STATUS_LAST_FRAME = 2  # Định danh frame cuối cùng
 
 
+def create_url(api_key: str, api_secret: str) -> str:
+    """Tạo URL xác thực"""
+    url = "ws://iat.cn-huabei-1.xf-yun.com/v1"
+    # Tạo timestamp định dạng RFC1123
+    now = datetime.now()
+    date = format_date_time(mktime(now.timetuple()))
+
+    # Nối chuỗi
+    signature_origin = "host: " + "iat.cn-huabei-1.xf-yun.com" + "\n"
+    signature_origin += "date: " + date + "\n"
+    signature_origin += "GET " + "/v1 " + "HTTP/1.1"
+
+    # Mã hóa bằng hmac-sha256
+    signature_sha = hmac.new(
+        api_secret.encode("utf-8"),
+        signature_origin.encode("utf-8"),
+        digestmod=hashlib.sha256,
+    ).digest()
+    signature_sha = base64.b64encode(signature_sha).decode(encoding="utf-8")
+
+    authorization_origin = (
+        'api_key="%s", algorithm="%s", headers="%s", signature="%s"'
+        % (api_key, "hmac-sha256", "host date request-line", signature_sha)
+    )
+    authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode(
+        encoding="utf-8"
+    )
+
+    # Kết hợp tham số xác thực của yêu cầu thành dictionary
+    v = {
+        "authorization": authorization,
+        "date": date,
+        "host": "iat.cn-huabei-1.xf-yun.com",
+    }
+
+    # Nối tham số xác thực, tạo url
+    url = url + "?" + urlencode(v)
+    return url
+
+
+def make_connect(api_key, api_secret):
+    """Tạo hàm kết nối cho pool, chỉ giữ thông tin xác thực (không giữ provider), URL được ký tại thời điểm kết nối"""
+
+    async def connect():
+        return await websockets.connect(
+            create_url(api_key, api_secret),
+            max_size=1000000000,
+            ping_interval=None,
+            ping_timeout=None,
+            close_timeout=10,
+        )
+
+    return connect
+
+
 class ASRProvider(ASRProviderBase):
     def __init__(self, config, delete_audio_file):
         super().__init__()
         self.interface_type = InterfaceType.STREAM
         self.config = config
         self.text = ""
-        self.decoder = opuslib_next.Decoder(16000, 1)
         self.asr_ws = None
         self.forward_task = None
         self.is_processing = False
@@ -58,51 +112,23 @@ class ASRProvider(ASRProviderBase):
         self.output_dir = config.get("output_dir", "tmp/")
         self.delete_audio_file = delete_audio_file
 
-    def create_url(self) -> str:
-        """Tạo URL xác thực"""
-        url = "ws://iat.cn-huabei-1.xf-yun.com/v1"
-        # Tạo timestamp định dạng RFC1123
-        now = datetime.now()
-        date = format_date_time(mktime(now.timetuple()))
-
-        # Nối chuỗi
-        signature_origin = "host: " + "iat.cn-huabei-1.xf-yun.com" + "\n"
-        signature_origin += "date: " + date + "\n"
-        signature_origin += "GET " + "/v1 " + "HTTP/1.1"
-
-        # Mã hóa bằng hmac-sha256
-        signature_sha = hmac.new(
-            self.api_secret.encode("utf-8"),
-            signature_origin.encode("utf-8"),
-            digestmod=hashlib.sha256,
-        ).digest()
-        signature_sha = base64.b64encode(signature_sha).decode(encoding="utf-8")
-
-        authorization_origin = (
-            'api_key="%s", algorithm="%s", headers="%s", signature="%s"'
-            % (self.api_key, "hmac-sha256", "host date request-line", signature_sha)
+        # Pool kết nối đã bắt tay và xác thực sẵn, dùng chung cho cả process
+        self.ws_pool = get_ws_pool(
+            f"xunfei_stream:{self.app_id}:{self.api_key}:{self.api_secret}",
+            make_connect(self.api_key, self.api_secret),
+            config,
         )
-        authorization = base64.b64encode(authorization_origin.encode("utf-8")).decode(
-            encoding="utf-8"
-        )
-
-        # Kết hợp tham số xác thực của yêu cầu thành dictionary
-        v = {
-            "authorization": authorization,
-            "date": date,
-            "host": "iat.cn-huabei-1.xf-yun.com",
-        }
 
-        # Nối tham số xác thực, tạo url
-        url = url + "?" + urlencode(v)
-        return url
+    def create_url(self) -> str:
+        """Tạo URL xác thực"""
+        return create_url(self.api_key, self.api_secret)
 
     async def open_audio_channels(self, conn: "ConnectionHandler"):
         await super().open_audio_channels(conn)
 
-    async def receive_audio(self, conn: "ConnectionHandler", audio, audio_have_voice):
+    async def receive_audio(self, conn: "ConnectionHandler", audio, audio_have_voice, pcm_frame=None):
         # Gọi phương thức lớp cha để xử lý logic cơ bản trước
-        await super().receive_audio(conn, audio, audio_have_voice)
+        await super().receive_audio(conn, audio, audio_have_voice, pcm_frame)
 
         # Nếu lần này có âm thanh, và trước đó chưa thiết lập kết nối
         if audio_have_voice and self.asr_ws is None and not self.is_processing:
@@ -116,7 +142,6 @@ class ASRProvider(ASRProviderBase):
         # Gửi dữ liệu audio hiện tại
         if self.asr_ws and self.is_processing and self.server_ready:
             try:
-                pcm_frame = self.decoder.decode(audio, 960)
                 await self._send_audio_frame(pcm_frame, STATUS_CONTINUE_FRAME)
             except Exception as e:
                 logger.bind(tag=TAG).warning(f"Xảy ra lỗi khi gửi dữ liệu âm thanh: {e}")
@@ -126,21 +151,13 @@ class ASRProvider(ASRProviderBase):
         """Bắt đầu phiên nhận dạng"""
         try:
             self.is_processing = True
-            # Thiết lập kết nối WebSocket
-            ws_url = self.create_url()
-            logger.bind(tag=TAG).info(f"Đang kết nối dịch vụ ASR: {ws_url[:50]}...")
-
             # Nếu là chế độ thủ công, đặt thời gian chờ là một phút
             if conn.client_listen_mode == "manual":
                 self.iat_params["eos"] = 60000
 
-            self.asr_ws = await websockets.connect(
-                ws_url,
-                max_size=1000000000,
-                ping_interval=None,
-                ping_timeout=None,
-                close_timeout=10,
-            )
+            # Lấy kết nối WebSocket từ pool (không có sẵn thì kết nối mới)
+            logger.bind(tag=TAG).info("Đang kết nối dịch vụ ASR")
+            self.asr_ws = await self.ws_pool.acquire()
 
             logger.bind(tag=TAG).info("Kết nối WebSocket ASR đã được thiết lập")
             self.server_ready = False
@@ -148,18 +165,15 @@ class ASRProvider(ASRProviderBase):
 
             # Gửi frame âm thanh đầu tiên
             if conn.asr_audio and len(conn.asr_audio) > 0:
-                first_audio = conn.asr_audio[-1] if conn.asr_audio else b""
-                pcm_frame = (
-                    self.decoder.decode(first_audio, 960) if first_audio else b""
-                )
+                cached_pcm = self.get_cached_pcm(conn, 10)
+                pcm_frame = cached_pcm[-1] if cached_pcm else b""
                 await self._send_audio_frame(pcm_frame, STATUS_FIRST_FRAME)
                 self.server_ready = True
                 logger.bind(tag=TAG).info("Đã gửi frame đầu tiên, bắt đầu nhận dạng")
 
                 # Gửi dữ liệu âm thanh đã lưu vào bộ đệm
-                for cached_audio in conn.asr_audio[-10:]:
+                for pcm_frame in cached_pcm[-10:]:
                     try:
-                        pcm_frame = self.decoder.decode(cached_audio, 960)
                         await self._send_audio_frame(pcm_frame, STATUS_CONTINUE_FRAME)
                     except Exception as e:
                         logger.bind(tag=TAG).info(f"Xảy ra lỗi khi gửi dữ liệu âm thanh đã lưu vào bộ đệm: {e}")
@@ -257,7 +271,10 @@ class ASRProvider(ASRProviderBase):
             conn.reset_audio_states()
 
     async def handle_voice_stop(
-        self, conn: "ConnectionHandler", asr_audio_task: List[bytes]
+        self,
+        conn: "ConnectionHandler",
+        asr_audio_task: List[bytes],
+        pcm_task: Optional[List[bytes]] = None,
     ):
         """Xử lý dừng giọng nói, gửi frame cuối cùng và xử lý kết quả nhận dạng"""
         try:
@@ -271,7 +288,7 @@ class ASRProvider(ASRProviderBase):
                 except Exception as e:
                     logger.bind(tag=TAG).error(f"Gửi yêu cầu dừng thất bại: {e}")
 
-            await super().handle_voice_stop(conn, asr_audio_task)
+            await super().handle_voice_stop(conn, asr_audio_task, pcm_task)
         except Exception as e:
             logger.bind(tag=TAG).error(f"Xử lý dừng giọng nói thất bại: {e}")
             import traceback
@@ -341,13 +358,3 @@ class ASRProvider(ASRProviderBase):
                 pass
             self.forward_task = None
         self.is_processing = False
-
-        # Giải phóng tài nguyên decoder một cách rõ ràng
-        if hasattr(self, "decoder") and self.decoder is not None:
-            try:
-                del self.decoder
-                self.decoder = None
-                logger.bind(tag=TAG).debug("Tài nguyên Xunfei decoder đã được giải phóng")
-            except Exception as e:
-                logger.bind(tag=TAG).debug(f"Xảy ra lỗi khi giải phóng tài nguyên Xunfei decoder: {e}")
-
@@ -8,11 +8,11 @@ from config.logger import setup_logging
 from core.utils.util import get_system_error_response
 import re
 import json
+import asyncio
 import hashlib
 import time
 
 
-
 TAG = __name__
 logger = setup_logging()
 
@@ -28,6 +28,9 @@ class IntentProvider(IntentProviderBase):
         self.cache_manager = cache_manager
         self.CacheType = CacheType
         self.history_count = 4  # Mặc định sử dụng 4 bản ghi hội thoại gần nhất
+        # Thời gian tối đa chờ LLM nhận dạng ý định, quá thời gian thì hủy và tiếp tục trò chuyện
+        llm_timeout = config.get("llm_timeout", 8)
+        self.llm_timeout = float(llm_timeout) if llm_timeout else None
 
     def get_intent_system_prompt(self, functions_list: str) -> str:
         """
@@ -121,6 +124,7 @@ class IntentProvider(IntentProviderBase):
         return prompt
 
     def replyResult(self, text: str, original_text: str):
+        """Tạo câu trả lời từ kết quả công cụ, được gọi trong thread pool (intentHandler) nên dùng giao diện đồng bộ"""
         try:
             llm_result = self.llm.response_no_stream(
                 system_prompt=text,
@@ -207,9 +211,18 @@ class IntentProvider(IntentProviderBase):
         logger.bind(tag=TAG).debug(f"Bắt đầu gọi LLM nhận dạng ý định, model: {model_info}")
 
         try:
-            intent = self.llm.response_no_stream(
-                system_prompt=prompt_music, user_prompt=user_prompt
+            # Gọi LLM bất đồng bộ để không chặn event loop (âm thanh của các kết nối khác vẫn chạy)
+            intent = await asyncio.wait_for(
+                self.llm.response_no_stream_async(
+                    system_prompt=prompt_music, user_prompt=user_prompt
+                ),
+                timeout=self.llm_timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.bind(tag=TAG).warning(
+                f"Nhận dạng ý định quá thời gian {self.llm_timeout} giây, model: {model_info}, tiếp tục trò chuyện thông thường"
             )
+            return '{"function_call": {"name": "continue_chat"}}'
         except Exception as e:
             # Xử lý exception message an toàn với Unicode
             try:
@@ -1,3 +1,4 @@
+import asyncio
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 
@@ -32,3 +33,59 @@ class LLMProviderBase(ABC):
         for token in self.response(session_id, dialogue):
             yield token, None
 
+    async def response_no_stream_async(self, system_prompt, user_prompt, **kwargs):
+        """Phiên bản bất đồng bộ của response_no_stream, có thể hủy bằng task.cancel()/asyncio.wait_for"""
+        dialogue = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        result = ""
+        async for part in self.response_async("", dialogue, **kwargs):
+            result += part
+        return result
+
+    async def response_async(self, session_id, dialogue, **kwargs):
+        """
+        Giao diện streaming bất đồng bộ (async generator), provider có client async nên override
+        Mặc định chuyển generator đồng bộ sang thread pool, mỗi lần lấy một phần
+        """
+        async for token in _iterate_in_thread(
+            self.response(session_id, dialogue, **kwargs)
+        ):
+            yield token
+
+    async def response_with_functions_async(
+        self, session_id, dialogue, functions=None, **kwargs
+    ):
+        """
+        Phiên bản bất đồng bộ của response_with_functions, yield (content, tool_calls)
+        Mặc định chuyển generator đồng bộ sang thread pool
+        """
+        async for item in _iterate_in_thread(
+            self.response_with_functions(session_id, dialogue, functions=functions)
+        ):
+            yield item
+
+    def has_async_stream(self):
+        """Provider có tự triển khai giao diện streaming bất đồng bộ hay không"""
+        return type(self).response_async is not LLMProviderBase.response_async
+
+
+_STREAM_END = object()
+
+
+async def _iterate_in_thread(generator):
+    """Duyệt generator đồng bộ mà không chặn event loop"""
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            item = await loop.run_in_executor(None, next, generator, _STREAM_END)
+            if item is _STREAM_END:
+                break
+            yield item
+    finally:
+        try:
+            generator.close()
+        except ValueError:
+            # Bị hủy khi thread vẫn đang chạy next(), generator sẽ tự kết thúc cùng thread
+            pass
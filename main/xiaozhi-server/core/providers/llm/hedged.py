@@ -0,0 +1,242 @@
+"""
+Gửi yêu cầu dự phòng (hedged request) tới LLM thứ hai
+Nếu LLM chính chưa trả về token đầu tiên sau một khoảng thời gian, gửi thêm yêu cầu tới LLM dự phòng,
+luồng nào có token đầu tiên trước thì được giữ, luồng còn lại bị hủy. LLM chính lỗi trước khi có token thì chuyển ngay sang dự phòng.
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional
+from config.logger import setup_logging
+from core.providers.llm.base import LLMProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_FIRST_TOKEN_TIMEOUT_MS = 1500
+
+
+class HedgeStats:
+    """Thống kê dùng chung của process: tỷ lệ gửi dự phòng và bên thắng"""
+
+    def __init__(self, stats_interval: float = 60):
+        self.stats_interval = stats_interval
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0,
+            "hedged": 0,
+            "primary_wins": 0,
+            "backup_wins": 0,
+            "fallbacks": 0,
+            "failures": 0,
+        }
+        self._last_log = time.monotonic()
+
+    def incr(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        self._maybe_log()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        requests = stats["requests"]
+        stats["hedge_rate"] = round(stats["hedged"] / requests, 3) if requests else 0.0
+        # Tỷ lệ dự phòng thắng trong các lần đã gửi yêu cầu dự phòng (do chậm hoặc do lỗi)
+        backup_sent = stats["hedged"] + stats["fallbacks"]
+        stats["backup_win_rate"] = (
+            round(stats["backup_wins"] / backup_sent, 3) if backup_sent else 0.0
+        )
+        return stats
+
+    def _maybe_log(self):
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_log < self.stats_interval:
+            return
+        self._last_log = now
+        stats = self.get_stats()
+        logger.bind(tag=TAG).info(
+            f"Thống kê LLM dự phòng: {stats['requests']} yêu cầu, gửi dự phòng {stats['hedged']} lần "
+            f"(tỷ lệ {stats['hedge_rate']:.1%}), chính thắng {stats['primary_wins']}, "
+            f"dự phòng thắng {stats['backup_wins']}, chuyển do lỗi {stats['fallbacks']}, thất bại {stats['failures']}"
+        )
+
+
+hedge_stats = HedgeStats()
+
+
+def _is_token(item) -> bool:
+    """Phần tử có nội dung thực (bỏ qua các chunk rỗng như chunk chỉ chứa role)"""
+    if isinstance(item, tuple):
+        content, tool_calls = item[0], item[1] if len(item) > 1 else None
+        return bool(content) or tool_calls is not None
+    return bool(item)
+
+
+async def _first_token(stream) -> List[Any]:
+    """Đọc đến phần tử có nội dung đầu tiên, trả về các phần tử đã đọc (ném StopAsyncIteration nếu luồng rỗng)"""
+    buffered = []
+    while True:
+        item = await stream.__anext__()
+        buffered.append(item)
+        if _is_token(item):
+            return buffered
+
+
+async def _discard(task: asyncio.Task, stream):
+    """Hủy luồng thua cuộc và đóng kết nối HTTP của nó"""
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+class HedgedLLMProvider(LLMProviderBase):
+    def __init__(self, primary: LLMProviderBase, backup: LLMProviderBase, config: dict):
+        self.primary = primary
+        self.backup = backup
+        timeout_ms = config.get("first_token_timeout_ms", DEFAULT_FIRST_TOKEN_TIMEOUT_MS)
+        self.first_token_timeout = (
+            float(timeout_ms) if timeout_ms else DEFAULT_FIRST_TOKEN_TIMEOUT_MS
+        ) / 1000
+
+    def __getattr__(self, name):
+        # Các thuộc tính riêng của provider (model_name, ...) lấy từ LLM chính
+        if name in ("primary", "backup"):
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    # Giao diện đồng bộ không gửi dự phòng, chat dùng giao diện bất đồng bộ (has_async_stream luôn True)
+    def response(self, session_id, dialogue, **kwargs):
+        return self.primary.response(session_id, dialogue, **kwargs)
+
+    def response_with_functions(self, session_id, dialogue, functions=None):
+        return self.primary.response_with_functions(
+            session_id, dialogue, functions=functions
+        )
+
+    async def response_async(self, session_id, dialogue, **kwargs):
+        async for item in self._hedged(
+            lambda provider: provider.response_async(session_id, dialogue, **kwargs)
+        ):
+            yield item
+
+    async def response_with_functions_async(
+        self, session_id, dialogue, functions=None, **kwargs
+    ):
+        async for item in self._hedged(
+            lambda provider: provider.response_with_functions_async(
+                session_id, dialogue, functions=functions, **kwargs
+            )
+        ):
+            yield item
+
+    async def _hedged(self, open_stream):
+        hedge_stats.incr("requests")
+        primary_stream = open_stream(self.primary)
+        primary_task = asyncio.ensure_future(_first_token(primary_stream))
+        backup_stream: Optional[Any] = None
+        backup_task: Optional[asyncio.Task] = None
+        winner_stream = None
+        buffered: List[Any] = []
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.first_token_timeout)
+            if done and primary_task.exception() is None:
+                hedge_stats.incr("primary_wins")
+                winner_stream, buffered = primary_stream, primary_task.result()
+            else:
+                if done:
+                    hedge_stats.incr("fallbacks")
+                    error = primary_task.exception()
+                    logger.bind(tag=TAG).warning(
+                        "LLM chính trả về phản hồi rỗng, chuyển sang LLM dự phòng"
+                        if isinstance(error, StopAsyncIteration)
+                        else f"LLM chính lỗi trước token đầu tiên, chuyển sang LLM dự phòng: {error!r}"
+                    )
+                else:
+                    hedge_stats.incr("hedged")
+                    logger.bind(tag=TAG).info(
+                        f"LLM chính chưa có token đầu tiên sau {self.first_token_timeout * 1000:.0f}ms, gửi yêu cầu dự phòng"
+                    )
+                backup_stream = open_stream(self.backup)
+                backup_task = asyncio.ensure_future(_first_token(backup_stream))
+                winner_stream, buffered = await self._race(
+                    primary_stream, primary_task, backup_stream, backup_task
+                )
+        except BaseException:
+            # Bị hủy hoặc cả hai đều lỗi: đóng mọi luồng còn mở
+            await _discard(primary_task, primary_stream)
+            if backup_task is not None:
+                await _discard(backup_task, backup_stream)
+            raise
+
+        try:
+            for item in buffered:
+                yield item
+            async for item in winner_stream:
+                yield item
+        finally:
+            aclose = getattr(winner_stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def _race(self, primary_stream, primary_task, backup_stream, backup_task):
+        """Chờ luồng có token đầu tiên trước, hủy luồng còn lại; cả hai lỗi thì ném lỗi của LLM chính"""
+        candidates = {primary_task: primary_stream, backup_task: backup_stream}
+        pending = {task for task in candidates if not task.done()}
+        finished = [task for task in candidates if task.done()]
+        while True:
+            for task in finished:
+                if task.exception() is None:
+                    loser = backup_task if task is primary_task else primary_task
+                    await _discard(loser, candidates[loser])
+                    hedge_stats.incr(
+                        "primary_wins" if task is primary_task else "backup_wins"
+                    )
+                    return candidates[task], task.result()
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            finished = list(done)
+
+        hedge_stats.incr("failures")
+        error = primary_task.exception()
+        if isinstance(error, StopAsyncIteration):
+            # Luồng rỗng: trả về luồng rỗng để chat xử lý như phản hồi rỗng
+            return primary_stream, []
+        raise error
+
+
+def create_hedged_llm(primary: LLMProviderBase, config: dict, create_backup) -> LLMProviderBase:
+    """Bọc LLM chính bằng HedgedLLMProvider nếu cấu hình llm_hedging được bật
+
+    Args:
+        primary: Instance LLM chính
+        config: Cấu hình đầy đủ
+        create_backup: Hàm tạo instance LLM từ tên module trong mục LLM
+    """
+    hedging_config = config.get("llm_hedging") or {}
+    if str(hedging_config.get("enabled", False)).lower() not in ("true", "1", "yes"):
+        return primary
+    backup_name = hedging_config.get("backup_llm")
+    if not backup_name or backup_name not in (config.get("LLM") or {}):
+        logger.bind(tag=TAG).warning(
+            f"llm_hedging.backup_llm không hợp lệ: {backup_name}, bỏ qua gửi yêu cầu dự phòng"
+        )
+        return primary
+    if backup_name == config["selected_module"].get("LLM"):
+        logger.bind(tag=TAG).warning("LLM dự phòng trùng với LLM chính, bỏ qua gửi yêu cầu dự phòng")
+        return primary
+
+    stats_interval = hedging_config.get("stats_interval", 60)
+    hedge_stats.stats_interval = float(stats_interval) if stats_interval else 0
+    return HedgedLLMProvider(primary, create_backup(backup_name), hedging_config)
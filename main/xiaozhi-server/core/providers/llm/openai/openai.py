@@ -46,6 +46,8 @@ class LLMProvider(LLMProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
         self.client = openai.OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=httpx.Timeout(self.timeout))
+        # Client bất đồng bộ cho chat_async, chạy trực tiếp trên event loop của kết nối
+        self.async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=httpx.Timeout(self.timeout))
 
     @staticmethod
     def normalize_dialogue(dialogue):
@@ -56,55 +58,71 @@ class LLMProvider(LLMProviderBase):
         return dialogue
 
     def response(self, session_id, dialogue, **kwargs):
-        dialogue = self.normalize_dialogue(dialogue)
-
-        request_params = {
-            "model": self.model_name,
-            "messages": dialogue,
-            "stream": True,
-        }
-
-        # Thêm tham số tùy chọn, chỉ thêm khi tham số không phải None
-        optional_params = {
-            "max_tokens": kwargs.get("max_tokens", self.max_tokens),
-            "temperature": kwargs.get("temperature", self.temperature),
-            "top_p": kwargs.get("top_p", self.top_p),
-            "frequency_penalty": kwargs.get("frequency_penalty", self.frequency_penalty),
-        }
-
-        for key, value in optional_params.items():
-            if value is not None:
-                request_params[key] = value
-
+        request_params = self._build_request_params(dialogue, **kwargs)
         responses = self.client.chat.completions.create(**request_params)
 
-        is_active = True
+        think_filter = _ThinkFilter()
         for chunk in responses:
-            try:
-                delta = chunk.choices[0].delta if getattr(chunk, "choices", None) else None
-                content = getattr(delta, "content", "") if delta else ""
-            except IndexError:
-                content = ""
+            content = think_filter.feed(self._chunk_content(chunk))
             if content:
-                if "<think>" in content:
-                    is_active = False
-                    content = content.split("<think>")[0]
-                if "</think>" in content:
-                    is_active = True
-                    content = content.split("</think>")[-1]
-                if is_active:
+                yield content
+
+    async def response_async(self, session_id, dialogue, **kwargs):
+        request_params = self._build_request_params(dialogue, **kwargs)
+        responses = await self.async_client.chat.completions.create(**request_params)
+
+        think_filter = _ThinkFilter()
+        try:
+            async for chunk in responses:
+                content = think_filter.feed(self._chunk_content(chunk))
+                if content:
                     yield content
+        finally:
+            await responses.close()
 
     def response_with_functions(self, session_id, dialogue, functions=None, **kwargs):
+        request_params = self._build_request_params(dialogue, functions, **kwargs)
+        stream = self.client.chat.completions.create(**request_params)
+
+        for chunk in stream:
+            if getattr(chunk, "choices", None):
+                delta = chunk.choices[0].delta
+                content = getattr(delta, "content", "")
+                tool_calls = getattr(delta, "tool_calls", None)
+                yield content, tool_calls
+            elif isinstance(getattr(chunk, "usage", None), CompletionUsage):
+                self._log_usage(chunk.usage)
+
+    async def response_with_functions_async(
+        self, session_id, dialogue, functions=None, **kwargs
+    ):
+        request_params = self._build_request_params(dialogue, functions, **kwargs)
+        stream = await self.async_client.chat.completions.create(**request_params)
+
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "choices", None):
+                    delta = chunk.choices[0].delta
+                    content = getattr(delta, "content", "")
+                    tool_calls = getattr(delta, "tool_calls", None)
+                    yield content, tool_calls
+                elif isinstance(getattr(chunk, "usage", None), CompletionUsage):
+                    self._log_usage(chunk.usage)
+        finally:
+            await stream.close()
+
+    def _build_request_params(self, dialogue, functions=None, **kwargs):
         dialogue = self.normalize_dialogue(dialogue)
 
         request_params = {
             "model": self.model_name,
             "messages": dialogue,
             "stream": True,
-            "tools": functions,
         }
+        if functions is not None:
+            request_params["tools"] = functions
 
+        # Thêm tham số tùy chọn, chỉ thêm khi tham số không phải None
         optional_params = {
             "max_tokens": kwargs.get("max_tokens", self.max_tokens),
             "temperature": kwargs.get("temperature", self.temperature),
@@ -115,19 +133,38 @@ class LLMProvider(LLMProviderBase):
         for key, value in optional_params.items():
             if value is not None:
                 request_params[key] = value
+        return request_params
 
-        stream = self.client.chat.completions.create(**request_params)
+    @staticmethod
+    def _chunk_content(chunk):
+        try:
+            delta = chunk.choices[0].delta if getattr(chunk, "choices", None) else None
+            return getattr(delta, "content", "") if delta else ""
+        except IndexError:
+            return ""
 
-        for chunk in stream:
-            if getattr(chunk, "choices", None):
-                delta = chunk.choices[0].delta
-                content = getattr(delta, "content", "")
-                tool_calls = getattr(delta, "tool_calls", None)
-                yield content, tool_calls
-            elif isinstance(getattr(chunk, "usage", None), CompletionUsage):
-                usage_info = getattr(chunk, "usage", None)
-                logger.bind(tag=TAG).info(
-                    f"Token tiêu thụ: đầu vào {getattr(usage_info, 'prompt_tokens', 'không xác định')}, "
-                    f"đầu ra {getattr(usage_info, 'completion_tokens', 'không xác định')}, "
-                    f"tổng cộng {getattr(usage_info, 'total_tokens', 'không xác định')}"
-                )
+    @staticmethod
+    def _log_usage(usage_info):
+        logger.bind(tag=TAG).info(
+            f"Token tiêu thụ: đầu vào {getattr(usage_info, 'prompt_tokens', 'không xác định')}, "
+            f"đầu ra {getattr(usage_info, 'completion_tokens', 'không xác định')}, "
+            f"tổng cộng {getattr(usage_info, 'total_tokens', 'không xác định')}"
+        )
+
+
+class _ThinkFilter:
+    """Bỏ phần suy luận nằm giữa <think> và </think> trong luồng phản hồi"""
+
+    def __init__(self):
+        self.is_active = True
+
+    def feed(self, content):
+        if not content:
+            return ""
+        if "<think>" in content:
+            self.is_active = False
+            content = content.split("<think>")[0]
+        if "</think>" in content:
+            self.is_active = True
+            content = content.split("</think>")[-1]
+        return content if self.is_active else ""
@@ -1,5 +1,6 @@
 """Module công cụ plugin phía máy chủ"""
 
 from .plugin_executor import ServerPluginExecutor
+from .plugin_runtime import get_plugin_runtime, get_plugin_stats
 
-__all__ = ["ServerPluginExecutor"]
+__all__ = ["ServerPluginExecutor", "get_plugin_runtime", "get_plugin_stats"]
@@ -6,6 +6,7 @@ if TYPE_CHECKING:
     from core.connection import ConnectionHandler
 from ..base import ToolType, ToolDefinition, ToolExecutor
 from plugins_func.register import all_function_registry, Action, ActionResponse
+from .plugin_runtime import get_plugin_runtime, PluginTimeoutError
 
 
 class ServerPluginExecutor(ToolExecutor):
@@ -14,6 +15,9 @@ class ServerPluginExecutor(ToolExecutor):
     def __init__(self, conn: "ConnectionHandler"):
         self.conn = conn
         self.config = conn.config
+        self.runtime = get_plugin_runtime(self.config)
+        # Plugin đồng bộ của kết nối này chạy trong thread pool plugin dùng chung
+        self.executor = self.runtime.executor_for(getattr(conn, "device_id", "") or "")
 
     async def execute(
         self, conn: "ConnectionHandler", tool_name: str, arguments: Dict[str, Any]
@@ -30,19 +34,27 @@ class ServerPluginExecutor(ToolExecutor):
             if hasattr(func_item, "type"):
                 func_type = func_item.type
                 if func_type.code in [4, 5]:  # SYSTEM_CTL, IOT_CTL (cần tham số conn)
-                    result = func_item.func(conn, **arguments)
+                    args = (conn,)
                 elif func_type.code == 2:  # WAIT
-                    result = func_item.func(**arguments)
+                    args = ()
                 elif func_type.code == 3:  # CHANGE_SYS_PROMPT
-                    result = func_item.func(conn, **arguments)
+                    args = (conn,)
                 else:
-                    result = func_item.func(**arguments)
+                    args = ()
             else:
                 # Mặc định không truyền tham số conn
-                result = func_item.func(**arguments)
+                args = ()
 
+            # Plugin async chạy trên event loop, plugin đồng bộ chạy trong thread pool, không chặn loop
+            result = await self.runtime.run(self.executor, func_item, *args, **arguments)
             return result
 
+        except PluginTimeoutError as e:
+            return ActionResponse(
+                action=Action.ERROR,
+                result=str(e),
+                response="Dịch vụ phản hồi quá chậm, vui lòng thử lại sau",
+            )
         except Exception as e:
             return ActionResponse(
                 action=Action.ERROR,
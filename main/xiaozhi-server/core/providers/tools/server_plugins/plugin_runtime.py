@@ -0,0 +1,192 @@
+"""
+Môi trường chạy plugin phía máy chủ
+Plugin async chạy trực tiếp trên event loop, plugin đồng bộ (thường gọi requests chặn) chạy trong thread pool riêng có giới hạn,
+mỗi plugin có thời gian chờ, số lần gọi đồng thời tối đa và thống kê độ trễ riêng
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Tuple
+from config.logger import setup_logging
+from core.utils.worker_pool import FairWorkerPool, ConnectionExecutor
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+class PluginTimeoutError(Exception):
+    """Plugin chạy quá thời gian cho phép (tính cả thời gian chờ lượt)"""
+
+
+class PluginStats:
+    __slots__ = ("calls", "errors", "timeouts", "in_flight", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.in_flight = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.calls - self.in_flight
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "in_flight": self.in_flight,
+            "avg_ms": round(self.total_ms / finished, 1) if finished > 0 else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class PluginRuntime:
+    def __init__(self, config: dict):
+        runtime_config = config.get("plugin_executor") or {}
+        max_workers = runtime_config.get("max_workers") or DEFAULT_MAX_WORKERS
+        self.pool = FairWorkerPool("plugin-worker", int(max_workers))
+        self.default_timeout = float(
+            runtime_config.get("default_timeout") or DEFAULT_TIMEOUT
+        )
+        self.default_max_concurrency = int(
+            runtime_config.get("default_max_concurrency") or DEFAULT_MAX_CONCURRENCY
+        )
+        self.plugins_config = config.get("plugins") or {}
+
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, PluginStats] = {}
+
+    def executor_for(self, owner: str = "") -> ConnectionExecutor:
+        """Executor plugin của một kết nối, các kết nối được chia lượt công bằng trong pool"""
+        return self.pool.executor_for(owner)
+
+    def _limits(self, func_item) -> Tuple[Optional[float], int]:
+        """Thứ tự ưu tiên: plugins.<tên> trong cấu hình > tham số register_function > mặc định"""
+        plugin_config = self.plugins_config.get(func_item.name)
+        if not isinstance(plugin_config, dict):
+            plugin_config = {}
+        timeout = plugin_config.get("timeout", func_item.timeout)
+        if timeout is None:
+            timeout = self.default_timeout
+        max_concurrency = plugin_config.get("max_concurrency", func_item.max_concurrency)
+        if not max_concurrency:
+            max_concurrency = self.default_max_concurrency
+        return (float(timeout) if timeout else None), int(max_concurrency)
+
+    def _limiter(self, name: str, max_concurrency: int) -> asyncio.Semaphore:
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = asyncio.Semaphore(max_concurrency)
+            self._limiters[name] = limiter
+        return limiter
+
+    def _stats_for(self, name: str) -> PluginStats:
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = PluginStats()
+                self._stats[name] = stats
+            return stats
+
+    async def run(self, executor: ConnectionExecutor, func_item, *args, **kwargs):
+        """Chạy plugin với giới hạn đồng thời và thời gian chờ, quá thời gian thì ném PluginTimeoutError"""
+        timeout, max_concurrency = self._limits(func_item)
+        limiter = self._limiter(func_item.name, max_concurrency)
+        stats = self._stats_for(func_item.name)
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        stats.calls += 1
+        stats.in_flight += 1
+        failed = False
+        try:
+            try:
+                await asyncio.wait_for(limiter.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise PluginTimeoutError(
+                    f"Plugin {func_item.name} chờ lượt quá {timeout} giây (tối đa {max_concurrency} lần gọi đồng thời)"
+                )
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+
+            try:
+                if func_item.is_async:
+                    try:
+                        return await asyncio.wait_for(func_item.func(*args, **kwargs), remaining)
+                    finally:
+                        limiter.release()
+
+                try:
+                    future = executor.submit(func_item.func, *args, **kwargs)
+                except Exception:
+                    limiter.release()
+                    raise
+                # Thread không thể bị ngắt, chỉ trả lượt khi hàm đồng bộ thực sự kết thúc
+                future.add_done_callback(
+                    lambda _: _release_threadsafe(loop, limiter)
+                )
+                return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+            except asyncio.TimeoutError:
+                raise PluginTimeoutError(
+                    f"Plugin {func_item.name} chạy quá {timeout} giây"
+                )
+        except PluginTimeoutError:
+            stats.timeouts += 1
+            failed = True
+            raise
+        except Exception:
+            stats.errors += 1
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            stats.in_flight -= 1
+            stats.total_ms += elapsed_ms
+            if elapsed_ms > stats.max_ms:
+                stats.max_ms = elapsed_ms
+            logger.bind(tag=TAG).debug(
+                f"Plugin {func_item.name} {'thất bại' if failed else 'hoàn thành'}, thời gian: {elapsed_ms:.1f}ms"
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            plugins = {name: stats.to_dict() for name, stats in self._stats.items()}
+        return {"pool": self.pool.get_stats(), "plugins": plugins}
+
+
+def _release_threadsafe(loop: asyncio.AbstractEventLoop, limiter: asyncio.Semaphore):
+    try:
+        loop.call_soon_threadsafe(limiter.release)
+    except RuntimeError:
+        # Loop đã đóng, không còn ai chờ lượt
+        pass
+
+
+_plugin_runtime: Optional[PluginRuntime] = None
+_plugin_runtime_lock = threading.Lock()
+
+
+def get_plugin_runtime(config: dict = None) -> PluginRuntime:
+    """Lấy môi trường chạy plugin dùng chung của process, lần gọi đầu tiên đọc cấu hình plugin_executor"""
+    global _plugin_runtime
+    with _plugin_runtime_lock:
+        if _plugin_runtime is None:
+            _plugin_runtime = PluginRuntime(config or {})
+            logger.bind(tag=TAG).info(
+                f"Khởi tạo thread pool plugin: max_workers={_plugin_runtime.pool.max_workers}, "
+                f"timeout mặc định={_plugin_runtime.default_timeout}s, "
+                f"đồng thời tối đa mặc định={_plugin_runtime.default_max_concurrency}"
+            )
+        return _plugin_runtime
+
+
+def get_plugin_stats() -> Dict[str, Any]:
+    """Thống kê số lần gọi, lỗi, quá thời gian và độ trễ của từng plugin"""
+    if _plugin_runtime is None:
+        return {}
+    return _plugin_runtime.get_stats()
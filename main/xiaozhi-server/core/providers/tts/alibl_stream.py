@@ -2,7 +2,6 @@ import os
 import uuid
 import json
 import time
-import queue
 import asyncio
 import traceback
 import websockets
@@ -85,11 +84,11 @@ class TTSProvider(TTSProviderBase):
             self.last_active_time = None
             raise
 
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
         """Luồng xử lý văn bản TTS streaming"""
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self.tts_text_queue.get()
                 logger.bind(tag=TAG).debug(
                     f"Nhận tác vụ TTS｜{message.sentence_type.name} ｜ {message.content_type.name} | ID phiên: {self.conn.sentence_id}"
                 )
@@ -113,11 +112,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).info(f"Tự động tạo ID phiên mới: {self.conn.sentence_id}")
 
                         logger.bind(tag=TAG).info("Bắt đầu khởi động phiên TTS...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.start_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
+                        await self.start_session(self.conn.sentence_id)
                         self.before_stop_play_files.clear()
                         logger.bind(tag=TAG).info("Phiên TTS đã khởi động thành công")
                     except Exception as e:
@@ -130,11 +125,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).debug(
                                 f"Bắt đầu gửi văn bản TTS: {message.content_detail}"
                             )
-                            future = asyncio.run_coroutine_threadsafe(
-                                self.text_to_speak(message.content_detail, None),
-                                loop=self.conn.loop,
-                            )
-                            future.result()
+                            await self.text_to_speak(message.content_detail, None)
                             logger.bind(tag=TAG).debug("Văn bản TTS đã gửi thành công")
                         except Exception as e:
                             logger.bind(tag=TAG).error(f"Gửi văn bản TTS thất bại: {str(e)}")
@@ -146,22 +137,18 @@ class TTSProvider(TTSProviderBase):
                     )
                     if message.content_file and os.path.exists(message.content_file):
                         # Xử lý dữ liệu audio của file trước
-                        self._process_audio_file_stream(message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
+                        await self.run_blocking(self._process_audio_file_stream, message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
 
                 if message.sentence_type == SentenceType.LAST:
                     try:
                         logger.bind(tag=TAG).info("Bắt đầu kết thúc phiên TTS...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.finish_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
+                        await self.finish_session(self.conn.sentence_id)
                     except Exception as e:
                         logger.bind(tag=TAG).error(f"Kết thúc phiên TTS thất bại: {str(e)}")
                         continue
 
-            except queue.Empty:
-                continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản TTS thất bại: {str(e)}, loại: {type(e).__name__}, stack: {traceback.format_exc()}"
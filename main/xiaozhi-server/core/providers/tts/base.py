@@ -1,19 +1,29 @@
 import os
 import re
+import time
 import uuid
-import queue
 import asyncio
-import threading
 import traceback
 
 from core.utils import p3
 from datetime import datetime
 from core.utils import textUtils
-from typing import Callable, Any
+from typing import Callable, Any, Dict
 from abc import ABC, abstractmethod
 from config.logger import setup_logging
 from core.utils import opus_encoder_utils
+from core.utils.loop_queue import LoopQueue
+from core.utils.worker_pool import run_in_worker_loop
+from core.utils.provider_scheduler import (
+    PRIORITY_FIRST,
+    PRIORITY_NORMAL,
+    get_provider_scheduler,
+)
 from core.utils.tts import MarkdownCleaner
+from core.utils.sentence_segmenter import StreamingSentenceSegmenter
+from core.utils.tts_cache import config_fingerprint, get_tts_cache
+from core.utils.audio_decode import conversion_stats
+from core.utils.ogg_opus import OGG_OPUS_TYPES
 from core.utils.output_counter import add_device_output
 from core.handle.reportHandle import enqueue_tts_report
 from core.handle.sendAudioHandle import sendAudioMessage
@@ -35,13 +45,34 @@ class TTSProviderBase(ABC):
         self.conn = None
         self.delete_audio_file = delete_audio_file
         self.audio_file_type = "wav"
+        # Tần số PCM provider trả về được (thương lượng định dạng đầu ra): None là không hỗ trợ PCM, () là mọi tần số
+        self.pcm_sample_rates = None
+        # Tần số Ogg/Opus provider trả về được, gói Opus được chuyển thẳng cho thiết bị không cần giải mã/mã hóa lại
+        self.ogg_opus_sample_rates = None
+        # Tần số của PCM provider trả về sau khi thương lượng, None nghĩa là đúng tần số của thiết bị
+        self.output_sample_rate = None
+        self.output_conversion = None
+        self.output_format_key = None
+        # Provider tương thích (ví dụ cổng OpenAI bên thứ ba) không hỗ trợ PCM có thể tắt bằng negotiate_format: false
+        self.negotiate_format = str(config.get("negotiate_format", True)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
         self.output_file = config.get("output_dir", "tmp/")
-        self.tts_text_queue = queue.Queue()
-        self.tts_audio_queue = queue.Queue()
+        # Cấu hình đã bỏ thông tin xác thực, dùng cho khóa đệm TTS (hai cấu hình khác giọng không dùng chung đệm)
+        self.config_fingerprint = config_fingerprint(config)
+        self.tts_text_queue = LoopQueue()
+        self.tts_audio_queue = LoopQueue()
+        # text_to_speak của phần lớn provider không streaming dùng thư viện HTTP đồng bộ,
+        # nên mặc định chạy trên thread pool dùng chung; provider thuần bất đồng bộ đặt False để chạy thẳng trên loop
+        self.blocking_synthesis = True
+        self.tts_text_task = None
+        self.audio_play_task = None
+        self._background_tasks = set()
         self.tts_audio_first_sentence = True
         self.before_stop_play_files = []
 
-        self.tts_text_buff = []
         self.punctuations = (
             "。",
             "？",
@@ -66,9 +97,12 @@ class TTSProviderBase(ABC):
             ";",
             ":",
         )
-        self.tts_stop_request = False
-        self.processed_chars = 0
-        self.is_first_sentence = True
+        # Tách câu theo luồng, chính sách tách đọc từ cấu hình tts_segmenter khi mở kênh
+        self.segmenter = StreamingSentenceSegmenter(
+            self.punctuations, self.first_sentence_punctuations
+        )
+        # Câu đầu tiên của lượt trả lời được ưu tiên khi provider bị giới hạn đồng thời
+        self.first_segment_pending = True
 
     def generate_filename(self, extension=".wav"):
         return os.path.join(
@@ -76,6 +110,92 @@ class TTSProviderBase(ABC):
             f"tts-{datetime.now().date()}@{uuid.uuid4().hex}{extension}",
         )
 
+    def _tmp_filename(self):
+        """File tạm của câu, PCM thô và Ogg/Opus cần đúng đuôi để khỏi bị giải mã như WAV"""
+        if self.audio_file_type == "pcm" or self.audio_file_type in OGG_OPUS_TYPES:
+            return self.generate_filename(f".{self.audio_file_type}")
+        return self.generate_filename()
+
+    def use_pcm_output(self, sample_rate: int):
+        """Chuyển yêu cầu của provider sang PCM 16-bit mono ở sample_rate; provider khai báo pcm_sample_rates cần override để đặt tham số yêu cầu"""
+        self.audio_file_type = "pcm"
+
+    def use_ogg_opus_output(self, sample_rate: int):
+        """Chuyển yêu cầu của provider sang Ogg/Opus mono ở sample_rate; provider khai báo ogg_opus_sample_rates cần override"""
+        self.audio_file_type = "ogg_opus"
+
+    def negotiate_output_format(self, conn):
+        """Chọn định dạng đầu ra rẻ nhất provider hỗ trợ: Ogg/Opus đúng tần số (chuyển thẳng gói Opus),
+        PCM đúng tần số thiết bị, PCM rồi chuyển tần số, còn lại giữ định dạng cấu hình (cần giải mã)"""
+        if self.interface_type != InterfaceType.NON_STREAM:
+            # Provider streaming tự xử lý luồng audio của mình
+            return
+        target_rate = conn.sample_rate
+        negotiation_config = conn.config.get("tts_output_negotiation") or {}
+        stats_interval = negotiation_config.get("stats_interval", 300)
+        conversion_stats.stats_interval = float(stats_interval) if stats_interval else 0
+        enabled = str(negotiation_config.get("enabled", False)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
+
+        opus_passthrough = str(
+            negotiation_config.get("opus_passthrough", False)
+        ).lower() in ("true", "1", "yes")
+
+        if (
+            enabled
+            and opus_passthrough
+            and self.negotiate_format
+            and conn.audio_format != "pcm"
+            and self.ogg_opus_sample_rates is not None
+            and target_rate in self.ogg_opus_sample_rates
+        ):
+            self.use_ogg_opus_output(target_rate)
+        elif enabled and self.negotiate_format and self.pcm_sample_rates is not None:
+            rates = sorted(self.pcm_sample_rates)
+            if not rates or target_rate in rates:
+                rate = target_rate
+            else:
+                # Ưu tiên tần số cao hơn gần nhất để giảm tần số, không mất chất lượng
+                rate = next((r for r in rates if r > target_rate), rates[-1])
+            self.use_pcm_output(rate)
+            self.output_sample_rate = rate if rate != target_rate else None
+
+        if self.audio_file_type == "pcm":
+            if self.output_sample_rate:
+                self.output_conversion = f"chuyển tần số {self.output_sample_rate}→{target_rate}"
+            else:
+                self.output_conversion = "không"
+            output_format = f"pcm@{self.output_sample_rate or target_rate}"
+        elif self.audio_file_type in OGG_OPUS_TYPES and conn.audio_format != "pcm":
+            # Thời lượng frame hoặc tần số không khớp thì tự quay lại giải mã + mã hóa
+            self.output_conversion = "chuyển thẳng gói Opus"
+            output_format = f"{self.audio_file_type}@{target_rate}"
+        else:
+            self.output_conversion = f"giải mã {self.audio_file_type}"
+            output_format = self.audio_file_type
+        self.output_format_key = (
+            f"{type(self).__module__.split('.')[-1]}:{output_format}"
+        )
+        logger.bind(tag=TAG).info(
+            f"Định dạng đầu ra TTS: {self.output_format_key}, chuyển đổi: {self.output_conversion}"
+        )
+
+    async def _convert_audio(self, func, *args, **kwargs):
+        """Giải mã/chuyển tần số/mã hóa audio của một câu trên thread pool, ghi lại thời gian theo định dạng đầu ra"""
+        start = time.monotonic()
+        try:
+            return await self.run_blocking(func, *args, **kwargs)
+        finally:
+            if self.output_conversion is not None:
+                conversion_stats.record(
+                    self.output_format_key,
+                    self.output_conversion,
+                    (time.monotonic() - start) * 1000,
+                )
+
     def handle_opus(self, opus_data: bytes):
         logger.bind(tag=TAG).debug(f"Đẩy số khung dữ liệu vào hàng đợi～～ {len(opus_data)}")
         self.tts_audio_queue.put((SentenceType.MIDDLE, opus_data, None))
@@ -83,23 +203,112 @@ class TTSProviderBase(ABC):
     def handle_audio_file(self, file_audio: bytes, text):
         self.before_stop_play_files.append((file_audio, text))
 
-    def to_tts_stream(self, text, opus_handler: Callable[[bytes], None] = None) -> None:
+    def _executor(self):
+        """Executor của kết nối (thread pool dùng chung, chia lượt giữa các kết nối)"""
+        return self.conn.executor if self.conn is not None else None
+
+    async def _synthesize(self, text, output_file, priority=PRIORITY_NORMAL):
+        """Gọi text_to_speak trong giới hạn đồng thời của provider (nếu bật provider_scheduler)"""
+        limiter = get_provider_scheduler().limiter("TTS", self)
+        if limiter is None:
+            return await self._synthesize_now(text, output_file)
+        await limiter.acquire(priority)
+        try:
+            return await self._synthesize_now(text, output_file)
+        finally:
+            limiter.release()
+
+    async def _synthesize_now(self, text, output_file):
+        """Gọi text_to_speak: provider bất đồng bộ chạy trên loop, provider chặn chạy trên thread pool"""
+        if self.blocking_synthesis:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor(),
+                run_in_worker_loop,
+                self.text_to_speak(text, output_file),
+            )
+        return await self.text_to_speak(text, output_file)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        """Chạy hàm chặn (giải mã/mã hóa audio) trên thread pool, callback đẩy vào hàng đợi vẫn an toàn"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor(), lambda: func(*args, **kwargs)
+        )
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Tham số ảnh hưởng tới audio đầu ra, dùng làm khóa đệm TTS:
+        toàn bộ cấu hình TTS đã chọn (bỏ thông tin xác thực) và định dạng đầu ra đã thương lượng"""
+        return {
+            "config": self.config_fingerprint,
+            "format": self.audio_file_type,
+            "output_sample_rate": self.output_sample_rate,
+        }
+
+    async def _play_cached(self, cache, cache_key, text, opus_handler) -> bool:
+        """Phát các frame đã đệm của câu, trả về False nếu không trúng đệm"""
+        frames = cache.get(cache_key)
+        if frames is None and cache.disk_enabled:
+            frames = await self.run_blocking(cache.load_from_disk, cache_key)
+        if not frames:
+            return False
+        logger.bind(tag=TAG).debug(f"Trúng đệm TTS: {text}")
+        self.tts_audio_queue.put((SentenceType.FIRST, None, text))
+        if opus_handler is not None:
+            for frame in frames:
+                opus_handler(frame)
+        return True
+
+    async def to_tts_stream(
+        self, text, opus_handler: Callable[[bytes], None] = None
+    ) -> None:
         text = MarkdownCleaner.clean_markdown(text)
+        priority = PRIORITY_FIRST if self.first_segment_pending else PRIORITY_NORMAL
+        self.first_segment_pending = False
+
+        # Câu ngắn hay lặp lại (lời chào, thông báo lỗi...) lấy từ đệm, không gọi nhà cung cấp và không giải mã lại
+        cache = get_tts_cache(self.conn.config)
+        cache_key = cache.key_for(self, text)
+        if cache_key is None:
+            await self._synthesize_stream(text, opus_handler, priority)
+            return None
+        if await self._play_cached(cache, cache_key, text, opus_handler):
+            return None
+
+        frames = []
+
+        def record(data):
+            frames.append(data)
+            if opus_handler is not None:
+                opus_handler(data)
+
+        if await self._synthesize_stream(text, record, priority):
+            cache.put(cache_key, frames)
+            if cache.disk_enabled:
+                await self.run_blocking(cache.store_to_disk, cache_key, frames)
+        return None
+
+    async def _synthesize_stream(
+        self, text, opus_handler: Callable[[bytes], None], priority
+    ) -> bool:
+        """Tổng hợp một câu và đẩy audio vào hàng đợi phát, trả về True nếu thành công"""
         max_repeat_time = 5
         if self.delete_audio_file:
             # Cần xóa file thì chuyển trực tiếp sang dữ liệu audio
             while max_repeat_time > 0:
                 try:
-                    audio_bytes = asyncio.run(self.text_to_speak(text, None))
+                    audio_bytes = await self._synthesize(text, None, priority)
                     if audio_bytes:
                         self.tts_audio_queue.put((SentenceType.FIRST, None, text))
-                        audio_bytes_to_data_stream(
+                        await self._convert_audio(
+                            audio_bytes_to_data_stream,
                             audio_bytes,
                             file_type=self.audio_file_type,
                             is_opus=True,
                             callback=opus_handler,
                             sample_rate=self.conn.sample_rate,
                             opus_encoder=self.opus_encoder,
+                            source_sample_rate=self.output_sample_rate,
                         )
                         break
                     else:
@@ -117,13 +326,13 @@ class TTSProviderBase(ABC):
                 logger.bind(tag=TAG).error(
                     f"Tạo giọng nói thất bại: {text}, vui lòng kiểm tra mạng hoặc dịch vụ có bình thường không"
                 )
-            return None
+            return max_repeat_time > 0
         else:
-            tmp_file = self.generate_filename()
+            tmp_file = self._tmp_filename()
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
                     try:
-                        asyncio.run(self.text_to_speak(text, tmp_file))
+                        await self._synthesize(text, tmp_file, priority)
                     except Exception as e:
                         logger.bind(tag=TAG).warning(
                             f"Tạo giọng nói thất bại lần {5 - max_repeat_time + 1}: {text}, lỗi: {e}"
@@ -142,11 +351,14 @@ class TTSProviderBase(ABC):
                         f"Tạo giọng nói thất bại: {text}, vui lòng kiểm tra mạng hoặc dịch vụ có bình thường không"
                     )
                 self.tts_audio_queue.put((SentenceType.FIRST, None, text))
-                self._process_audio_file_stream(tmp_file, callback=opus_handler)
+                await self._convert_audio(
+                    self._process_audio_file_stream, tmp_file, callback=opus_handler
+                )
+                return max_repeat_time > 0
             except Exception as e:
                 logger.bind(tag=TAG).error(f"Failed to generate TTS file: {e}")
-                return None
-    
+                return False
+
     def to_tts(self, text):
         text = MarkdownCleaner.clean_markdown(text)
         max_repeat_time = 5
@@ -163,6 +375,7 @@ class TTSProviderBase(ABC):
                             is_opus=True,
                             callback=lambda data: audio_datas.append(data),
                             sample_rate=self.conn.sample_rate,
+                            source_sample_rate=self.output_sample_rate,
                         )
                         return audio_datas
                     else:
@@ -182,7 +395,7 @@ class TTSProviderBase(ABC):
                 )
             return None
         else:
-            tmp_file = self.generate_filename()
+            tmp_file = self._tmp_filename()
             try:
                 while not os.path.exists(tmp_file) and max_repeat_time > 0:
                     try:
@@ -218,13 +431,13 @@ class TTSProviderBase(ABC):
         self, audio_file_path, callback: Callable[[Any], Any] = None
     ):
         """Chuyển đổi file audio sang mã hóa PCM"""
-        return audio_to_data_stream(audio_file_path, is_opus=False, callback=callback, sample_rate=self.conn.sample_rate, opus_encoder=None)
+        return audio_to_data_stream(audio_file_path, is_opus=False, callback=callback, sample_rate=self.conn.sample_rate, opus_encoder=None, source_sample_rate=self.output_sample_rate)
 
     def audio_to_opus_data_stream(
         self, audio_file_path, callback: Callable[[Any], Any] = None
     ):
         """Chuyển đổi file audio sang mã hóa Opus"""
-        return audio_to_data_stream(audio_file_path, is_opus=True, callback=callback, sample_rate=self.conn.sample_rate, opus_encoder=self.opus_encoder)
+        return audio_to_data_stream(audio_file_path, is_opus=True, callback=callback, sample_rate=self.conn.sample_rate, opus_encoder=self.opus_encoder, source_sample_rate=self.output_sample_rate)
 
     def tts_one_sentence(
         self,
@@ -262,25 +475,64 @@ class TTSProviderBase(ABC):
             self.opus_encoder = opus_encoder_utils.OpusEncoderUtils(
                 sample_rate=conn.sample_rate, channels=1, frame_size_ms=60
             )
-
-        # Luồng xử lý tts
-        self.tts_priority_thread = threading.Thread(
-            target=self.tts_text_priority_thread, daemon=True
-        )
-        self.tts_priority_thread.start()
-
-        # Luồng xử lý phát audio
-        self.audio_play_priority_thread = threading.Thread(
-            target=self._audio_play_priority_thread, daemon=True
-        )
-        self.audio_play_priority_thread.start()
+        self.negotiate_output_format(conn)
+        self.segmenter.configure(conn.config.get("tts_segmenter"))
+
+        # Hàng đợi và các task xử lý đều chạy trên event loop của kết nối
+        loop = asyncio.get_running_loop()
+        self.tts_text_queue.bind(loop)
+        self.tts_audio_queue.bind(loop)
+
+        # Task xử lý văn bản tts
+        self.tts_text_task = loop.create_task(self.tts_text_priority_task())
+
+        # Task xử lý phát audio
+        self.audio_play_task = loop.create_task(self._audio_play_priority_task())
+
+    def create_background_task(self, coro):
+        """Chạy coroutine trên loop mà không chờ kết quả, giữ tham chiếu để task không bị thu hồi giữa chừng"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def stop_audio_channels(self):
+        """Dừng các task xử lý văn bản và phát audio của kết nối"""
+        for task in (self.tts_text_task, self.audio_play_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                except Exception as e:
+                    logger.bind(tag=TAG).warning(f"Lỗi khi dừng task TTS: {e}")
+        self.tts_text_task = None
+        self.audio_play_task = None
+
+    async def _next_text_message(self):
+        """Chờ văn bản tiếp theo, trả về None khi đến hạn tách đoạn đầu tiên theo thời gian (tts_segmenter.first_flush_ms)"""
+        delay = self.segmenter.flush_delay()
+        if delay is None:
+            return await self.tts_text_queue.get()
+        try:
+            return await asyncio.wait_for(self.tts_text_queue.get(), timeout=delay)
+        except asyncio.TimeoutError:
+            return None
 
     # Ở đây mặc định là phương thức xử lý không streaming
     # Phương thức xử lý streaming vui lòng ghi đè trong lớp con
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self._next_text_message()
+                if message is None:
+                    # LLM chưa có dấu câu sau first_flush_ms, tách phần đã có để phát âm thanh sớm
+                    for segment_text in self.segmenter.flush_first():
+                        if self.conn.client_abort:
+                            break
+                        await self.to_tts_stream(segment_text, opus_handler=self.handle_opus)
+                    continue
                 if message.sentence_type == SentenceType.FIRST:
                     self.conn.client_abort = False
                 if self.conn.client_abort:
@@ -288,52 +540,43 @@ class TTSProviderBase(ABC):
                     continue
                 if message.sentence_type == SentenceType.FIRST:
                     # Khởi tạo tham số
-                    self.tts_stop_request = False
-                    self.processed_chars = 0
-                    self.tts_text_buff = []
-                    self.is_first_sentence = True
+                    self.segmenter.reset()
                     self.tts_audio_first_sentence = True
+                    self.first_segment_pending = True
                 elif ContentType.TEXT == message.content_type:
-                    self.tts_text_buff.append(message.content_detail)
-                    segment_text = self._get_segment_text()
-                    if segment_text:
-                        self.to_tts_stream(segment_text, opus_handler=self.handle_opus)
+                    for segment_text in self.segmenter.append(message.content_detail):
+                        await self.to_tts_stream(segment_text, opus_handler=self.handle_opus)
                 elif ContentType.FILE == message.content_type:
-                    self._process_remaining_text_stream(opus_handler=self.handle_opus)
+                    await self._process_remaining_text_stream(opus_handler=self.handle_opus)
                     tts_file = message.content_file
                     if tts_file and os.path.exists(tts_file):
-                        self._process_audio_file_stream(
-                            tts_file, callback=self.handle_opus
+                        await self.run_blocking(
+                            self._process_audio_file_stream,
+                            tts_file,
+                            callback=self.handle_opus,
                         )
                 if message.sentence_type == SentenceType.LAST:
-                    self._process_remaining_text_stream(opus_handler=self.handle_opus)
+                    await self._process_remaining_text_stream(opus_handler=self.handle_opus)
                     self.tts_audio_queue.put(
                         (message.sentence_type, [], message.content_detail)
                     )
 
-            except queue.Empty:
-                continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản TTS thất bại: {str(e)}, loại: {type(e).__name__}, stack: {traceback.format_exc()}"
                 )
                 continue
 
-    def _audio_play_priority_thread(self):
+    async def _audio_play_priority_task(self):
         # Danh sách văn bản và audio cần báo cáo
         enqueue_text = None
         enqueue_audio = None
         while not self.conn.stop_event.is_set():
             text = None
             try:
-                try:
-                    sentence_type, audio_datas, text = self.tts_audio_queue.get(
-                        timeout=0.1
-                    )
-                except queue.Empty:
-                    if self.conn.stop_event.is_set():
-                        break
-                    continue
+                sentence_type, audio_datas, text = await self.tts_audio_queue.get()
 
                 if self.conn.client_abort:
                     logger.bind(tag=TAG).debug("Nhận tín hiệu ngắt, bỏ qua dữ liệu audio hiện tại")
@@ -353,18 +596,16 @@ class TTSProviderBase(ABC):
                     enqueue_audio.append(audio_datas)
 
                 # Gửi audio
-                future = asyncio.run_coroutine_threadsafe(
-                    sendAudioMessage(self.conn, sentence_type, audio_datas, text),
-                    self.conn.loop,
-                )
-                future.result()
+                await sendAudioMessage(self.conn, sentence_type, audio_datas, text)
 
                 # Ghi lại đầu ra và báo cáo
                 if self.conn.max_output_size > 0 and text:
                     add_device_output(self.conn.headers.get("device-id"), len(text))
 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.bind(tag=TAG).error(f"audio_play_priority_thread: {text} {e}")
+                logger.bind(tag=TAG).error(f"audio_play_priority_task: {text} {e}")
 
     async def start_session(self, session_id):
         pass
@@ -377,45 +618,6 @@ class TTSProviderBase(ABC):
         if hasattr(self, "ws") and self.ws:
             await self.ws.close()
 
-    def _get_segment_text(self):
-        # Hợp nhất toàn bộ văn bản hiện tại và xử lý phần chưa phân chia
-        full_text = "".join(self.tts_text_buff)
-        current_text = full_text[self.processed_chars :]  # Bắt đầu từ vị trí chưa xử lý
-        last_punct_pos = -1
-
-        # Chọn tập hợp dấu câu khác nhau tùy theo có phải câu đầu tiên không
-        punctuations_to_use = (
-            self.first_sentence_punctuations
-            if self.is_first_sentence
-            else self.punctuations
-        )
-
-        for punct in punctuations_to_use:
-            pos = current_text.rfind(punct)
-            if (pos != -1 and last_punct_pos == -1) or (
-                pos != -1 and pos < last_punct_pos
-            ):
-                last_punct_pos = pos
-
-        if last_punct_pos != -1:
-            segment_text_raw = current_text[: last_punct_pos + 1]
-            segment_text = textUtils.get_string_no_punctuation_or_emoji(
-                segment_text_raw
-            )
-            self.processed_chars += len(segment_text_raw)  # Cập nhật vị trí ký tự đã xử lý
-
-            # Nếu là câu đầu tiên, sau khi tìm thấy dấu phẩy đầu tiên, đặt cờ thành False
-            if self.is_first_sentence:
-                self.is_first_sentence = False
-
-            return segment_text
-        elif self.tts_stop_request and current_text:
-            segment_text = current_text
-            self.is_first_sentence = True  # Đặt lại cờ
-            return segment_text
-        else:
-            return None
-
     def _process_audio_file_stream(
         self, tts_file, callback: Callable[[Any], Any]
     ) -> None:
@@ -446,7 +648,7 @@ class TTSProviderBase(ABC):
         self.before_stop_play_files.clear()
         self.tts_audio_queue.put((SentenceType.LAST, [], None))
 
-    def _process_remaining_text_stream(
+    async def _process_remaining_text_stream(
         self, opus_handler: Callable[[bytes], None] = None
     ):
         """Xử lý văn bản còn lại và tạo giọng nói
@@ -454,12 +656,10 @@ class TTSProviderBase(ABC):
         Returns:
             bool: Có xử lý thành công văn bản không
         """
-        full_text = "".join(self.tts_text_buff)
-        remaining_text = full_text[self.processed_chars :]
+        remaining_text = self.segmenter.take_remaining()
         if remaining_text:
             segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
             if segment_text:
-                self.to_tts_stream(segment_text, opus_handler=opus_handler)
-                self.processed_chars += len(full_text)
+                await self.to_tts_stream(segment_text, opus_handler=opus_handler)
                 return True
         return False
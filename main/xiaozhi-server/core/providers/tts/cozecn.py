@@ -13,9 +13,22 @@ class TTSProvider(TTSProviderBase):
             self.voice = config.get("voice")
         self.response_format = config.get("response_format", "wav")
         self.audio_file_type = config.get("response_format", "wav")
+        self.sample_rate = config.get("sample_rate")
+        self.pcm_sample_rates = (8000, 16000, 22050, 24000, 32000, 44100, 48000)
+        self.ogg_opus_sample_rates = self.pcm_sample_rates
         self.host = "api.coze.cn"
         self.api_url = f"https://{self.host}/v1/audio/speech"
 
+    def use_pcm_output(self, sample_rate):
+        super().use_pcm_output(sample_rate)
+        self.response_format = "pcm"
+        self.sample_rate = sample_rate
+
+    def use_ogg_opus_output(self, sample_rate):
+        super().use_ogg_opus_output(sample_rate)
+        self.response_format = "ogg_opus"
+        self.sample_rate = sample_rate
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "model": self.model,
@@ -23,6 +36,8 @@ class TTSProvider(TTSProviderBase):
             "voice_id": self.voice,
             "response_format": self.response_format,
         }
+        if self.sample_rate:
+            request_json["sample_rate"] = int(self.sample_rate)
         headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
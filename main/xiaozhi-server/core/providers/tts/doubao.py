@@ -30,6 +30,9 @@ class TTSProvider(TTSProviderBase):
         volume_ratio = config.get("volume_ratio", "1.0")
         pitch_ratio = config.get("pitch_ratio", "1.0")
         self.audio_file_type = config.get("format", "wav")
+        self.rate = config.get("rate")
+        self.pcm_sample_rates = (8000, 16000, 24000)
+        self.ogg_opus_sample_rates = (8000, 16000, 24000)
         self.speed_ratio = float(speed_ratio) if speed_ratio else 1.0
         self.volume_ratio = float(volume_ratio) if volume_ratio else 1.0
         self.pitch_ratio = float(pitch_ratio) if pitch_ratio else 1.0
@@ -41,6 +44,14 @@ class TTSProvider(TTSProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
+    def use_pcm_output(self, sample_rate):
+        super().use_pcm_output(sample_rate)
+        self.rate = sample_rate
+
+    def use_ogg_opus_output(self, sample_rate):
+        super().use_ogg_opus_output(sample_rate)
+        self.rate = sample_rate
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "app": {
@@ -65,6 +76,8 @@ class TTSProvider(TTSProviderBase):
                 "frontend_type": "unitTson",
             },
         }
+        if self.rate:
+            request_json["audio"]["rate"] = int(self.rate)
 
         try:
             resp = requests.post(
@@ -13,6 +13,8 @@ class TTSProvider(TTSProviderBase):
         else:
             self.voice = config.get("voice")
         self.audio_file_type = config.get("format", "mp3")
+        # edge_tts là thư viện bất đồng bộ, chạy thẳng trên event loop của kết nối
+        self.blocking_synthesis = False
 
     def generate_filename(self, extension=".mp3"):
         return os.path.join(
@@ -1,7 +1,6 @@
 import os
 import uuid
 import json
-import queue
 import asyncio
 import traceback
 import websockets
@@ -250,11 +249,11 @@ class TTSProvider(TTSProviderBase):
         except:
             pass
 
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
         """Luồng xử lý văn bản TTS luồng kép của Volcano Engine"""
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self.tts_text_queue.get()
                 logger.bind(tag=TAG).debug(
                     f"Nhận tác vụ TTS｜{message.sentence_type.name} ｜ {message.content_type.name} | ID phiên: {self.conn.sentence_id}"
                 )
@@ -266,15 +265,9 @@ class TTSProvider(TTSProviderBase):
                     try:
                         logger.bind(tag=TAG).info("Nhận thông tin ngắt, kết thúc luồng xử lý văn bản TTS")
                         if self.enable_ws_reuse:
-                            asyncio.run_coroutine_threadsafe(
-                                self.cancel_session(self.conn.sentence_id),
-                                loop=self.conn.loop,
-                            )
+                            self.create_background_task(self.cancel_session(self.conn.sentence_id))
                         else:
-                            asyncio.run_coroutine_threadsafe(
-                                self.finish_connection(),
-                                loop=self.conn.loop,
-                            )
+                            self.create_background_task(self.finish_connection())
                         continue
                     except Exception as e:
                         logger.bind(tag=TAG).error(f"Hủy phiên TTS thất bại: {str(e)}")
@@ -288,11 +281,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).debug(f"Tự động tạo ID phiên mới: {self.conn.sentence_id}")
 
                         logger.bind(tag=TAG).debug("Bắt đầu khởi động phiên TTS...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.start_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
+                        await self.start_session(self.conn.sentence_id)
                         self.before_stop_play_files.clear()
                         logger.bind(tag=TAG).debug("Phiên TTS khởi động thành công")
                     except Exception as e:
@@ -305,11 +294,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).debug(
                                 f"Bắt đầu gửi văn bản TTS: {message.content_detail}"
                             )
-                            future = asyncio.run_coroutine_threadsafe(
-                                self.text_to_speak(message.content_detail, None),
-                                loop=self.conn.loop,
-                            )
-                            future.result()
+                            await self.text_to_speak(message.content_detail, None)
                             logger.bind(tag=TAG).debug("Gửi văn bản TTS thành công")
                         except Exception as e:
                             logger.bind(tag=TAG).error(f"Gửi văn bản TTS thất bại: {str(e)}")
@@ -321,21 +306,17 @@ class TTSProvider(TTSProviderBase):
                     )
                     if message.content_file and os.path.exists(message.content_file):
                         # Xử lý dữ liệu âm thanh tệp trước
-                        self._process_audio_file_stream(message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
+                        await self.run_blocking(self._process_audio_file_stream, message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
                 if message.sentence_type == SentenceType.LAST:
                     try:
                         logger.bind(tag=TAG).debug("Bắt đầu kết thúc phiên TTS...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.finish_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
+                        await self.finish_session(self.conn.sentence_id)
                     except Exception as e:
                         logger.bind(tag=TAG).error(f"Kết thúc phiên TTS thất bại: {str(e)}")
                         continue
 
-            except queue.Empty:
-                continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản TTS thất bại: {str(e)}, loại: {type(e).__name__}, ngăn xếp: {traceback.format_exc()}"
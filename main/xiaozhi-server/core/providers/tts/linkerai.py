@@ -1,6 +1,5 @@
 import os
 import time
-import queue
 import aiohttp
 import asyncio
 import requests
@@ -28,22 +27,22 @@ class TTSProvider(TTSProviderBase):
         # Buffer PCM
         self.pcm_buffer = bytearray()
 
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
         """Luồng xử lý văn bản streaming"""
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self._next_text_message()
+                if message is None:
+                    for segment_text in self.segmenter.flush_first():
+                        await self.to_tts_single_stream(segment_text)
+                    continue
                 if message.sentence_type == SentenceType.FIRST:
                     # Khởi tạo tham số
-                    self.tts_stop_request = False
-                    self.processed_chars = 0
-                    self.tts_text_buff = []
+                    self.segmenter.reset()
                     self.before_stop_play_files.clear()
                 elif ContentType.TEXT == message.content_type:
-                    self.tts_text_buff.append(message.content_detail)
-                    segment_text = self._get_segment_text()
-                    if segment_text:
-                        self.to_tts_single_stream(segment_text)
+                    for segment_text in self.segmenter.append(message.content_detail):
+                        await self.to_tts_single_stream(segment_text)
 
                 elif ContentType.FILE == message.content_type:
                     logger.bind(tag=TAG).info(
@@ -51,42 +50,40 @@ class TTSProvider(TTSProviderBase):
                     )
                     if message.content_file and os.path.exists(message.content_file):
                         # Xử lý dữ liệu audio của file trước
-                        self._process_audio_file_stream(message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
+                        await self.run_blocking(self._process_audio_file_stream, message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
                 if message.sentence_type == SentenceType.LAST:
                     # Xử lý văn bản còn lại
-                    self._process_remaining_text_stream(True)
+                    await self._process_remaining_text_stream(True)
 
-            except queue.Empty:
-                continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản TTS thất bại: {str(e)}, loại: {type(e).__name__}, stack: {traceback.format_exc()}"
                 )
 
-    def _process_remaining_text_stream(self, is_last=False):
+    async def _process_remaining_text_stream(self, is_last=False):
         """Xử lý văn bản còn lại và tạo giọng nói
 
         Returns:
             bool: Có xử lý thành công văn bản không
         """
-        full_text = "".join(self.tts_text_buff)
-        remaining_text = full_text[self.processed_chars :]
+        remaining_text = self.segmenter.take_remaining()
         if remaining_text:
             segment_text = textUtils.get_string_no_punctuation_or_emoji(remaining_text)
             if segment_text:
-                self.to_tts_single_stream(segment_text, is_last)
-                self.processed_chars += len(full_text)
+                await self.to_tts_single_stream(segment_text, is_last)
             else:
                 self._process_before_stop_play_files()
         else:
             self._process_before_stop_play_files()
 
-    def to_tts_single_stream(self, text, is_last=False):
+    async def to_tts_single_stream(self, text, is_last=False):
         try:
             max_repeat_time = 5
             text = MarkdownCleaner.clean_markdown(text)
             try:
-                asyncio.run(self.text_to_speak(text, is_last))
+                await self.text_to_speak(text, is_last)
             except Exception as e:
                 logger.bind(tag=TAG).warning(
                     f"Tạo giọng nói thất bại lần {5 - max_repeat_time + 1}: {text}, lỗi: {e}"
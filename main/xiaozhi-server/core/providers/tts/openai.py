@@ -19,6 +19,8 @@ class TTSProvider(TTSProviderBase):
             self.voice = config.get("voice", "alloy")
         self.response_format = config.get("format", "wav")
         self.audio_file_type = config.get("format", "wav")
+        # response_format=pcm trả về PCM 16-bit mono 24kHz
+        self.pcm_sample_rates = (24000,)
 
         # Xử lý trường hợp chuỗi rỗng
         speed = config.get("speed", "1.0")
@@ -29,6 +31,10 @@ class TTSProvider(TTSProviderBase):
         if model_key_msg:
             logger.bind(tag=TAG).error(model_key_msg)
 
+    def use_pcm_output(self, sample_rate):
+        super().use_pcm_output(sample_rate)
+        self.response_format = "pcm"
+
     async def text_to_speak(self, text, output_file):
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -38,7 +44,7 @@ class TTSProvider(TTSProviderBase):
             "model": self.model,
             "input": text,
             "voice": self.voice,
-            "response_format": "wav",
+            "response_format": self.response_format,
             "speed": self.speed,
         }
         response = requests.post(self.api_url, json=data, headers=headers)
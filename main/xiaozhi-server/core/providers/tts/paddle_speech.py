@@ -20,6 +20,8 @@ class TTSProvider(TTSProviderBase):
         super().__init__(config, delete_audio_file)
         self.url = config.get("url", "ws://192.168.1.10:8092/paddlespeech/tts/streaming")
         self.protocol = config.get("protocol", "websocket")
+        # Giao tiếp qua websockets bất đồng bộ, chạy thẳng trên event loop của kết nối
+        self.blocking_synthesis = False
         
         if config.get("private_voice"):
             self.spk_id = int(config.get("private_voice"))
@@ -13,12 +13,19 @@ class TTSProvider(TTSProviderBase):
             self.voice = config.get("voice")
         self.response_format = config.get("response_format", "mp3")
         self.audio_file_type = config.get("response_format", "mp3")
+        self.sample_rate = config.get("sample_rate")
+        self.pcm_sample_rates = (8000, 16000, 24000, 32000, 44100)
         self.speed = float(config.get("speed", 1.0))
         self.gain = config.get("gain")
 
         self.host = "api.siliconflow.cn"
         self.api_url = f"https://{self.host}/v1/audio/speech"
 
+    def use_pcm_output(self, sample_rate):
+        super().use_pcm_output(sample_rate)
+        self.response_format = "pcm"
+        self.sample_rate = sample_rate
+
     async def text_to_speak(self, text, output_file):
         request_json = {
             "model": self.model,
@@ -26,6 +33,8 @@ class TTSProvider(TTSProviderBase):
             "voice": self.voice,
             "response_format": self.response_format,
         }
+        if self.sample_rate:
+            request_json["sample_rate"] = int(self.sample_rate)
         headers = {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
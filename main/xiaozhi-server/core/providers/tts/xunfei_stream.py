@@ -3,7 +3,6 @@ import time
 import uuid
 import json
 import hmac
-import queue
 import base64
 import hashlib
 import asyncio
@@ -137,11 +136,11 @@ class TTSProvider(TTSProviderBase):
             self.ws = None
             raise
 
-    def tts_text_priority_thread(self):
+    async def tts_text_priority_task(self):
         """Luồng xử lý văn bản streaming"""
         while not self.conn.stop_event.is_set():
             try:
-                message = self.tts_text_queue.get(timeout=1)
+                message = await self.tts_text_queue.get()
                 logger.bind(tag=TAG).debug(
                     f"Nhận tác vụ TTS｜{message.sentence_type.name} ｜ {message.content_type.name} | ID phiên: {self.conn.sentence_id}"
                 )
@@ -164,11 +163,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).info(f"Tự động tạo ID phiên mới: {self.conn.sentence_id}")
 
                         logger.bind(tag=TAG).info("Bắt đầu khởi động phiên TTS...")
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.start_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
-                        future.result()
+                        await self.start_session(self.conn.sentence_id)
                         self.before_stop_play_files.clear()
                         logger.bind(tag=TAG).info("Phiên TTS đã khởi động thành công")
 
@@ -183,11 +178,7 @@ class TTSProvider(TTSProviderBase):
                             logger.bind(tag=TAG).debug(
                                 f"Bắt đầu gửi văn bản TTS: {message.content_detail}"
                             )
-                            future = asyncio.run_coroutine_threadsafe(
-                                self.text_to_speak(message.content_detail, None),
-                                loop=self.conn.loop,
-                            )
-                            future.result()
+                            await self.text_to_speak(message.content_detail, None)
                             logger.bind(tag=TAG).debug("Văn bản TTS đã gửi thành công")
                         except Exception as e:
                             logger.bind(tag=TAG).error(f"Gửi văn bản TTS thất bại: {str(e)}")
@@ -200,22 +191,19 @@ class TTSProvider(TTSProviderBase):
                     )
                     if message.content_file and os.path.exists(message.content_file):
                         # Xử lý dữ liệu audio của file trước
-                        self._process_audio_file_stream(message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
+                        await self.run_blocking(self._process_audio_file_stream, message.content_file, callback=lambda audio_data: self.handle_audio_file(audio_data, message.content_detail))
 
                 # Xử lý kết thúc phiên
                 if message.sentence_type == SentenceType.LAST:
                     try:
                         logger.bind(tag=TAG).info("Bắt đầu kết thúc phiên TTS...")
-                        asyncio.run_coroutine_threadsafe(
-                            self.finish_session(self.conn.sentence_id),
-                            loop=self.conn.loop,
-                        )
+                        self.create_background_task(self.finish_session(self.conn.sentence_id))
                     except Exception as e:
                         logger.bind(tag=TAG).error(f"Kết thúc phiên TTS thất bại: {str(e)}")
                         continue
 
-            except queue.Empty:
-                continue
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.bind(tag=TAG).error(
                     f"Xử lý văn bản TTS thất bại: {str(e)}, loại: {type(e).__name__}, stack: {traceback.format_exc()}"
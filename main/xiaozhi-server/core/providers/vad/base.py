@@ -1,9 +1,17 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 class VADProviderBase(ABC):
     @abstractmethod
     def is_vad(self, conn, data) -> bool:
-        """Phát hiện hoạt động giọng nói trong dữ liệu audio"""
+        """Phát hiện hoạt động giọng nói trong dữ liệu audio (PCM 16kHz 16-bit đã giải mã)"""
         pass
+
+    async def is_vad_async(self, conn, data) -> bool:
+        """Phiên bản bất đồng bộ của is_vad, provider hỗ trợ suy luận theo lô có thể ghi đè"""
+        return self.is_vad(conn, data)
+
+    def get_connection_stats(self, conn) -> Optional[Dict[str, Any]]:
+        """Thống kê VAD của một kết nối (ví dụ số lần suy luận bỏ qua), dùng để ghi log khi đóng kết nối"""
+        return None
@@ -0,0 +1,38 @@
+from config.logger import setup_logging
+from core.providers.vad.silero_base import SileroVADProviderBase
+
+TAG = __name__
+logger = setup_logging()
+
+
+class VADProvider(SileroVADProviderBase):
+    """Silero VAD chạy trong model server dùng chung, worker chỉ giữ trạng thái hồi quy và cổng năng lượng của từng kết nối"""
+
+    def __init__(self, config, client):
+        self.client = client
+        super().__init__(config)
+
+    def infer(self, audio, state, context):
+        # Gọi từ thread của BatchScheduler hoặc is_vad đồng bộ
+        return self.client.infer_vad_sync(audio, state, context)
+
+    async def is_vad_async(self, conn, pcm_frame):
+        if self.batch_scheduler is not None or conn.client_listen_mode == "manual":
+            return await super().is_vad_async(conn, pcm_frame)
+
+        try:
+            state, chunks = self._prepare_chunks(conn, pcm_frame)
+            client_have_voice = False
+            for chunk in chunks:
+                if self._gate_skip(conn, state, chunk):
+                    speech_prob = 0.0
+                else:
+                    # Không gom lô trong worker: gửi thẳng tới model server, server gom lô giữa các worker
+                    probs, state.state, state.context = await self.client.infer_vad(
+                        chunk.reshape(1, -1), state.state, state.context
+                    )
+                    speech_prob = float(probs[0])
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+            return client_have_voice
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
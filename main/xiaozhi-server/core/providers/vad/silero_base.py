@@ -0,0 +1,222 @@
+import time
+import numpy as np
+from abc import abstractmethod
+from typing import List, Tuple
+from config.logger import setup_logging
+from core.providers.vad.base import VADProviderBase
+from core.utils.batch_scheduler import BatchScheduler
+from core.utils.energy_gate import EnergyGate
+
+TAG = __name__
+logger = setup_logging()
+
+# Số điểm mẫu mỗi lần suy luận của Silero ở 16kHz
+CHUNK_SAMPLES = 512
+# Số điểm mẫu ngữ cảnh mà Silero nối vào trước mỗi chunk
+CONTEXT_SAMPLES = 64
+
+
+class SileroConnectionState:
+    """Trạng thái VAD riêng của mỗi kết nối: trạng thái hồi quy của model và cổng năng lượng"""
+
+    def __init__(self, gate: EnergyGate = None):
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.context = np.zeros((1, CONTEXT_SAMPLES), dtype=np.float32)
+        self.gate = gate
+
+
+class SileroVADProviderBase(VADProviderBase):
+    """Logic chung của Silero VAD, lớp con chỉ cần triển khai suy luận theo lô có trạng thái tường minh"""
+
+    # Backend có truyền trạng thái hồi quy tường minh (gom lô được giữa các kết nối) hay không
+    supports_batching = True
+
+    def __init__(self, config):
+        # Xử lý trường hợp chuỗi rỗng
+        threshold = config.get("threshold", "0.5")
+        threshold_low = config.get("threshold_low", "0.2")
+        min_silence_duration_ms = config.get("min_silence_duration_ms", "1000")
+
+        self.vad_threshold = float(threshold) if threshold else 0.5
+        self.vad_threshold_low = float(threshold_low) if threshold_low else 0.2
+
+        self.silence_threshold_ms = (
+            int(min_silence_duration_ms) if min_silence_duration_ms else 1000
+        )
+
+        # Cần ít nhất bao nhiêu frame mới được tính là có giọng nói
+        self.frame_window_threshold = 3
+
+        # Cổng năng lượng: bỏ qua suy luận với các chunk rõ ràng là im lặng
+        gate_enabled = config.get("energy_gate_enabled", False)
+        gate_margin_db = config.get("energy_gate_margin_db", "9")
+        gate_silence_db = config.get("energy_gate_silence_db", "-60")
+        gate_zcr = config.get("energy_gate_zcr_threshold", "0.3")
+        self.gate_enabled = str(gate_enabled).lower() in ("true", "1", "yes")
+        self.gate_margin_db = float(gate_margin_db) if gate_margin_db else 9.0
+        self.gate_silence_db = float(gate_silence_db) if gate_silence_db else -60.0
+        self.gate_zcr_threshold = float(gate_zcr) if gate_zcr else 0.3
+
+        # Gom lô suy luận của tất cả kết nối, mỗi nhịp chạy model một lần
+        batch_enabled = config.get("batch_enabled", False)
+        batch_max_size = config.get("batch_max_size", "64")
+        batch_max_wait_ms = config.get("batch_max_wait_ms", "5")
+        self.batch_scheduler = None
+        if str(batch_enabled).lower() in ("true", "1", "yes") and not self.supports_batching:
+            logger.bind(tag=TAG).warning(
+                f"{type(self).__module__.split('.')[-1]} không hỗ trợ gom lô VAD, hãy dùng silero_onnx; bỏ qua batch_enabled"
+            )
+        elif str(batch_enabled).lower() in ("true", "1", "yes"):
+            self.batch_scheduler = BatchScheduler(
+                type(self).__module__.split(".")[-1],
+                self._run_batch,
+                max_batch_size=int(batch_max_size) if batch_max_size else 64,
+                max_wait_ms=float(batch_max_wait_ms) if batch_max_wait_ms else 5,
+            )
+
+    @abstractmethod
+    def infer(
+        self, audio: np.ndarray, state: np.ndarray, context: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Suy luận một lô
+
+        :param audio: Chunk audio float32, shape (B, 512)
+        :param state: Trạng thái hồi quy, shape (2, B, 128)
+        :param context: Ngữ cảnh của chunk trước, shape (B, 64)
+        :return: Xác suất giọng nói shape (B,), trạng thái mới, ngữ cảnh mới
+        """
+        pass
+
+    def _run_batch(
+        self, items: List[Tuple[SileroConnectionState, np.ndarray]]
+    ) -> List[float]:
+        """Ghép trạng thái của từng kết nối thành lô, suy luận, sau đó ghi lại trạng thái cho từng kết nối"""
+        audio = np.stack([chunk for _, chunk in items])
+        state = np.concatenate([s.state for s, _ in items], axis=1)
+        context = np.concatenate([s.context for s, _ in items], axis=0)
+
+        probs, new_state, new_context = self.infer(audio, state, context)
+
+        for i, (s, _) in enumerate(items):
+            s.state = new_state[:, i : i + 1, :].copy()
+            s.context = new_context[i : i + 1, :].copy()
+        return np.asarray(probs).reshape(-1).tolist()
+
+    def _infer_one(self, state: SileroConnectionState, chunk: np.ndarray) -> float:
+        """Suy luận một chunk của một kết nối khi không gom lô, không cần ghép/tách trạng thái"""
+        probs, state.state, state.context = self.infer(
+            chunk.reshape(1, -1), state.state, state.context
+        )
+        return float(np.asarray(probs).reshape(-1)[0])
+
+    def _get_state(self, conn) -> SileroConnectionState:
+        state = getattr(conn, "vad_state", None)
+        if state is None:
+            gate = None
+            if self.gate_enabled:
+                gate = EnergyGate(
+                    margin_db=self.gate_margin_db,
+                    silence_db=self.gate_silence_db,
+                    zcr_threshold=self.gate_zcr_threshold,
+                )
+            state = SileroConnectionState(gate)
+            conn.vad_state = state
+        return state
+
+    def _split_chunks(self, conn) -> List[np.ndarray]:
+        """Lấy các chunk 512 điểm (float32) đã đủ để suy luận từ buffer của kết nối"""
+        chunks = []
+        # Xử lý các frame hoàn chỉnh trong buffer (mỗi lần xử lý 512 điểm mẫu), đọc ra view không sao chép
+        while True:
+            audio_int16 = conn.client_audio_buffer.read(CHUNK_SAMPLES)
+            if audio_int16 is None:
+                break
+            # Chuyển đổi sang định dạng mà model cần
+            chunks.append(audio_int16.astype(np.float32) / 32768.0)
+        return chunks
+
+    def _prepare_chunks(self, conn, pcm_frame):
+        state = self._get_state(conn)
+        conn.client_audio_buffer.write(pcm_frame)  # Thêm dữ liệu mới vào buffer
+        return state, self._split_chunks(conn)
+
+    def _gate_skip(self, conn, state: SileroConnectionState, chunk) -> bool:
+        """Chunk có thể bỏ qua suy luận model không: chỉ áp dụng khi kết nối đang không có giọng nói"""
+        if state.gate is None or conn.client_have_voice or conn.last_is_voice:
+            return False
+        if not state.gate.is_silent(chunk):
+            return False
+        # Giữ ngữ cảnh liền mạch cho lần suy luận kế tiếp, trạng thái hồi quy giữ nguyên
+        state.context = chunk[-CONTEXT_SAMPLES:].reshape(1, -1).copy()
+        return True
+
+    def get_connection_stats(self, conn):
+        state = getattr(conn, "vad_state", None)
+        if state is None or state.gate is None:
+            return None
+        return state.gate.get_stats()
+
+    def _update_voice_state(self, conn, speech_prob) -> bool:
+        """Cập nhật trạng thái giọng nói của kết nối theo xác suất của một chunk"""
+        # Phán đoán ngưỡng kép
+        if speech_prob >= self.vad_threshold:
+            is_voice = True
+        elif speech_prob <= self.vad_threshold_low:
+            is_voice = False
+        else:
+            is_voice = conn.last_is_voice
+
+        # Nếu âm thanh không thấp hơn giá trị tối thiểu thì tiếp tục trạng thái trước, phán đoán là có giọng nói
+        conn.last_is_voice = is_voice
+
+        # Cập nhật cửa sổ trượt
+        conn.client_voice_window.append(is_voice)
+        client_have_voice = (
+            conn.client_voice_window.count(True) >= self.frame_window_threshold
+        )
+
+        # Nếu trước đó có giọng nói, nhưng lần này không có giọng nói, và khoảng thời gian từ lần có giọng nói cuối cùng đã vượt quá ngưỡng im lặng, thì cho rằng đã nói xong một câu
+        if conn.client_have_voice and not client_have_voice:
+            stop_duration = time.time() * 1000 - conn.last_activity_time
+            if stop_duration >= self.silence_threshold_ms:
+                conn.client_voice_stop = True
+        if client_have_voice:
+            conn.client_have_voice = True
+            conn.last_activity_time = time.time() * 1000
+        return client_have_voice
+
+    def is_vad(self, conn, pcm_frame):
+        # Chế độ thủ công: trả về True trực tiếp, không thực hiện phát hiện VAD thời gian thực, tất cả audio đều được cache
+        if conn.client_listen_mode == "manual":
+            return True
+
+        try:
+            state, chunks = self._prepare_chunks(conn, pcm_frame)
+            client_have_voice = False
+            for chunk in chunks:
+                if self._gate_skip(conn, state, chunk):
+                    speech_prob = 0.0
+                else:
+                    speech_prob = self._infer_one(state, chunk)
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+            return client_have_voice
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
+
+    async def is_vad_async(self, conn, pcm_frame):
+        if self.batch_scheduler is None or conn.client_listen_mode == "manual":
+            return self.is_vad(conn, pcm_frame)
+
+        try:
+            state, chunks = self._prepare_chunks(conn, pcm_frame)
+            client_have_voice = False
+            # Các chunk của cùng một kết nối phải suy luận tuần tự vì phụ thuộc trạng thái hồi quy
+            for chunk in chunks:
+                if self._gate_skip(conn, state, chunk):
+                    speech_prob = 0.0
+                else:
+                    speech_prob = await self.batch_scheduler.submit((state, chunk))
+                client_have_voice = self._update_voice_state(conn, speech_prob)
+            return client_have_voice
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error processing audio packet: {e}")
@@ -0,0 +1,37 @@
+import numpy as np
+import onnxruntime
+from config.logger import setup_logging
+from core.providers.vad.silero_base import SileroVADProviderBase, CONTEXT_SAMPLES
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_MODEL_PATH = (
+    "models/snakers4_silero-vad/src/silero_vad/data/silero_vad.onnx"
+)
+
+
+class VADProvider(SileroVADProviderBase):
+    """Silero VAD chạy bằng ONNX Runtime, trạng thái được truyền tường minh, không phụ thuộc torch"""
+
+    def __init__(self, config):
+        logger.bind(tag=TAG).info("SileroVAD (ONNX Runtime)", config)
+        model_path = config.get("model_path") or DEFAULT_MODEL_PATH
+        num_threads = config.get("num_threads", "1")
+
+        opts = onnxruntime.SessionOptions()
+        opts.inter_op_num_threads = 1
+        opts.intra_op_num_threads = int(num_threads) if num_threads else 1
+        self.session = onnxruntime.InferenceSession(
+            model_path, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self.sr = np.array(16000, dtype=np.int64)
+        super().__init__(config)
+
+    def infer(self, audio, state, context):
+        # Model không trạng thái: nối ngữ cảnh vào trước chunk, trạng thái vào/ra qua tham số
+        x = np.concatenate([context, audio], axis=1)
+        out, new_state = self.session.run(
+            None, {"input": x, "state": state, "sr": self.sr}
+        )
+        return out.reshape(-1), new_state, x[:, -CONTEXT_SAMPLES:]
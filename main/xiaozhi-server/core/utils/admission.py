@@ -0,0 +1,207 @@
+"""
+Kiểm soát tiếp nhận kết nối (admission control)
+Trước khi tạo ConnectionHandler, server kiểm tra số kết nối, số lượt trò chuyện đang chạy và độ trễ event loop.
+Khi quá tải, kết nối mới được chờ trong hàng đợi một khoảng ngắn, hết thời gian thì bị đóng với mã 1013 (Try Again Later)
+để các kết nối đang trò chuyện không bị kéo chậm theo (ví dụ khi hàng loạt thiết bị kết nối lại sau sự cố mạng).
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# Mã đóng WebSocket chuẩn cho "server quá tải, thử lại sau" (RFC 6455)
+CLOSE_CODE_TRY_AGAIN_LATER = 1013
+
+REASON_CONNECTIONS = "connections"
+REASON_TURNS = "turns"
+REASON_LOOP_LAG = "loop_lag"
+REASON_QUEUE_FULL = "queue_full"
+
+# Chu kỳ đo độ trễ event loop (giây)
+LAG_PROBE_INTERVAL = 0.1
+# Chu kỳ thăm dò lại điều kiện khi kết nối đang chờ trong hàng đợi (giây)
+QUEUE_POLL_INTERVAL = 0.05
+
+
+class AdmissionController:
+    """Giới hạn tiếp nhận kết nối của một process, tất cả phương thức async chạy trên event loop của server"""
+
+    def __init__(self, config: dict):
+        admission_config = config.get("admission_control") or {}
+        self.enabled = str(admission_config.get("enabled", False)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
+        # 0 nghĩa là không giới hạn
+        self.max_connections = int(admission_config.get("max_connections", 0) or 0)
+        self.max_turns_in_flight = int(
+            admission_config.get("max_turns_in_flight", 0) or 0
+        )
+        self.max_loop_lag_ms = float(admission_config.get("max_loop_lag_ms", 0) or 0)
+        self.queue_timeout = float(admission_config.get("queue_timeout", 0) or 0)
+        self.max_queue = int(admission_config.get("max_queue", 0) or 0)
+        self.stats_interval = float(admission_config.get("stats_interval", 60) or 0)
+
+        self.connections = 0
+        self.waiting = 0
+        self.loop_lag_ms = 0.0
+        # Lượt trò chuyện có thể kết thúc trên thread pool, cần khóa
+        self._turns = 0
+        self._turns_lock = threading.Lock()
+        self._lag_task: Optional[asyncio.Task] = None
+
+        self._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": {
+                REASON_CONNECTIONS: 0,
+                REASON_TURNS: 0,
+                REASON_LOOP_LAG: 0,
+                REASON_QUEUE_FULL: 0,
+            },
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+            "max_loop_lag_ms": 0.0,
+        }
+        self._last_stats_time = time.monotonic()
+        self._last_logged_rejected = 0
+
+    @property
+    def turns_in_flight(self) -> int:
+        return self._turns
+
+    def turn_started(self):
+        with self._turns_lock:
+            self._turns += 1
+
+    def turn_finished(self, *_):
+        """Có thể dùng trực tiếp làm done callback của Future/Task"""
+        with self._turns_lock:
+            self._turns = max(0, self._turns - 1)
+
+    def _ensure_lag_monitor(self):
+        if self.max_loop_lag_ms > 0 and (self._lag_task is None or self._lag_task.done()):
+            self._lag_task = asyncio.get_running_loop().create_task(self._monitor_lag())
+
+    async def _monitor_lag(self):
+        """Đo độ trễ event loop: thời gian ngủ thực tế vượt quá thời gian yêu cầu"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lag_ms = max(0.0, (loop.time() - start - LAG_PROBE_INTERVAL) * 1000)
+            # Tăng ngay khi trễ cao, giảm dần khi loop hồi phục để tránh dao động
+            if lag_ms >= self.loop_lag_ms:
+                self.loop_lag_ms = lag_ms
+            else:
+                self.loop_lag_ms = self.loop_lag_ms * 0.7 + lag_ms * 0.3
+            if lag_ms > self._stats["max_loop_lag_ms"]:
+                self._stats["max_loop_lag_ms"] = lag_ms
+            self._log_stats()
+
+    def _overload_reason(self) -> Optional[str]:
+        if self.max_connections and self.connections >= self.max_connections:
+            return REASON_CONNECTIONS
+        if self.max_turns_in_flight and self._turns >= self.max_turns_in_flight:
+            return REASON_TURNS
+        if self.max_loop_lag_ms and self.loop_lag_ms >= self.max_loop_lag_ms:
+            return REASON_LOOP_LAG
+        return None
+
+    async def acquire(self) -> Optional[str]:
+        """Xin tiếp nhận một kết nối
+
+        Returns:
+            None nếu được tiếp nhận (phải gọi release() khi kết nối kết thúc), ngược lại là lý do từ chối
+        """
+        if not self.enabled:
+            self.connections += 1
+            return None
+        self._ensure_lag_monitor()
+
+        reason = self._overload_reason()
+        if reason is not None:
+            if self.queue_timeout <= 0:
+                return self._reject(reason)
+            if self.max_queue and self.waiting >= self.max_queue:
+                return self._reject(REASON_QUEUE_FULL)
+
+            # Chờ trong hàng đợi cho đến khi server bớt tải hoặc hết thời gian
+            self.waiting += 1
+            self._stats["queued"] += 1
+            start = time.monotonic()
+            deadline = start + self.queue_timeout
+            try:
+                while reason is not None and time.monotonic() < deadline:
+                    await asyncio.sleep(QUEUE_POLL_INTERVAL)
+                    reason = self._overload_reason()
+            finally:
+                self.waiting -= 1
+                wait_ms = (time.monotonic() - start) * 1000
+                self._stats["queue_wait_ms_total"] += wait_ms
+                if wait_ms > self._stats["queue_wait_ms_max"]:
+                    self._stats["queue_wait_ms_max"] = wait_ms
+            if reason is not None:
+                return self._reject(reason)
+
+        self.connections += 1
+        self._stats["admitted"] += 1
+        return None
+
+    def release(self):
+        self.connections = max(0, self.connections - 1)
+
+    def _reject(self, reason: str) -> str:
+        self._stats["rejected"][reason] += 1
+        logger.bind(tag=TAG).warning(
+            f"Server quá tải, từ chối kết nối mới: lý do={reason}, kết nối={self.connections}, "
+            f"lượt đang chạy={self._turns}, độ trễ loop={self.loop_lag_ms:.0f}ms, đang chờ={self.waiting}"
+        )
+        self._log_stats()
+        return reason
+
+    def rejected_total(self) -> int:
+        return sum(self._stats["rejected"].values())
+
+    def _log_stats(self):
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_time < self.stats_interval:
+            return
+        self._last_stats_time = now
+        rejected = self.rejected_total()
+        # Chỉ ghi log khi có kết nối bị từ chối trong chu kỳ vừa qua
+        if rejected == self._last_logged_rejected:
+            return
+        self._last_logged_rejected = rejected
+        stats = self.get_stats()
+        logger.bind(tag=TAG).info(
+            f"Thống kê tiếp nhận kết nối: đã nhận={stats['admitted']}, từ chối={stats['rejected']}, "
+            f"chờ trung bình={stats['queue_wait_ms_avg']}ms, chờ tối đa={stats['queue_wait_ms_max']}ms, "
+            f"độ trễ loop tối đa={stats['max_loop_lag_ms']}ms"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        queued = self._stats["queued"]
+        return {
+            "enabled": self.enabled,
+            "connections": self.connections,
+            "waiting": self.waiting,
+            "turns_in_flight": self._turns,
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "admitted": self._stats["admitted"],
+            "queued": queued,
+            "rejected": dict(self._stats["rejected"]),
+            "queue_wait_ms_avg": (
+                round(self._stats["queue_wait_ms_total"] / queued, 1) if queued else 0.0
+            ),
+            "queue_wait_ms_max": round(self._stats["queue_wait_ms_max"], 1),
+            "max_loop_lag_ms": round(self._stats["max_loop_lag_ms"], 1),
+        }
@@ -0,0 +1,296 @@
+"""
+Giải mã audio ngay trong process, không tạo tiến trình ffmpeg
+WAV đọc trực tiếp các chunk (kể cả WAV streaming không ghi độ dài), PCM thô dùng trực tiếp, MP3 dùng miniaudio (nếu đã cài), kèm bộ chuyển tần số lấy mẫu bằng numpy.
+Định dạng không hỗ trợ (hoặc thiếu miniaudio) trả về None để caller quay lại dùng pydub/ffmpeg như trước.
+"""
+
+import time
+import threading
+import numpy as np
+from typing import Any, Dict, Optional, Union
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+# Số hệ số mỗi phía của bộ lọc thông thấp chống răng cưa khi giảm tần số lấy mẫu
+_FILTER_HALF_TAPS = 16
+_filter_cache = {}
+
+
+def _lowpass_filter(ratio: float) -> np.ndarray:
+    """Bộ lọc sinc có cửa sổ Blackman, tần số cắt theo tần số Nyquist của tần số lấy mẫu đích"""
+    key = round(ratio, 6)
+    taps = _filter_cache.get(key)
+    if taps is None:
+        n = np.arange(-_FILTER_HALF_TAPS, _FILTER_HALF_TAPS + 1, dtype=np.float64)
+        taps = ratio * np.sinc(ratio * n) * np.blackman(len(n))
+        taps /= taps.sum()
+        _filter_cache[key] = taps
+    return taps
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Chuyển tần số lấy mẫu của tín hiệu mono float
+
+    Giảm tần số thì lọc thông thấp trước rồi nội suy tuyến tính, tăng tần số chỉ cần nội suy
+    """
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    if dst_rate < src_rate:
+        samples = np.convolve(samples, _lowpass_filter(dst_rate / src_rate), mode="same")
+    dst_len = int(round(len(samples) * dst_rate / src_rate))
+    positions = np.arange(dst_len, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(positions, np.arange(len(samples), dtype=np.float64), samples)
+
+
+def _to_int16_bytes(samples: np.ndarray) -> bytes:
+    return np.clip(np.round(samples), -32768, 32767).astype("<i2").tobytes()
+
+
+def _convert(
+    data: bytes, sample_width: int, channels: int, src_rate: int, dst_rate: int
+) -> Optional[bytes]:
+    """PCM số nguyên little-endian bất kỳ → PCM 16-bit mono ở tần số đích"""
+    if sample_width == 2:
+        samples = np.frombuffer(data[: len(data) - len(data) % 2], dtype="<i2")
+    elif sample_width == 1:
+        # WAV 8-bit là số không dấu
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 3:
+        raw = np.frombuffer(data[: len(data) - len(data) % 3], dtype=np.uint8).reshape(-1, 3)
+        samples = (
+            raw[:, 0].astype(np.int32) << 8
+            | raw[:, 1].astype(np.int32) << 16
+            | raw[:, 2].astype(np.int32) << 24
+        ) >> 16
+    elif sample_width == 4:
+        samples = np.frombuffer(data[: len(data) - len(data) % 4], dtype="<i4") >> 16
+    else:
+        return None
+
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    elif src_rate == dst_rate and samples.dtype == np.dtype("<i2"):
+        # Đã đúng định dạng đích, không cần chuyển đổi
+        return samples.tobytes()
+
+    samples = resample(samples.astype(np.float64), src_rate, dst_rate)
+    return _to_int16_bytes(samples)
+
+
+def _read_source(source: Union[bytes, str]) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+# Chỉ giải mã WAVE_FORMAT_PCM, các định dạng khác (float, nén) để ffmpeg xử lý
+_WAV_PCM_FORMAT = 0x0001
+# Kích thước chunk data mà TTS streaming ghi khi chưa biết độ dài (GPT-SoVITS streaming_mode...)
+_WAV_UNKNOWN_SIZES = (0, 0xFFFFFFFF)
+
+
+def _parse_wav(data: bytes) -> Optional[tuple]:
+    """Đọc các chunk WAV, trả về (channels, sample_width, sample_rate, frames) hoặc None nếu không phải PCM
+
+    WAV streaming ghi kích thước data là 0 hoặc 0xFFFFFFFF (hoặc lớn hơn dữ liệu thực tế),
+    khi đó đọc audio đến hết dữ liệu thay vì tin kích thước trong header
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return None
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id = data[offset : offset + 4]
+        chunk_size = int.from_bytes(data[offset + 4 : offset + 8], "little")
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16 or body + 16 > len(data):
+                return None
+            fmt = (
+                int.from_bytes(data[body : body + 2], "little"),
+                int.from_bytes(data[body + 2 : body + 4], "little"),
+                int.from_bytes(data[body + 4 : body + 8], "little"),
+                int.from_bytes(data[body + 14 : body + 16], "little"),
+            )
+            if fmt[0] == 0xFFFE:
+                # WAVE_FORMAT_EXTENSIBLE: định dạng thật nằm ở hai byte đầu của SubFormat GUID
+                if chunk_size < 40 or body + 26 > len(data):
+                    return None
+                fmt = (int.from_bytes(data[body + 24 : body + 26], "little"),) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            format_tag, channels, src_rate, bits = fmt
+            if format_tag != _WAV_PCM_FORMAT or not channels or not src_rate or bits % 8:
+                return None
+            if chunk_size in _WAV_UNKNOWN_SIZES or body + chunk_size > len(data):
+                frames = data[body:]
+            else:
+                frames = data[body : body + chunk_size]
+            return channels, bits // 8, src_rate, frames
+        # Chunk có độ dài lẻ được đệm thêm một byte
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _decode_wav(data: bytes, sample_rate: int) -> Optional[bytes]:
+    parsed = _parse_wav(data)
+    if parsed is None:
+        # WAV dạng float hoặc nén, để ffmpeg xử lý
+        return None
+    channels, sample_width, src_rate, frames = parsed
+    return _convert(frames, sample_width, channels, src_rate, sample_rate)
+
+
+def _decode_mp3(data: bytes, sample_rate: int) -> Optional[bytes]:
+    if miniaudio is None:
+        return None
+    try:
+        decoded = miniaudio.decode(
+            data,
+            output_format=miniaudio.SampleFormat.SIGNED16,
+            nchannels=1,
+            sample_rate=sample_rate,
+        )
+    except miniaudio.DecodeError:
+        return None
+    return decoded.samples.tobytes()
+
+
+def sniff_audio_type(header: bytes, file_type: str) -> str:
+    """Định dạng thực tế theo vài byte đầu của dữ liệu, nhà cung cấp (nhất là cổng bên thứ ba) có thể
+    bỏ qua định dạng được yêu cầu; không nhận ra thì giữ file_type"""
+    file_type = (file_type or "").lower().lstrip(".")
+    if header.startswith(b"OggS"):
+        return "ogg"
+    if header.startswith(b"RIFF") and header[8:12] == b"WAVE":
+        return "wav"
+    if header.startswith(b"ID3"):
+        return "mp3"
+    if header.startswith(b"fLaC"):
+        return "flac"
+    # Frame sync của MP3 không có thẻ ID3; PCM thô có thể trùng ngẫu nhiên nên chỉ xét khi không yêu cầu PCM
+    if (
+        file_type not in ("pcm", "raw")
+        and len(header) >= 2
+        and header[0] == 0xFF
+        and header[1] & 0xE0 == 0xE0
+    ):
+        return "mp3"
+    return file_type
+
+
+def read_header(source: Union[bytes, str], size: int = 12) -> bytes:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source[:size])
+    try:
+        with open(source, "rb") as f:
+            return f.read(size)
+    except OSError:
+        return b""
+
+
+def decode_to_pcm(
+    source: Union[bytes, str],
+    file_type: str,
+    sample_rate: int = 16000,
+    source_sample_rate: Optional[int] = None,
+) -> Optional[bytes]:
+    """Giải mã audio thành PCM 16-bit mono ở tần số sample_rate
+
+    Args:
+        source: Dữ liệu audio hoặc đường dẫn file
+        file_type: Định dạng (wav, pcm, raw, mp3...)
+        sample_rate: Tần số lấy mẫu đích
+        source_sample_rate: Tần số của PCM thô, None nghĩa là đã đúng tần số đích
+
+    Returns:
+        Dữ liệu PCM, hoặc None nếu không giải mã được trong process (caller dùng ffmpeg)
+    """
+    file_type = (file_type or "").lower().lstrip(".")
+    if file_type not in ("wav", "pcm", "raw", "mp3"):
+        return None
+    if file_type == "mp3" and miniaudio is None:
+        return None
+    try:
+        data = _read_source(source)
+        if file_type == "wav":
+            return _decode_wav(data, sample_rate)
+        if file_type in ("pcm", "raw"):
+            # PCM thô từ TTS: 16-bit mono, chỉ cần chuyển tần số nếu provider không hỗ trợ tần số đích
+            return _convert(data, 2, 1, source_sample_rate or sample_rate, sample_rate)
+        return _decode_mp3(data, sample_rate)
+    except Exception as e:
+        logger.bind(tag=TAG).warning(f"Giải mã audio {file_type} trong process thất bại, dùng ffmpeg: {e}")
+        return None
+
+
+class ConversionStats:
+    """Thống kê dùng chung của process: định dạng TTS đã thương lượng và thời gian chuyển đổi audio mỗi câu"""
+
+    def __init__(self, stats_interval: float = 300):
+        self.stats_interval = stats_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._last_log = time.monotonic()
+
+    def record(self, key: str, conversion: str, elapsed_ms: float):
+        """Ghi lại một câu
+
+        Args:
+            key: Provider và định dạng, ví dụ "doubao:pcm@16000"
+            conversion: Mô tả bước chuyển đổi (không, chuyển tần số, giải mã...)
+            elapsed_ms: Thời gian giải mã/chuyển tần số/mã hóa của câu
+        """
+        with self._lock:
+            entry = self._entries.setdefault(
+                key,
+                {"conversion": conversion, "sentences": 0, "ms_total": 0.0, "ms_max": 0.0},
+            )
+            entry["sentences"] += 1
+            entry["ms_total"] += elapsed_ms
+            if elapsed_ms > entry["ms_max"]:
+                entry["ms_max"] = elapsed_ms
+        self._maybe_log()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                key: {
+                    "conversion": entry["conversion"],
+                    "sentences": entry["sentences"],
+                    "ms_avg": round(entry["ms_total"] / entry["sentences"], 2),
+                    "ms_max": round(entry["ms_max"], 2),
+                }
+                for key, entry in self._entries.items()
+            }
+
+    def _maybe_log(self):
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_log < self.stats_interval:
+            return
+        self._last_log = now
+        for key, stats in self.get_stats().items():
+            logger.bind(tag=TAG).info(
+                f"Thống kê chuyển đổi audio TTS {key} ({stats['conversion']}): {stats['sentences']} câu, "
+                f"TB {stats['ms_avg']}ms, tối đa {stats['ms_max']}ms"
+            )
+
+
+conversion_stats = ConversionStats()
+
+
+def get_conversion_stats() -> Dict[str, Dict[str, Any]]:
+    """Thời gian chuyển đổi audio theo provider và định dạng đầu ra"""
+    return conversion_stats.get_stats()
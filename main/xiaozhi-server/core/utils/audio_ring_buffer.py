@@ -0,0 +1,110 @@
+"""
+Bộ đệm vòng audio dung lượng cố định cho mỗi kết nối
+Cấp phát một lần khi tạo kết nối, đọc ra dưới dạng view numpy, tránh tạo bytearray/list mới cho mỗi frame
+Dùng chung cho VAD (buffer PCM chờ suy luận), pre-roll của ASR và nhận dạng giọng nói
+"""
+
+import numpy as np
+from typing import List, Optional
+
+
+class PcmRingBuffer:
+    """Buffer PCM int16 dung lượng cố định, ghi vào cuối và đọc ra từng đoạn từ đầu"""
+
+    def __init__(self, capacity_samples: int = 16000):
+        self.capacity = int(capacity_samples)
+        self._buf = np.zeros(self.capacity, dtype=np.int16)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def write(self, pcm) -> None:
+        """Ghi dữ liệu PCM 16-bit (bytes hoặc mảng int16), dữ liệu cũ nhất bị bỏ khi vượt dung lượng"""
+        if isinstance(pcm, np.ndarray):
+            samples = pcm.astype(np.int16, copy=False).reshape(-1)
+        else:
+            samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        n = len(samples)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            self._buf[:] = samples[-self.capacity :]
+            self._start, self._end = 0, self.capacity
+            return
+
+        if self._end + n > self.capacity:
+            # Dồn phần chưa đọc về đầu buffer (chỉ vài trăm điểm mẫu còn dư)
+            pending = len(self)
+            keep = min(pending, self.capacity - n)
+            self._buf[:keep] = self._buf[self._end - keep : self._end]
+            self._start, self._end = 0, keep
+
+        self._buf[self._end : self._end + n] = samples
+        self._end += n
+
+    def read(self, num_samples: int) -> Optional[np.ndarray]:
+        """Đọc num_samples điểm mẫu, trả về view (chỉ hợp lệ đến lần write kế tiếp), không đủ thì trả về None"""
+        if len(self) < num_samples:
+            return None
+        view = self._buf[self._start : self._start + num_samples]
+        self._start += num_samples
+        if self._start == self._end:
+            self._start = self._end = 0
+        return view
+
+    def clear(self) -> None:
+        self._start = self._end = 0
+
+
+class FrameRingBuffer:
+    """Vòng lưu N frame gần nhất (gói audio gốc kèm PCM đã giải mã), dùng làm pre-roll trước khi có giọng nói"""
+
+    def __init__(self, capacity: int = 10, frame_samples: int = 960):
+        self.capacity = int(capacity)
+        self._frames: List[Optional[bytes]] = [None] * self.capacity
+        self._pcm = np.zeros((self.capacity, frame_samples), dtype=np.int16)
+        self._pcm_len = np.zeros(self.capacity, dtype=np.int32)
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, frame: bytes, pcm: bytes = b"") -> None:
+        """Thêm một frame, ghi đè frame cũ nhất khi đã đầy"""
+        samples = np.frombuffer(pcm or b"", dtype=np.int16, count=len(pcm or b"") // 2)
+        if len(samples) > self._pcm.shape[1]:
+            # Frame lớn hơn dự kiến (ví dụ client gửi PCM thô), mở rộng slot một lần
+            grown = np.zeros((self.capacity, len(samples)), dtype=np.int16)
+            grown[:, : self._pcm.shape[1]] = self._pcm
+            self._pcm = grown
+
+        self._frames[self._head] = frame
+        self._pcm[self._head, : len(samples)] = samples
+        self._pcm_len[self._head] = len(samples)
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _order(self) -> List[int]:
+        first = (self._head - self._size) % self.capacity
+        return [(first + i) % self.capacity for i in range(self._size)]
+
+    def frames(self) -> List[bytes]:
+        """Các gói audio gốc theo thứ tự thời gian"""
+        return [self._frames[i] for i in self._order()]
+
+    def pcm_views(self) -> List[np.ndarray]:
+        """PCM của từng frame theo thứ tự thời gian, dạng view không sao chép"""
+        return [self._pcm[i, : self._pcm_len[i]] for i in self._order()]
+
+    def pcm_frames(self) -> List[bytes]:
+        """PCM của từng frame theo thứ tự thời gian, dạng bytes"""
+        return [view.tobytes() for view in self.pcm_views()]
+
+    def clear(self) -> None:
+        for i in range(self.capacity):
+            self._frames[i] = None
+        self._head = 0
+        self._size = 0
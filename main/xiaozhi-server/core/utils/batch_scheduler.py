@@ -0,0 +1,208 @@
+"""
+Mô-đun lập lịch suy luận theo lô
+Gom các yêu cầu suy luận đang chờ từ nhiều kết nối, mỗi nhịp (tick) chạy một lần suy luận theo lô
+"""
+
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+class _ItemError:
+    """Lỗi của một yêu cầu khi suy luận lại từng yêu cầu sau khi cả lô thất bại"""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class BatchScheduler:
+    """Bộ lập lịch gom lô dùng chung giữa các kết nối"""
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+        stats_interval: float = 60,
+    ):
+        """
+        Khởi tạo bộ lập lịch
+
+        Args:
+            name: Tên bộ lập lịch, dùng cho log và thống kê
+            process_batch: Hàm suy luận đồng bộ, nhận danh sách yêu cầu và trả về danh sách kết quả cùng thứ tự
+            max_batch_size: Số yêu cầu tối đa trong một lô
+            max_wait_ms: Thời gian chờ tối đa để gom lô (mili giây)
+            stats_interval: Khoảng thời gian ghi log thống kê (giây)
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.stats_interval = stats_interval
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        # Suy luận chạy trên một thread riêng, không chặn event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"batch-{name}"
+        )
+
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "max_batch": 0,
+            "max_queue_depth": 0,
+            "wait_ms_total": 0.0,
+            "infer_ms_total": 0.0,
+            "item_fallbacks": 0,
+        }
+        self._last_stats_time = time.monotonic()
+
+    def _ensure_started(self, loop: asyncio.AbstractEventLoop):
+        """Khởi động tác vụ gom lô trên event loop hiện tại (khởi tạo trễ)"""
+        with self._lock:
+            if self._task is None or self._task.done():
+                self._loop = loop
+                self._queue = asyncio.Queue()
+                self._task = loop.create_task(self._run())
+                logger.bind(tag=TAG).info(
+                    f"Khởi động bộ lập lịch lô {self.name}: max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait * 1000:.1f}"
+                )
+
+    async def submit(self, item: Any) -> Any:
+        """Gửi một yêu cầu suy luận và chờ kết quả của nó"""
+        loop = asyncio.get_running_loop()
+        self._ensure_started(loop)
+        if loop is not self._loop:
+            # Yêu cầu đến từ event loop khác, suy luận riêng lẻ để tránh trộn loop
+            return (await loop.run_in_executor(self._executor, self.process_batch, [item]))[0]
+
+        future = loop.create_future()
+        self._queue.put_nowait((item, future, time.monotonic()))
+        self._stats["max_queue_depth"] = max(
+            self._stats["max_queue_depth"], self._queue.qsize()
+        )
+        return await future
+
+    async def _run(self):
+        """Vòng lặp gom lô: chờ yêu cầu đầu tiên, chờ thêm một nhịp, sau đó suy luận toàn bộ"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                batch = [await self._queue.get()]
+                if self.max_wait > 0 and self._queue.qsize() < self.max_batch_size - 1:
+                    await asyncio.sleep(self.max_wait)
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                # Bỏ qua các yêu cầu đã bị hủy (kết nối đã đóng)
+                batch = [entry for entry in batch if not entry[1].done()]
+                if not batch:
+                    continue
+
+                start = time.monotonic()
+                items = [entry[0] for entry in batch]
+                try:
+                    results = await loop.run_in_executor(
+                        self._executor, self.process_batch, items
+                    )
+                except Exception as e:
+                    if len(batch) == 1:
+                        logger.bind(tag=TAG).error(f"Suy luận lô {self.name} thất bại: {e}")
+                        if not batch[0][1].done():
+                            batch[0][1].set_exception(e)
+                        continue
+                    # Một yêu cầu hỏng làm hỏng cả lô: suy luận lại từng yêu cầu để chỉ yêu cầu đó báo lỗi
+                    logger.bind(tag=TAG).warning(
+                        f"Suy luận lô {self.name} thất bại, suy luận lại từng yêu cầu: {e}"
+                    )
+                    results = await self._run_items(loop, items)
+                    self._stats["item_fallbacks"] += 1
+
+                end = time.monotonic()
+                for (_, future, enqueue_time), result in zip(batch, results):
+                    if not future.done():
+                        if isinstance(result, _ItemError):
+                            future.set_exception(result.error)
+                        else:
+                            future.set_result(result)
+                    self._stats["wait_ms_total"] += (start - enqueue_time) * 1000
+
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+                self._stats["infer_ms_total"] += (end - start) * 1000
+                self._maybe_log_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Vòng lặp bộ lập lịch lô {self.name} lỗi: {e}")
+
+    async def _run_items(self, loop: asyncio.AbstractEventLoop, items: List[Any]) -> List[Any]:
+        """Suy luận riêng từng yêu cầu, yêu cầu lỗi trả về _ItemError thay vì ném ngoại lệ"""
+        results = []
+        for item in items:
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, self.process_batch, [item]
+                )
+                results.append(result[0])
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Suy luận {self.name} thất bại: {e}")
+                results.append(_ItemError(e))
+        return results
+
+    def _maybe_log_stats(self):
+        now = time.monotonic()
+        if now - self._last_stats_time < self.stats_interval:
+            return
+        self._last_stats_time = now
+        # Chỉ được gọi sau một lô đã chạy, nên không ghi log khi không có yêu cầu
+        logger.bind(tag=TAG).info(f"Thống kê bộ lập lịch lô {self.name}: {self.get_stats()}")
+
+    def queue_depth(self) -> int:
+        """Số yêu cầu đang chờ trong hàng đợi"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê của bộ lập lịch"""
+        batches = self._stats["batches"]
+        items = self._stats["items"]
+        return {
+            "name": self.name,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self._stats["max_queue_depth"],
+            "batches": batches,
+            "items": items,
+            "max_batch": self._stats["max_batch"],
+            "avg_batch": round(items / batches, 2) if batches else 0,
+            "avg_wait_ms": round(self._stats["wait_ms_total"] / items, 2) if items else 0,
+            "avg_infer_ms": (
+                round(self._stats["infer_ms_total"] / batches, 2) if batches else 0
+            ),
+            "item_fallbacks": self._stats["item_fallbacks"],
+        }
+
+    async def stop(self):
+        """Dừng bộ lập lịch"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,101 @@
+"""
+Cổng năng lượng đặt trước VAD
+Dựa vào RMS và tỷ lệ qua điểm không (zero-crossing) để bỏ qua suy luận model với các frame rõ ràng là im lặng,
+ngưỡng tự thích nghi theo mức ồn nền của từng kết nối
+"""
+
+import numpy as np
+from typing import Any, Dict
+
+
+class EnergyGate:
+    """Cổng năng lượng tự thích nghi, mỗi kết nối một instance"""
+
+    def __init__(
+        self,
+        margin_db: float = 9.0,
+        silence_db: float = -60.0,
+        zcr_threshold: float = 0.3,
+        calibration_chunks: int = 10,
+        adapt_rate: float = 0.05,
+        floor_update_db: float = 3.0,
+    ):
+        """
+        Khởi tạo cổng năng lượng
+
+        Args:
+            margin_db: Chunk có năng lượng thấp hơn mức ồn nền + margin_db được coi là im lặng
+            silence_db: Chunk có năng lượng dưới mức này (dBFS) luôn được coi là im lặng
+            zcr_threshold: Chunk gần ngưỡng (nửa trên của margin_db) có tỷ lệ qua điểm không vượt quá mức này
+                có thể là phụ âm xát, không bỏ qua
+            calibration_chunks: Số chunk đầu tiên chỉ dùng để hiệu chỉnh mức ồn nền, không bỏ qua
+            adapt_rate: Tốc độ mức ồn nền tăng theo môi trường
+            floor_update_db: Chỉ chunk thấp hơn mức ồn nền + floor_update_db mới được dùng để cập nhật mức ồn nền
+        """
+        self.margin_db = margin_db
+        self.silence_db = silence_db
+        self.zcr_threshold = zcr_threshold
+        self.calibration_chunks = calibration_chunks
+        self.adapt_rate = adapt_rate
+        self.floor_update_db = floor_update_db
+
+        self.noise_floor_db = None
+        self.total_chunks = 0
+        self.skipped_chunks = 0
+
+    @staticmethod
+    def _measure(chunk: np.ndarray):
+        """Tính năng lượng (dBFS) và tỷ lệ qua điểm không của chunk float32 trong khoảng [-1, 1]"""
+        rms = float(np.sqrt(np.mean(np.square(chunk)))) if len(chunk) else 0.0
+        rms_db = 20 * np.log10(max(rms, 1e-10))
+        signs = np.signbit(chunk)
+        zcr = float(np.count_nonzero(signs[1:] != signs[:-1])) / max(len(chunk) - 1, 1)
+        return rms_db, zcr
+
+    def _update_floor(self, rms_db: float):
+        if self.noise_floor_db is None or rms_db < self.noise_floor_db:
+            # Giảm nhanh khi môi trường yên tĩnh hơn
+            self.noise_floor_db = rms_db
+        else:
+            # Tăng chậm khi môi trường ồn hơn
+            self.noise_floor_db += self.adapt_rate * (rms_db - self.noise_floor_db)
+
+    def is_silent(self, chunk: np.ndarray) -> bool:
+        """Phán đoán chunk có rõ ràng là im lặng không (có thể bỏ qua suy luận model)"""
+        self.total_chunks += 1
+        rms_db, zcr = self._measure(chunk)
+
+        if self.total_chunks <= self.calibration_chunks:
+            self._update_floor(rms_db)
+            return False
+
+        if rms_db <= self.silence_db or rms_db < self.noise_floor_db + self.margin_db / 2:
+            # Tiếng ồn đều (tiếng xì, quạt) có tỷ lệ qua điểm không cao, nên không xét ZCR khi sát mức ồn nền
+            silent = True
+        elif rms_db < self.noise_floor_db + self.margin_db:
+            silent = zcr < self.zcr_threshold
+        else:
+            silent = False
+
+        # Chỉ cập nhật mức ồn nền bằng các chunk sát mức ồn nền, không dùng mọi chunk bị coi là im lặng
+        # (đến mức ồn nền + margin_db) để mức ồn nền không trôi dần lên mức giọng nói trong phiên dài
+        if rms_db < self.noise_floor_db + self.floor_update_db:
+            self._update_floor(rms_db)
+        if silent:
+            self.skipped_chunks += 1
+        return silent
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thống kê số lần suy luận đã bỏ qua"""
+        return {
+            "total_chunks": self.total_chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "skip_ratio": (
+                round(self.skipped_chunks / self.total_chunks, 3)
+                if self.total_chunks
+                else 0
+            ),
+            "noise_floor_db": (
+                round(self.noise_floor_db, 1) if self.noise_floor_db is not None else None
+            ),
+        }
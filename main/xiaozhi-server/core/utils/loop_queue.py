@@ -0,0 +1,50 @@
+"""
+Hàng đợi gắn với event loop của kết nối
+Bên tiêu thụ là task chạy trên loop (await get), bên sản xuất có thể ở bất kỳ thread nào:
+gọi put trên chính loop thì đưa vào ngay, gọi từ thread khác thì chuyển qua call_soon_threadsafe
+"""
+
+import queue
+import asyncio
+import threading
+from typing import Any, Optional
+
+
+class LoopQueue:
+    """asyncio.Queue an toàn khi put từ thread khác, giữ giao diện put/get_nowait/qsize như queue.Queue"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Gắn hàng đợi với loop của kết nối, phải gọi trên chính loop đó"""
+        self._loop = loop
+        self._loop_thread_id = threading.get_ident()
+
+    def _on_loop(self) -> bool:
+        return self._loop is None or threading.get_ident() == self._loop_thread_id
+
+    def put(self, item: Any):
+        if self._on_loop():
+            self._queue.put_nowait(item)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    put_nowait = put
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def get_nowait(self) -> Any:
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            raise queue.Empty
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def empty(self) -> bool:
+        return self._queue.empty()
@@ -0,0 +1,427 @@
+"""
+Dịch vụ model local dùng chung cho chế độ đa process
+Một process duy nhất nạp model VAD (Silero) và ASR local (fun_local, sherpa_onnx_local, vosk),
+các worker gửi yêu cầu suy luận qua Unix socket thay vì mỗi worker tự nạp một bản model.
+Suy luận VAD từ mọi worker được gom lô trong BatchScheduler, ASR chạy trên event loop riêng để không làm chậm VAD.
+
+Giao thức: mỗi frame gồm 8 byte (độ dài header JSON, độ dài payload nhị phân), header JSON, payload.
+Mảng numpy trong payload là float32 nối liền, shape nằm trong header.
+"""
+
+import os
+import json
+import time
+import struct
+import socket
+import asyncio
+import itertools
+import threading
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from config.logger import setup_logging
+from core.utils.batch_scheduler import BatchScheduler
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_SOCKET_PATH = "tmp/model_server.sock"
+# Các loại provider có thể chạy trong model server
+SILERO_VAD_TYPES = ("silero", "silero_onnx")
+LOCAL_ASR_TYPES = ("fun_local", "sherpa_onnx_local", "vosk")
+
+_FRAME_HEADER = struct.Struct(">II")
+
+
+class ModelServerError(Exception):
+    """Model server trả về lỗi hoặc không kết nối được"""
+
+
+def _pack_frame(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _FRAME_HEADER.pack(len(header_bytes), len(payload)) + header_bytes + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Tuple[Dict[str, Any], bytes]:
+    header_len, payload_len = _FRAME_HEADER.unpack(
+        await reader.readexactly(_FRAME_HEADER.size)
+    )
+    header = json.loads(await reader.readexactly(header_len))
+    payload = await reader.readexactly(payload_len) if payload_len else b""
+    return header, payload
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Model server đã đóng kết nối")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_frame_sync(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_len, payload_len = _FRAME_HEADER.unpack(_recv_exact(sock, _FRAME_HEADER.size))
+    header = json.loads(_recv_exact(sock, header_len))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def _encode_arrays(*arrays: np.ndarray) -> Tuple[List[List[int]], bytes]:
+    arrays = [np.ascontiguousarray(a, dtype=np.float32) for a in arrays]
+    return [list(a.shape) for a in arrays], b"".join(a.tobytes() for a in arrays)
+
+
+def _decode_arrays(shapes: List[List[int]], payload: bytes) -> List[np.ndarray]:
+    arrays = []
+    offset = 0
+    for shape in shapes:
+        count = int(np.prod(shape)) if shape else 1
+        arrays.append(
+            np.frombuffer(payload, dtype=np.float32, count=count, offset=offset)
+            .reshape(shape)
+            .copy()
+        )
+        offset += count * 4
+    return arrays
+
+
+def _selected_type(config: dict, module: str) -> Optional[str]:
+    selected = (config.get("selected_module") or {}).get(module)
+    if not selected:
+        return None
+    module_config = (config.get(module) or {}).get(selected) or {}
+    return module_config.get("type", selected)
+
+
+def model_server_active(config: dict) -> bool:
+    """Model server chỉ dùng trong chế độ đa process (các worker dùng chung cổng)"""
+    server_config = config.get("model_server") or {}
+    enabled = str(server_config.get("enabled", False)).lower() in ("true", "1", "yes")
+    return enabled and bool((config.get("server") or {}).get("reuse_port", False))
+
+
+def serves_vad(config: dict) -> bool:
+    return model_server_active(config) and _selected_type(config, "VAD") in SILERO_VAD_TYPES
+
+
+def serves_asr(config: dict) -> bool:
+    return model_server_active(config) and _selected_type(config, "ASR") in LOCAL_ASR_TYPES
+
+
+def get_socket_path(config: dict) -> str:
+    return (config.get("model_server") or {}).get("socket_path") or DEFAULT_SOCKET_PATH
+
+
+class ModelServer:
+    """Process giữ model, phục vụ các worker qua Unix socket"""
+
+    def __init__(self, config: dict):
+        from core.utils import vad, asr
+
+        self.config = config
+        self.socket_path = get_socket_path(config)
+        server_config = config.get("model_server") or {}
+
+        self.vad = None
+        self.vad_scheduler = None
+        vad_type = _selected_type(config, "VAD")
+        if vad_type in SILERO_VAD_TYPES:
+            vad_config = config["VAD"][config["selected_module"]["VAD"]]
+            self.vad = vad.create_instance(vad_type, vad_config)
+            max_batch_size = server_config.get("vad_batch_max_size", 128)
+            max_wait_ms = server_config.get("vad_batch_max_wait_ms", 2)
+            self.vad_scheduler = BatchScheduler(
+                "model-server-vad",
+                self._vad_batch,
+                max_batch_size=int(max_batch_size) if max_batch_size else 128,
+                max_wait_ms=float(max_wait_ms) if max_wait_ms else 2,
+            )
+            logger.bind(tag=TAG).info(f"Model server đã nạp VAD: {vad_type}")
+
+        self.asr = None
+        self._asr_loop = None
+        asr_type = _selected_type(config, "ASR")
+        if asr_type in LOCAL_ASR_TYPES:
+            # Model server luôn xóa file audio tạm, việc lưu file (nếu cần) do worker đảm nhận
+            self.asr = asr.create_instance(
+                asr_type, config["ASR"][config["selected_module"]["ASR"]], True
+            )
+            self._asr_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=self._asr_loop.run_forever, name="model-server-asr", daemon=True
+            ).start()
+            logger.bind(tag=TAG).info(f"Model server đã nạp ASR: {asr_type}")
+
+        self._session_ids = itertools.count(1)
+        self._stats = {"vad_requests": 0, "asr_requests": 0, "errors": 0, "clients": 0}
+
+    def _vad_batch(self, items: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        """Gộp yêu cầu VAD của nhiều worker (mỗi yêu cầu có thể gồm nhiều chunk) thành một lần suy luận"""
+        sizes = [audio.shape[0] for audio, _, _ in items]
+        audio = np.concatenate([a for a, _, _ in items], axis=0)
+        state = np.concatenate([s for _, s, _ in items], axis=1)
+        context = np.concatenate([c for _, _, c in items], axis=0)
+
+        probs, new_state, new_context = self.vad.infer(audio, state, context)
+        probs = np.asarray(probs).reshape(-1)
+
+        results = []
+        offset = 0
+        for size in sizes:
+            end = offset + size
+            results.append(
+                (probs[offset:end], new_state[:, offset:end, :], new_context[offset:end, :])
+            )
+            offset = end
+        return results
+
+    async def _handle_vad(self, header, payload):
+        if self.vad is None:
+            raise ModelServerError("Model server không nạp VAD")
+        self._stats["vad_requests"] += 1
+        audio, state, context = _decode_arrays(header["shapes"], payload)
+        probs, new_state, new_context = await self.vad_scheduler.submit(
+            (audio, state, context)
+        )
+        shapes, data = _encode_arrays(probs, new_state, new_context)
+        return {"shapes": shapes}, data
+
+    async def _handle_asr(self, header, payload):
+        if self.asr is None:
+            raise ModelServerError("Model server không nạp ASR")
+        self._stats["asr_requests"] += 1
+        session_id = header.get("session_id") or f"model-server-{next(self._session_ids)}"
+        future = asyncio.run_coroutine_threadsafe(
+            self.asr.speech_to_text_wrapper(
+                [payload], session_id, "pcm", pcm_data=[payload]
+            ),
+            self._asr_loop,
+        )
+        text, _ = await asyncio.wrap_future(future)
+        return {"text": text}, b""
+
+    async def _handle_request(self, header, payload, writer, write_lock):
+        request_id = header.get("id")
+        try:
+            op = header.get("op")
+            if op == "vad":
+                response, data = await self._handle_vad(header, payload)
+            elif op == "asr":
+                response, data = await self._handle_asr(header, payload)
+            elif op == "stats":
+                response, data = {"stats": self.get_stats()}, b""
+            else:
+                raise ModelServerError(f"Thao tác không hỗ trợ: {op}")
+            response["ok"] = True
+        except Exception as e:
+            self._stats["errors"] += 1
+            logger.bind(tag=TAG).error(f"Model server xử lý yêu cầu lỗi: {e}")
+            response, data = {"ok": False, "error": str(e)}, b""
+        response["id"] = request_id
+        async with write_lock:
+            writer.write(_pack_frame(response, data))
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        self._stats["clients"] += 1
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                header, payload = await _read_frame(reader)
+                # Mỗi yêu cầu chạy riêng để các yêu cầu của cùng worker có thể gom vào một lô
+                task = asyncio.create_task(
+                    self._handle_request(header, payload, writer, write_lock)
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._stats["clients"] -= 1
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        if self.vad_scheduler is not None:
+            stats["vad_batch"] = self.vad_scheduler.get_stats()
+        return stats
+
+    async def serve_forever(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        if socket_dir:
+            os.makedirs(socket_dir, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.bind(tag=TAG).info(f"Model server đang lắng nghe tại {self.socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def run_model_server(config: dict):
+    """Điểm vào của process model server"""
+    try:
+        asyncio.run(ModelServer(config).serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+class _AsyncChannel:
+    """Một kết nối tới model server trên một event loop, nhiều yêu cầu dùng chung (phân biệt bằng id)"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.write_lock = asyncio.Lock()
+        self.reader_task = asyncio.create_task(self._read_loop())
+        self.closed = False
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header, payload = await _read_frame(self.reader)
+                future = self.pending.pop(header.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result((header, payload))
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(
+                    ModelServerError(f"Mất kết nối tới model server: {error}")
+                )
+        self.pending.clear()
+        self.writer.close()
+
+
+class ModelServerClient:
+    """Client trong worker: API async cho event loop, API đồng bộ cho thread suy luận theo lô"""
+
+    def __init__(self, socket_path: str, connect_timeout: float = 60, request_timeout: float = 5):
+        self.socket_path = socket_path
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self._ids = itertools.count(1)
+        self._channels: Dict[asyncio.AbstractEventLoop, _AsyncChannel] = {}
+        self._local = threading.local()
+
+    async def _channel(self) -> _AsyncChannel:
+        loop = asyncio.get_running_loop()
+        channel = self._channels.get(loop)
+        if channel is not None and not channel.closed:
+            return channel
+        # Model server có thể vẫn đang nạp model khi worker khởi động, thử lại đến hết thời gian chờ
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ModelServerError(f"Không kết nối được model server {self.socket_path}: {e}")
+                await asyncio.sleep(0.2)
+        channel = _AsyncChannel(reader, writer)
+        self._channels[loop] = channel
+        return channel
+
+    async def request(self, header: Dict[str, Any], payload: bytes = b"", timeout: float = None):
+        channel = await self._channel()
+        request_id = next(self._ids)
+        header = dict(header, id=request_id)
+        future = asyncio.get_running_loop().create_future()
+        channel.pending[request_id] = future
+        try:
+            async with channel.write_lock:
+                channel.writer.write(_pack_frame(header, payload))
+                await channel.writer.drain()
+            response, data = await asyncio.wait_for(
+                future, timeout or self.request_timeout
+            )
+        finally:
+            channel.pending.pop(request_id, None)
+        if not response.get("ok"):
+            raise ModelServerError(response.get("error", "Lỗi không xác định"))
+        return response, data
+
+    def _sync_socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            return sock
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                sock.close()
+                if time.monotonic() >= deadline:
+                    raise ModelServerError(f"Không kết nối được model server {self.socket_path}: {e}")
+                time.sleep(0.2)
+        sock.settimeout(self.request_timeout)
+        self._local.sock = sock
+        return sock
+
+    def request_sync(self, header: Dict[str, Any], payload: bytes = b""):
+        """Gửi yêu cầu và chờ kết quả trên thread hiện tại (mỗi thread một kết nối riêng)"""
+        sock = self._sync_socket()
+        header = dict(header, id=next(self._ids))
+        try:
+            sock.sendall(_pack_frame(header, payload))
+            response, data = _read_frame_sync(sock)
+        except (OSError, ConnectionError, struct.error) as e:
+            sock.close()
+            self._local.sock = None
+            raise ModelServerError(f"Gửi yêu cầu tới model server thất bại: {e}")
+        if not response.get("ok"):
+            raise ModelServerError(response.get("error", "Lỗi không xác định"))
+        return response, data
+
+    async def infer_vad(self, audio, state, context):
+        shapes, payload = _encode_arrays(audio, state, context)
+        response, data = await self.request({"op": "vad", "shapes": shapes}, payload)
+        return tuple(_decode_arrays(response["shapes"], data))
+
+    def infer_vad_sync(self, audio, state, context):
+        shapes, payload = _encode_arrays(audio, state, context)
+        response, data = self.request_sync({"op": "vad", "shapes": shapes}, payload)
+        return tuple(_decode_arrays(response["shapes"], data))
+
+    async def recognize(self, pcm_bytes: bytes, session_id: str = "", timeout: float = 120):
+        response, _ = await self.request(
+            {"op": "asr", "session_id": session_id}, pcm_bytes, timeout=timeout
+        )
+        return response.get("text")
+
+
+_client: Optional[ModelServerClient] = None
+_client_lock = threading.Lock()
+
+
+def get_model_server_client(config: dict) -> ModelServerClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            server_config = config.get("model_server") or {}
+            _client = ModelServerClient(
+                get_socket_path(config),
+                connect_timeout=float(server_config.get("connect_timeout", 60) or 60),
+                request_timeout=float(server_config.get("request_timeout", 5) or 5),
+            )
+        return _client
+
+
+if __name__ == "__main__":
+    # Chạy độc lập để kiểm tra: python -m core.utils.model_server
+    from config.settings import load_config
+
+    run_model_server(load_config())
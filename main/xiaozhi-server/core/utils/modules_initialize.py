@@ -1,6 +1,7 @@
 from typing import Dict, Any
 from config.logger import setup_logging
-from core.utils import tts, llm, intent, memory, vad, asr
+from core.utils import tts, llm, intent, memory, vad, asr, model_server
+from core.providers.llm.hedged import create_hedged_llm
 
 TAG = __name__
 logger = setup_logging()
@@ -41,10 +42,18 @@ def initialize_modules(
             if "type" not in config["LLM"][select_llm_module]
             else config["LLM"][select_llm_module]["type"]
         )
-        modules["llm"] = llm.create_instance(
-            llm_type,
-            config["LLM"][select_llm_module],
+        modules["llm"] = create_hedged_llm(
+            llm.create_instance(
+                llm_type,
+                config["LLM"][select_llm_module],
+            ),
+            config,
+            lambda name: llm.create_instance(
+                config["LLM"][name].get("type", name), config["LLM"][name]
+            ),
         )
+        # Tên cấu hình dùng làm khóa giới hạn đồng thời của provider_scheduler
+        modules["llm"].module_name = select_llm_module
         logger.bind(tag=TAG).info(f"Khởi tạo component: llm thành công {select_llm_module}")
 
     # Khởi tạo module Intent
@@ -84,10 +93,19 @@ def initialize_modules(
             if "type" not in config["VAD"][select_vad_module]
             else config["VAD"][select_vad_module]["type"]
         )
-        modules["vad"] = vad.create_instance(
-            vad_type,
-            config["VAD"][select_vad_module],
-        )
+        if model_server.serves_vad(config):
+            # Chế độ đa process: model VAD nằm trong model server dùng chung
+            from core.providers.vad.model_server_proxy import VADProvider
+
+            modules["vad"] = VADProvider(
+                config["VAD"][select_vad_module],
+                model_server.get_model_server_client(config),
+            )
+        else:
+            modules["vad"] = vad.create_instance(
+                vad_type,
+                config["VAD"][select_vad_module],
+            )
         logger.bind(tag=TAG).info(f"Khởi tạo component: vad thành công {select_vad_module}")
 
     # Khởi tạo module ASR
@@ -110,6 +128,7 @@ def initialize_tts(config):
         config["TTS"][select_tts_module],
         str(config.get("delete_audio", True)).lower() in ("true", "1", "yes"),
     )
+    new_tts.module_name = select_tts_module
     return new_tts
 
 
@@ -120,11 +139,23 @@ def initialize_asr(config):
         if "type" not in config["ASR"][select_asr_module]
         else config["ASR"][select_asr_module]["type"]
     )
-    new_asr = asr.create_instance(
-        asr_type,
-        config["ASR"][select_asr_module],
-        str(config.get("delete_audio", True)).lower() in ("true", "1", "yes"),
-    )
+    delete_audio_file = str(config.get("delete_audio", True)).lower() in ("true", "1", "yes")
+    if model_server.serves_asr(config):
+        # Chế độ đa process: model ASR local nằm trong model server dùng chung
+        from core.providers.asr.model_server_proxy import ASRProvider
+
+        new_asr = ASRProvider(
+            config["ASR"][select_asr_module],
+            delete_audio_file,
+            model_server.get_model_server_client(config),
+        )
+    else:
+        new_asr = asr.create_instance(
+            asr_type,
+            config["ASR"][select_asr_module],
+            delete_audio_file,
+        )
+    new_asr.module_name = select_asr_module
     logger.bind(tag=TAG).info("Khởi tạo module ASR hoàn tất")
     return new_asr
 
@@ -0,0 +1,238 @@
+"""
+Chuyển gói Opus từ file Ogg/Opus của nhà cung cấp TTS thẳng thành frame gửi cho thiết bị
+Không giải mã và mã hóa lại: chỉ tách gói Opus khỏi trang Ogg, rồi gộp các frame ngắn (ví dụ 20ms)
+thành gói đúng thời lượng frame của thiết bị (ví dụ 60ms) theo cách đóng gói lại của RFC 6716 (mã 3).
+Khi số kênh, tần số lấy mẫu hoặc thời lượng frame không khớp, trả về False để caller quay lại giải mã + mã hóa.
+"""
+
+import struct
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# Các tên định dạng nhà cung cấp dùng cho Ogg/Opus
+OGG_OPUS_TYPES = ("ogg_opus", "ogg", "opus")
+
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+_OPUS_HEAD = struct.Struct("<8sBBHIhB")
+
+# Số mẫu (ở 48kHz) của một frame theo config trong byte TOC (RFC 6716 mục 3.1)
+_SILK_SAMPLES = (480, 960, 1920, 2880)
+_HYBRID_SAMPLES = (480, 960)
+_CELT_SAMPLES = (120, 240, 480, 960)
+
+_stats_lock = threading.Lock()
+_stats = {"remuxed": 0, "fallbacks": 0}
+
+
+def iter_ogg_packets(data: bytes) -> Iterator[bytes]:
+    """Tách các gói của luồng logic đầu tiên trong dữ liệu Ogg, gói có thể trải qua nhiều trang"""
+    offset = 0
+    serial = None
+    packet = bytearray()
+    while offset + _PAGE_HEADER.size <= len(data):
+        capture, version, _, _, page_serial, _, _, segments = _PAGE_HEADER.unpack_from(
+            data, offset
+        )
+        if capture != b"OggS" or version != 0:
+            raise ValueError("Trang Ogg không hợp lệ")
+        lacing_start = offset + _PAGE_HEADER.size
+        lacing = data[lacing_start : lacing_start + segments]
+        offset = lacing_start + segments
+        if serial is None:
+            serial = page_serial
+        if page_serial != serial:
+            offset += sum(lacing)
+            continue
+        for size in lacing:
+            packet += data[offset : offset + size]
+            offset += size
+            # Đoạn dài 255 nghĩa là gói còn tiếp ở đoạn sau
+            if size < 255:
+                yield bytes(packet)
+                packet = bytearray()
+        if offset > len(data):
+            raise ValueError("Dữ liệu Ogg bị cắt cụt")
+
+
+def parse_opus_head(packet: bytes) -> Optional[Dict[str, int]]:
+    if len(packet) < _OPUS_HEAD.size:
+        return None
+    magic, version, channels, pre_skip, input_rate, _, mapping = _OPUS_HEAD.unpack_from(
+        packet
+    )
+    if magic != b"OpusHead" or version >> 4 != 0:
+        return None
+    return {
+        "channels": channels,
+        "pre_skip": pre_skip,
+        "input_sample_rate": input_rate,
+        "mapping_family": mapping,
+    }
+
+
+def _frame_samples(toc: int) -> int:
+    config = toc >> 3
+    if config < 12:
+        return _SILK_SAMPLES[config % 4]
+    if config < 16:
+        return _HYBRID_SAMPLES[config % 2]
+    return _CELT_SAMPLES[config % 4]
+
+
+def _read_length(packet: bytes, offset: int) -> Tuple[int, int]:
+    first = packet[offset]
+    if first < 252:
+        return first, offset + 1
+    return first + 4 * packet[offset + 1], offset + 2
+
+
+def split_frames(packet: bytes) -> List[bytes]:
+    """Tách một gói Opus thành các frame (RFC 6716 mục 3.2), ném ValueError nếu gói hỏng"""
+    if not packet:
+        raise ValueError("Gói Opus rỗng")
+    code = packet[0] & 0x03
+    try:
+        if code == 0:
+            return [packet[1:]]
+        if code == 1:
+            if (len(packet) - 1) % 2:
+                raise ValueError("Gói mã 1 có độ dài lẻ")
+            half = (len(packet) - 1) // 2
+            return [packet[1 : 1 + half], packet[1 + half :]]
+        if code == 2:
+            size, offset = _read_length(packet, 1)
+            if offset + size > len(packet):
+                raise ValueError("Gói mã 2 bị cắt cụt")
+            return [packet[offset : offset + size], packet[offset + size :]]
+
+        count_byte = packet[1]
+        vbr, has_padding, count = count_byte & 0x80, count_byte & 0x40, count_byte & 0x3F
+        if count == 0:
+            raise ValueError("Gói mã 3 không có frame")
+        offset, padding = 2, 0
+        while has_padding:
+            value = packet[offset]
+            offset += 1
+            padding += 254 if value == 255 else value
+            has_padding = value == 255
+        end = len(packet) - padding
+        if vbr:
+            sizes = []
+            for _ in range(count - 1):
+                size, offset = _read_length(packet, offset)
+                sizes.append(size)
+            sizes.append(end - offset - sum(sizes))
+        else:
+            if (end - offset) % count:
+                raise ValueError("Gói mã 3 CBR có độ dài không chia hết")
+            sizes = [(end - offset) // count] * count
+        if min(sizes) < 0 or offset + sum(sizes) > end:
+            raise ValueError("Gói mã 3 bị cắt cụt")
+        frames = []
+        for size in sizes:
+            frames.append(packet[offset : offset + size])
+            offset += size
+        return frames
+    except IndexError:
+        raise ValueError("Gói Opus bị cắt cụt")
+
+
+def _encode_length(size: int) -> bytes:
+    if size < 252:
+        return bytes((size,))
+    first = 252 + (size & 0x03)
+    return bytes((first, (size - first) >> 2))
+
+
+def join_frames(toc: int, frames: List[bytes]) -> bytes:
+    """Gộp các frame cùng config thành một gói Opus (mã 0 nếu chỉ có một frame, ngược lại mã 3 VBR)"""
+    toc &= 0xFC
+    if len(frames) == 1:
+        return bytes((toc,)) + frames[0]
+    lengths = b"".join(_encode_length(len(frame)) for frame in frames[:-1])
+    return bytes((toc | 0x03, 0x80 | len(frames))) + lengths + b"".join(frames)
+
+
+def _remux_packets(data: bytes, sample_rate: int, frame_duration_ms: int) -> List[bytes]:
+    """Tạo danh sách gói gửi cho thiết bị, ném ValueError kèm lý do nếu không chuyển thẳng được"""
+    packets = iter_ogg_packets(data)
+    head = parse_opus_head(next(packets, b""))
+    if head is None:
+        raise ValueError("thiếu OpusHead")
+    if head["channels"] != 1 or head["mapping_family"] != 0:
+        raise ValueError(f"số kênh {head['channels']}")
+    if head["input_sample_rate"] != sample_rate:
+        raise ValueError(f"tần số {head['input_sample_rate']} khác {sample_rate}")
+    # Bỏ qua gói OpusTags
+    next(packets, None)
+
+    target_samples = frame_duration_ms * 48
+    output = []
+    group: List[bytes] = []
+    group_toc = None
+    group_size = 0
+    for packet in packets:
+        frames = split_frames(packet)
+        toc = packet[0] & 0xFC
+        samples = _frame_samples(toc)
+        if target_samples % samples:
+            raise ValueError(f"frame {samples / 48}ms không ghép được thành {frame_duration_ms}ms")
+        if group_toc is None:
+            group_toc, group_size = toc, target_samples // samples
+        elif toc != group_toc:
+            # Các frame trong một gói phải cùng chế độ/băng thông/thời lượng
+            if group:
+                raise ValueError("chế độ mã hóa thay đổi giữa frame")
+            group_toc, group_size = toc, target_samples // samples
+        for frame in frames:
+            group.append(frame)
+            if len(group) == group_size:
+                output.append(join_frames(group_toc, group))
+                group = []
+    if group:
+        # Gói cuối có thể ngắn hơn thời lượng frame của thiết bị
+        output.append(join_frames(group_toc, group))
+    if not output:
+        raise ValueError("không có gói audio")
+    return output
+
+
+def remux_ogg_opus(
+    data: bytes,
+    sample_rate: int,
+    frame_duration_ms: int,
+    callback: Callable[[bytes], Any],
+) -> bool:
+    """Chuyển thẳng gói Opus trong dữ liệu Ogg/Opus cho callback
+
+    Args:
+        data: Dữ liệu Ogg/Opus của nhà cung cấp
+        sample_rate: Tần số lấy mẫu của thiết bị
+        frame_duration_ms: Thời lượng frame thiết bị mong đợi
+        callback: Hàm nhận từng gói Opus
+
+    Returns:
+        True nếu đã chuyển thẳng, False nếu tham số không khớp (chưa gọi callback, caller cần giải mã + mã hóa)
+    """
+    try:
+        packets = _remux_packets(data, sample_rate, frame_duration_ms)
+    except (ValueError, struct.error) as e:
+        with _stats_lock:
+            _stats["fallbacks"] += 1
+        logger.bind(tag=TAG).debug(f"Không chuyển thẳng được Ogg/Opus, giải mã lại: {e}")
+        return False
+    with _stats_lock:
+        _stats["remuxed"] += 1
+    for packet in packets:
+        callback(packet)
+    return True
+
+
+def get_remux_stats() -> Dict[str, int]:
+    """Số câu được chuyển thẳng và số câu phải quay lại giải mã + mã hóa"""
+    with _stats_lock:
+        return dict(_stats)
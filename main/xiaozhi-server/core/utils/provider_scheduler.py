@@ -0,0 +1,295 @@
+"""
+Giới hạn số yêu cầu đồng thời tới từng provider (LLM, TTS, ASR) của process
+Khi vượt giới hạn, yêu cầu phải xếp hàng theo mức ưu tiên: câu TTS đầu tiên, yêu cầu LLM đầu tiên của lượt trò chuyện
+và ASR (người dùng đang chờ) được phục vụ trước các câu sau và các lượt gọi LLM tiếp theo sau khi gọi công cụ.
+Nhờ vậy khi quá tải, giới hạn tốc độ của nhà cung cấp không rơi vào đường tới âm thanh đầu tiên.
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from typing import Any, Dict, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# Mức ưu tiên, số nhỏ được phục vụ trước
+PRIORITY_FIRST = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NAMES = {PRIORITY_FIRST: "first", PRIORITY_NORMAL: "normal"}
+
+DEFAULT_MAX_CONCURRENCY = {"LLM": 32, "TTS": 32, "ASR": 16}
+
+
+class _Waiter:
+    __slots__ = ("loop", "future", "event", "granted", "cancelled")
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.future = loop.create_future() if loop is not None else None
+        self.event = threading.Event() if loop is None else None
+        self.granted = False
+        self.cancelled = False
+
+    def wake(self) -> bool:
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+            return True
+        except RuntimeError:
+            # Loop đã đóng, không còn ai chờ
+            return False
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _PriorityStats:
+    __slots__ = ("requests", "queued", "wait_ms_total", "wait_ms_max")
+
+    def __init__(self):
+        self.requests = 0
+        self.queued = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def record(self, wait_ms: float, queued: bool):
+        self.requests += 1
+        if queued:
+            self.queued += 1
+        self.wait_ms_total += wait_ms
+        if wait_ms > self.wait_ms_max:
+            self.wait_ms_max = wait_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "queued": self.queued,
+            "wait_ms_avg": round(self.wait_ms_total / self.requests, 1) if self.requests else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 1),
+        }
+
+
+class ProviderLimiter:
+    """Semaphore có ưu tiên, dùng được cả từ event loop (acquire) lẫn từ thread (acquire_sync)"""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._heap = []
+        self._seq = itertools.count()
+        self._stats = {priority: _PriorityStats() for priority in PRIORITY_NAMES}
+
+    def _try_enter(self) -> bool:
+        """Vào ngay nếu còn chỗ và không có ai đang chờ (gọi khi đang giữ khóa)"""
+        if self.in_flight < self.max_concurrency and not self._heap:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _enqueue(self, priority: int, waiter: _Waiter):
+        heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+
+    def _record(self, priority: int, start: float, queued: bool):
+        with self._lock:
+            self._stats.get(priority, self._stats[PRIORITY_NORMAL]).record(
+                (time.monotonic() - start) * 1000, queued
+            )
+
+    async def acquire(self, priority: int = PRIORITY_NORMAL):
+        start = time.monotonic()
+        waiter = None
+        with self._lock:
+            if not self._try_enter():
+                waiter = _Waiter(asyncio.get_running_loop())
+                self._enqueue(priority, waiter)
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    waiter.cancelled = True
+                    granted = waiter.granted
+                if granted:
+                    # Đã được cấp chỗ đúng lúc bị hủy, trả lại cho người kế tiếp
+                    self.release()
+                raise
+        self._record(priority, start, waiter is not None)
+
+    def acquire_sync(self, priority: int = PRIORITY_NORMAL):
+        start = time.monotonic()
+        waiter = None
+        with self._lock:
+            if not self._try_enter():
+                waiter = _Waiter()
+                self._enqueue(priority, waiter)
+        if waiter is not None:
+            waiter.event.wait()
+        self._record(priority, start, waiter is not None)
+
+    def release(self):
+        with self._lock:
+            # Chuyển thẳng chỗ cho waiter ưu tiên cao nhất, in_flight giữ nguyên
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled or not waiter.wake():
+                    continue
+                waiter.granted = True
+                return
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting = sum(1 for _, _, waiter in self._heap if not waiter.cancelled)
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "waiting": waiting,
+                "priorities": {
+                    PRIORITY_NAMES[priority]: stats.to_dict()
+                    for priority, stats in self._stats.items()
+                },
+            }
+
+
+class ProviderScheduler:
+    def __init__(self, config: dict):
+        scheduler_config = config.get("provider_scheduler") or {}
+        self.enabled = str(scheduler_config.get("enabled", False)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
+        self.max_concurrency = dict(DEFAULT_MAX_CONCURRENCY)
+        for kind, value in (scheduler_config.get("max_concurrency") or {}).items():
+            if value:
+                self.max_concurrency[kind] = int(value)
+        # Ghi đè theo provider, khóa là tên cấu hình trong selected_module (ví dụ ChatGLMLLM, EdgeTTS)
+        self.providers_config = scheduler_config.get("providers") or {}
+        self.stats_interval = float(scheduler_config.get("stats_interval", 60) or 0)
+
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._last_stats_time = time.monotonic()
+
+    def limiter(self, kind: str, provider) -> Optional[ProviderLimiter]:
+        """Lấy bộ giới hạn của provider, None nếu chưa bật hoặc không giới hạn
+
+        Args:
+            kind: LLM, TTS hoặc ASR
+            provider: Instance provider, tên cấu hình (module_name) dùng làm khóa; provider không có module_name
+                (không tạo qua selected_module) dùng tên module Python
+        """
+        if not self.enabled:
+            return None
+        self.log_stats()
+        # Các LLM tương thích OpenAI (ChatGLM, DeepSeek, Qwen...) cùng type nhưng là các nhà cung cấp khác nhau
+        name = getattr(provider, "module_name", None) or type(provider).__module__.split(".")[-1]
+        key = f"{kind}:{name}"
+        limiter = self._limiters.get(key)
+        if limiter is not None:
+            return limiter
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                max_concurrency = self.providers_config.get(name) or self.max_concurrency.get(kind)
+                if not max_concurrency:
+                    return None
+                limiter = ProviderLimiter(key, int(max_concurrency))
+                self._limiters[key] = limiter
+                logger.bind(tag=TAG).info(
+                    f"Giới hạn đồng thời provider {key}: {limiter.max_concurrency}"
+                )
+            return limiter
+
+    def log_stats(self):
+        """Ghi log thời gian chờ theo mức ưu tiên, tối đa một lần mỗi stats_interval giây"""
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_time < self.stats_interval:
+            return
+        self._last_stats_time = now
+        for key, stats in self.get_stats().items():
+            priorities = ", ".join(
+                f"{name}: {p['requests']} yêu cầu, {p['queued']} phải chờ, "
+                f"chờ TB {p['wait_ms_avg']}ms, tối đa {p['wait_ms_max']}ms"
+                for name, p in stats["priorities"].items()
+                if p["requests"]
+            )
+            if priorities:
+                logger.bind(tag=TAG).info(
+                    f"Thống kê provider {key}: đang chạy={stats['in_flight']}/{stats['max_concurrency']}, "
+                    f"đang chờ={stats['waiting']}, {priorities}"
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {key: limiter.get_stats() for key, limiter in limiters}
+
+
+def limit_stream(limiter: Optional[ProviderLimiter], priority: int, stream):
+    """Bọc generator đồng bộ: giữ chỗ từ khi lấy phần đầu tiên đến khi luồng kết thúc hoặc bị đóng"""
+    if limiter is None:
+        return stream
+    return _limited_stream(limiter, priority, stream)
+
+
+def _limited_stream(limiter, priority, stream):
+    limiter.acquire_sync(priority)
+    try:
+        yield from stream
+    finally:
+        limiter.release()
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def limit_async_stream(limiter: Optional[ProviderLimiter], priority: int, stream):
+    """Phiên bản bất đồng bộ của limit_stream cho async generator"""
+    if limiter is None:
+        return stream
+    return _limited_async_stream(limiter, priority, stream)
+
+
+async def _limited_async_stream(limiter, priority, stream):
+    await limiter.acquire(priority)
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        limiter.release()
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+_scheduler: Optional[ProviderScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_provider_scheduler(config: dict = None) -> ProviderScheduler:
+    """Lấy bộ lập lịch dùng chung của process, lần gọi đầu tiên đọc cấu hình provider_scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ProviderScheduler(config or {})
+        return _scheduler
+
+
+def get_provider_stats() -> Dict[str, Any]:
+    """Thống kê số yêu cầu, số yêu cầu phải chờ và thời gian chờ theo mức ưu tiên của từng provider"""
+    if _scheduler is None:
+        return {}
+    return _scheduler.get_stats()
@@ -0,0 +1,157 @@
+"""
+Bộ tách câu theo luồng cho TTS
+Văn bản LLM đến theo từng token, bộ tách chỉ quét các ký tự mới được thêm vào (không nối lại toàn bộ câu trả lời
+và tìm dấu câu từ đầu ở mỗi token), phần văn bản chưa tách luôn ngắn nên chi phí mỗi token là hằng số.
+Chính sách tách có thể cấu hình (tts_segmenter): số ký tự tối thiểu của đoạn, tách theo thời gian cho đoạn đầu tiên
+(giảm thời gian tới âm thanh đầu tiên khi LLM chậm có dấu câu), và độ dài tối đa của một đoạn.
+"""
+
+import time
+from typing import Iterable, List, Optional
+from core.utils import textUtils
+
+# Chỗ ngắt mềm khi buộc phải tách đoạn không có dấu câu kết thúc (đoạn quá dài hoặc hết thời gian chờ đoạn đầu)
+SOFT_BREAKS = frozenset("，,、~；;：: \t\n")
+
+
+class StreamingSentenceSegmenter:
+    def __init__(
+        self,
+        punctuations: Iterable[str],
+        first_punctuations: Iterable[str],
+        min_chars: int = 0,
+        first_min_chars: int = 0,
+        first_flush_ms: float = 0,
+        max_chars: int = 0,
+    ):
+        self.punctuations = frozenset(punctuations)
+        self.first_punctuations = frozenset(first_punctuations)
+        self.min_chars = min_chars
+        self.first_min_chars = first_min_chars
+        self.first_flush_ms = first_flush_ms
+        self.max_chars = max_chars
+        self.reset()
+
+    def configure(self, config: Optional[dict]):
+        """Đọc chính sách tách từ cấu hình tts_segmenter, giá trị 0 hoặc bỏ trống là tắt"""
+        config = config or {}
+        self.min_chars = int(config.get("min_chars", 0) or 0)
+        self.first_min_chars = int(config.get("first_min_chars", 0) or 0)
+        self.first_flush_ms = float(config.get("first_flush_ms", 0) or 0)
+        self.max_chars = int(config.get("max_chars", 0) or 0)
+
+    def reset(self):
+        """Bắt đầu lượt trả lời mới"""
+        self._pending = ""
+        # Số ký tự đầu của _pending đã quét
+        self._scanned = 0
+        # Vị trí sau dấu câu cuối cùng đã thấy (không phải câu đầu tiên), -1 nếu chưa có
+        self._last_cut = -1
+        self._is_first = True
+        self._first_text_time = None
+
+    @property
+    def is_first(self) -> bool:
+        return self._is_first
+
+    def append(self, text: str) -> List[str]:
+        """Thêm văn bản mới, trả về các đoạn đã sẵn sàng để tổng hợp (đã bỏ dấu câu/emoji ở hai đầu)"""
+        if not text:
+            return []
+        if self._first_text_time is None:
+            self._first_text_time = time.monotonic()
+        self._pending += text
+        return self._drain()
+
+    def _drain(self) -> List[str]:
+        """Tách liên tiếp cho đến khi phần còn lại chưa đủ một đoạn (một token có thể chứa nhiều câu)"""
+        segments = []
+        while self._pending:
+            cut = self._find_cut()
+            if cut < 0:
+                break
+            segment_text = self._emit(cut)
+            if segment_text:
+                segments.append(segment_text)
+        return segments
+
+    def _find_cut(self) -> int:
+        if self._is_first:
+            cut = self._scan_first()
+        else:
+            cut = self._scan()
+        if cut < 0 and self.max_chars and len(self._pending) >= self.max_chars:
+            # Đoạn quá dài: ưu tiên dấu câu đã có (chưa đủ min_chars), không có thì tìm chỗ ngắt mềm
+            cut = self._last_cut if self._last_cut > 0 else self._soft_cut(self.max_chars)
+        if cut < 0 and self.flush_delay() == 0:
+            cut = self._soft_cut(len(self._pending))
+        return cut
+
+    def _scan_first(self) -> int:
+        """Câu đầu tiên: tách ngay ở dấu câu (kể cả dấu phẩy) đầu tiên đủ first_min_chars ký tự"""
+        pending = self._pending
+        for i in range(self._scanned, len(pending)):
+            if pending[i] in self.first_punctuations and i + 1 >= self.first_min_chars:
+                return i + 1
+        self._scanned = len(pending)
+        return -1
+
+    def _scan(self) -> int:
+        """Các câu sau: gộp đến dấu câu kết thúc cuối cùng đã có, khi đoạn đủ min_chars ký tự"""
+        pending = self._pending
+        punctuations = self.punctuations
+        for i in range(self._scanned, len(pending)):
+            if pending[i] in punctuations:
+                self._last_cut = i + 1
+        self._scanned = len(pending)
+        if self._last_cut > 0 and self._last_cut >= self.min_chars:
+            return self._last_cut
+        return -1
+
+    def _soft_cut(self, limit: int) -> int:
+        """Vị trí tách khi không có dấu câu: chỗ ngắt mềm cuối cùng trong limit ký tự đầu, không có thì tách cứng"""
+        for i in range(limit - 1, limit // 2 - 1, -1):
+            if self._pending[i] in SOFT_BREAKS:
+                return i + 1
+        return limit
+
+    def _emit(self, cut: int) -> Optional[str]:
+        """Cắt đoạn đến vị trí cut, phần còn lại sẽ được quét lại từ đầu theo chế độ hiện tại (câu đầu tiên hay không)"""
+        segment = self._pending[:cut]
+        self._pending = self._pending[cut:]
+        self._scanned = 0
+        self._last_cut = -1
+        segment_text = textUtils.get_string_no_punctuation_or_emoji(segment)
+        if not segment_text:
+            # Đoạn chỉ có dấu câu/emoji: không tính là câu đầu tiên
+            return None
+        self._is_first = False
+        return segment_text
+
+    def flush_delay(self) -> Optional[float]:
+        """Số giây còn lại trước khi tách đoạn đầu tiên theo thời gian, None nếu không có gì đang chờ"""
+        if (
+            not self._is_first
+            or not self.first_flush_ms
+            or self._first_text_time is None
+            or len(self._pending.strip()) < max(1, self.first_min_chars)
+        ):
+            return None
+        elapsed = time.monotonic() - self._first_text_time
+        return max(0.0, self.first_flush_ms / 1000 - elapsed)
+
+    def flush_first(self) -> List[str]:
+        """Hết thời gian chờ dấu câu của đoạn đầu tiên: tách phần đã có để bắt đầu phát âm thanh"""
+        if self.flush_delay() != 0:
+            return []
+        segment_text = self._emit(self._soft_cut(len(self._pending)))
+        segments = [segment_text] if segment_text else []
+        return segments + self._drain()
+
+    def take_remaining(self) -> str:
+        """Lấy phần văn bản chưa tách (khi lượt trả lời kết thúc) và xóa khỏi bộ đệm"""
+        remaining = self._pending
+        self._pending = ""
+        self._scanned = 0
+        self._last_cut = -1
+        return remaining
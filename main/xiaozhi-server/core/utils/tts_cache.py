@@ -0,0 +1,263 @@
+"""
+Bộ nhớ đệm audio TTS theo cụm từ
+Lưu các frame audio đã mã hóa (Opus hoặc PCM, đúng định dạng gửi cho thiết bị) của những câu ngắn hay lặp lại
+(lời chào, thông báo lỗi hệ thống, lời kết thúc, câu trả lời ngắn...), khóa theo provider, toàn bộ cấu hình TTS (bỏ thông tin xác thực), định dạng và văn bản.
+Khi trúng đệm, không cần gọi nhà cung cấp TTS và không cần giải mã/mã hóa lại audio.
+Tầng bộ nhớ là LRU giới hạn theo byte, tầng đĩa (tùy chọn) lưu file dạng p3 và cũng giới hạn dung lượng.
+"""
+
+import os
+import re
+import json
+import time
+import struct
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# Khóa cấu hình chứa thông tin xác thực, không đưa vào khóa đệm
+SECRET_KEY_PARTS = ("key", "token", "secret", "password", "authorization")
+# Khóa cấu hình không ảnh hưởng tới audio
+IGNORED_CONFIG_KEYS = ("output_dir",)
+
+
+def config_fingerprint(config: Any) -> Any:
+    """Bản sao cấu hình TTS đã bỏ thông tin xác thực, dùng làm một phần khóa đệm
+    (giọng, URL endpoint, tham số riêng của từng provider như reference_id, spk_id, ref_audio_path... đều được giữ)"""
+    if isinstance(config, dict):
+        return {
+            key: config_fingerprint(value)
+            for key, value in config.items()
+            if key not in IGNORED_CONFIG_KEYS
+            and not any(part in str(key).lower() for part in SECRET_KEY_PARTS)
+        }
+    if isinstance(config, (list, tuple)):
+        return [config_fingerprint(value) for value in config]
+    return config
+
+
+_P3_HEADER = struct.Struct(">BBH")
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hóa văn bản làm khóa: NFC, gộp khoảng trắng"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TTSAudioCache:
+    def __init__(self, config: dict):
+        cache_config = config.get("tts_cache") or {}
+        self.enabled = str(cache_config.get("enabled", False)).lower() in (
+            "true",
+            "1",
+            "yes",
+        )
+        max_memory_mb = cache_config.get("max_memory_mb", 64)
+        self.max_memory_bytes = int(float(max_memory_mb) * 1024 * 1024) if max_memory_mb else 0
+        max_text_length = cache_config.get("max_text_length", 50)
+        self.max_text_length = int(max_text_length) if max_text_length else 50
+        self.disk_enabled = self.enabled and str(
+            cache_config.get("disk_enabled", False)
+        ).lower() in ("true", "1", "yes")
+        self.disk_dir = cache_config.get("disk_dir") or "data/tts_cache"
+        max_disk_mb = cache_config.get("max_disk_mb", 512)
+        self.max_disk_bytes = int(float(max_disk_mb) * 1024 * 1024) if max_disk_mb else 0
+        self.stats_interval = float(cache_config.get("stats_interval", 300) or 0)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+        self._last_stats_time = time.monotonic()
+
+        if self.disk_enabled:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(
+                entry.stat().st_size
+                for entry in os.scandir(self.disk_dir)
+                if entry.is_file() and entry.name.endswith(".p3")
+            )
+
+    def key_for(self, provider, text: str) -> Optional[str]:
+        """Khóa đệm của một câu, None nếu không đệm (chưa bật hoặc câu quá dài)"""
+        if not self.enabled or not text:
+            return None
+        text = normalize_text(text)
+        if not text or len(text) > self.max_text_length:
+            return None
+        conn = provider.conn
+        key = {
+            "provider": type(provider).__module__.split(".")[-1],
+            "params": provider.cache_params(),
+            "audio_format": getattr(conn, "audio_format", None),
+            "sample_rate": getattr(conn, "sample_rate", None),
+            "text": text,
+        }
+        raw = json.dumps(key, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """Tra tầng bộ nhớ"""
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+                self._stats["memory_hits"] += 1
+            elif not self.disk_enabled:
+                self._stats["misses"] += 1
+        self._log_stats()
+        return frames
+
+    def load_from_disk(self, key: str) -> Optional[List[bytes]]:
+        """Tra tầng đĩa (I/O chặn, gọi trên thread pool), trúng thì đưa lên tầng bộ nhớ"""
+        path = self._disk_path(key)
+        frames = None
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            frames = []
+            offset = 0
+            while offset < len(data):
+                _, _, size = _P3_HEADER.unpack_from(data, offset)
+                offset += _P3_HEADER.size
+                frames.append(data[offset : offset + size])
+                offset += size
+            # Cập nhật thời gian truy cập để việc dọn dẹp tầng đĩa theo LRU
+            os.utime(path)
+        except FileNotFoundError:
+            frames = None
+        except (OSError, struct.error) as e:
+            logger.bind(tag=TAG).warning(f"Đọc đệm TTS trên đĩa thất bại: {e}")
+            frames = None
+
+        with self._lock:
+            self._stats["disk_hits" if frames else "misses"] += 1
+        if frames:
+            self._put_memory(key, frames)
+        return frames or None
+
+    def put(self, key: str, frames: List[bytes]):
+        """Lưu vào tầng bộ nhớ, tầng đĩa cần gọi thêm store_to_disk trên thread pool"""
+        if not frames:
+            return
+        with self._lock:
+            self._stats["stores"] += 1
+        self._put_memory(key, frames)
+
+    def _put_memory(self, key: str, frames: List[bytes]):
+        size = sum(len(frame) for frame in frames)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= sum(len(frame) for frame in old)
+            self._entries[key] = list(frames)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= sum(len(frame) for frame in evicted)
+                self._stats["evictions"] += 1
+
+    def store_to_disk(self, key: str, frames: List[bytes]):
+        """Ghi file p3 (I/O chặn, gọi trên thread pool)"""
+        if not self.disk_enabled or not frames:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        data = b"".join(_P3_HEADER.pack(0, 0, len(frame)) + frame for frame in frames)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.bind(tag=TAG).warning(f"Ghi đệm TTS xuống đĩa thất bại: {e}")
+            return
+        with self._disk_lock:
+            self._disk_bytes += len(data)
+            if self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes:
+                self._trim_disk()
+
+    def _trim_disk(self):
+        """Xóa các file ít được dùng nhất cho đến khi còn 90% dung lượng cho phép"""
+        entries = [
+            entry
+            for entry in os.scandir(self.disk_dir)
+            if entry.is_file() and entry.name.endswith(".p3")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        target = int(self.max_disk_bytes * 0.9)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.p3")
+
+    def _log_stats(self):
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_time < self.stats_interval:
+            return
+        self._last_stats_time = now
+        stats = self.get_stats()
+        logger.bind(tag=TAG).info(
+            f"Thống kê đệm TTS: trúng bộ nhớ {stats['memory_hits']}, trúng đĩa {stats['disk_hits']}, "
+            f"trượt {stats['misses']} (tỷ lệ trúng {stats['hit_rate']:.1%}), số câu {stats['entries']}, "
+            f"bộ nhớ {stats['memory_mb']}MB, đĩa {stats['disk_mb']}MB, bị loại {stats['evictions']}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["memory_mb"] = round(self._memory_bytes / 1024 / 1024, 1)
+        stats["disk_mb"] = round(self._disk_bytes / 1024 / 1024, 1)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (
+            (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        )
+        return stats
+
+
+_tts_cache: Optional[TTSAudioCache] = None
+_tts_cache_lock = threading.Lock()
+
+
+def get_tts_cache(config: dict = None) -> TTSAudioCache:
+    """Lấy bộ đệm TTS dùng chung của process, lần gọi đầu tiên đọc cấu hình tts_cache"""
+    global _tts_cache
+    with _tts_cache_lock:
+        if _tts_cache is None:
+            _tts_cache = TTSAudioCache(config or {})
+            if _tts_cache.enabled:
+                logger.bind(tag=TAG).info(
+                    f"Bật đệm TTS: bộ nhớ {_tts_cache.max_memory_bytes // 1024 // 1024}MB, "
+                    f"tầng đĩa {'bật tại ' + _tts_cache.disk_dir if _tts_cache.disk_enabled else 'tắt'}"
+                )
+        return _tts_cache
@@ -11,6 +11,8 @@ import numpy as np
 import opuslib_next
 from io import BytesIO
 from core.utils import p3
+from core.utils.audio_decode import decode_to_pcm, read_header, sniff_audio_type
+from core.utils.ogg_opus import OGG_OPUS_TYPES, remux_ogg_opus
 from pydub import AudioSegment
 from typing import Callable, Any
 
@@ -227,23 +229,56 @@ def extract_json_from_string(input_string):
 
 
 def audio_to_data_stream(
-    audio_file_path, is_opus=True, callback: Callable[[Any], Any] = None, sample_rate=16000, opus_encoder=None
+    audio_file_path, is_opus=True, callback: Callable[[Any], Any] = None, sample_rate=16000, opus_encoder=None,
+    source_sample_rate=None,
 ) -> None:
     # Lấy phần mở rộng file
     file_type = os.path.splitext(audio_file_path)[1]
     if file_type:
         file_type = file_type.lstrip(".")
-    # Đọc file audio, tham số -nostdin: không đọc dữ liệu từ đầu vào tiêu chuẩn, nếu không FFmpeg sẽ bị chặn
-    audio = AudioSegment.from_file(
-        audio_file_path, format=file_type, parameters=["-nostdin"]
+    if is_opus and file_type in OGG_OPUS_TYPES:
+        with open(audio_file_path, "rb") as f:
+            if _remux_opus(f.read(), callback, sample_rate, opus_encoder):
+                return
+    raw_data = decode_audio_to_pcm(
+        audio_file_path, file_type, sample_rate, source_sample_rate
     )
+    pcm_to_data_stream(raw_data, is_opus, callback, sample_rate, opus_encoder)
+
+
+def _remux_opus(audio_bytes, callback, sample_rate, opus_encoder) -> bool:
+    """Ogg/Opus khớp tần số và thời lượng frame của thiết bị thì chuyển thẳng gói Opus, không giải mã/mã hóa lại"""
+    frame_duration = opus_encoder.frame_size_ms if opus_encoder is not None else 60
+    return remux_ogg_opus(audio_bytes, sample_rate, frame_duration, callback)
+
+
+def decode_audio_to_pcm(
+    source, file_type, sample_rate=16000, source_sample_rate=None
+) -> bytes:
+    """
+    Giải mã file/dữ liệu audio thành PCM 16-bit mono little-endian ở tần số sample_rate
+    WAV, PCM thô và MP3 (khi có miniaudio) giải mã ngay trong process, các định dạng khác dùng pydub (ffmpeg)
+    source_sample_rate là tần số của PCM thô (None nếu đã đúng tần số đích)
+    Bộ giải mã được chọn theo nội dung (OggS/RIFF/ID3...), không tin hoàn toàn định dạng đã yêu cầu nhà cung cấp
+    """
+    file_type = sniff_audio_type(read_header(source), file_type)
+    raw_data = decode_to_pcm(source, file_type, sample_rate, source_sample_rate)
+    if raw_data is not None:
+        return raw_data
+
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    if file_type in OGG_OPUS_TYPES:
+        # Tên định dạng của nhà cung cấp (ogg_opus, opus), ffmpeg chỉ nhận ogg
+        file_type = "ogg"
+    # Đọc file audio, tham số -nostdin: không đọc dữ liệu từ đầu vào tiêu chuẩn, nếu không FFmpeg sẽ bị chặn
+    audio = AudioSegment.from_file(source, format=file_type, parameters=["-nostdin"])
 
     # Chuyển đổi thành mono/tần số lấy mẫu được chỉ định/mã hóa 16-bit little-endian (đảm bảo khớp với bộ mã hóa)
     audio = audio.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2)
 
     # Lấy dữ liệu PCM gốc (16-bit little-endian)
-    raw_data = audio.raw_data
-    pcm_to_data_stream(raw_data, is_opus, callback, sample_rate, opus_encoder)
+    return audio.raw_data
 
 
 async def audio_to_data(
@@ -273,16 +308,8 @@ async def audio_to_data(
         file_type = os.path.splitext(audio_file_path)[1]
         if file_type:
             file_type = file_type.lstrip(".")
-        # Đọc file audio, tham số -nostdin: không đọc dữ liệu từ đầu vào tiêu chuẩn, nếu không FFmpeg sẽ bị chặn
-        audio = AudioSegment.from_file(
-            audio_file_path, format=file_type, parameters=["-nostdin"]
-        )
-
-        # Chuyển đổi thành mono/tần số lấy mẫu 16kHz/mã hóa 16-bit little-endian (đảm bảo khớp với bộ mã hóa)
-        audio = audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
-
-        # Lấy dữ liệu PCM gốc (16-bit little-endian)
-        raw_data = audio.raw_data
+        # PCM 16kHz/mono/16-bit little-endian (đảm bảo khớp với bộ mã hóa)
+        raw_data = decode_audio_to_pcm(audio_file_path, file_type, 16000)
 
         # Khởi tạo bộ mã hóa Opus
         encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
@@ -325,21 +352,26 @@ async def audio_to_data(
 
 
 def audio_bytes_to_data_stream(
-    audio_bytes, file_type, is_opus, callback: Callable[[Any], Any], sample_rate=16000, opus_encoder=None
+    audio_bytes, file_type, is_opus, callback: Callable[[Any], Any], sample_rate=16000, opus_encoder=None,
+    source_sample_rate=None,
 ) -> None:
     """
-    Trực tiếp chuyển đổi dữ liệu nhị phân audio thành dữ liệu opus/pcm, hỗ trợ wav, mp3, p3
+    Trực tiếp chuyển đổi dữ liệu nhị phân audio thành dữ liệu opus/pcm, hỗ trợ wav, mp3, p3, ogg/opus
     """
     if file_type == "p3":
         # Trực tiếp giải mã p3
         return p3.decode_opus_from_bytes_stream(audio_bytes, callback)
+    elif (
+        is_opus
+        and file_type in OGG_OPUS_TYPES
+        and _remux_opus(audio_bytes, callback, sample_rate, opus_encoder)
+    ):
+        return None
     else:
-        # Các định dạng khác dùng pydub
-        audio = AudioSegment.from_file(
-            BytesIO(audio_bytes), format=file_type, parameters=["-nostdin"]
+        # Các định dạng khác giải mã thành PCM (trong process nếu được, ngược lại dùng pydub)
+        raw_data = decode_audio_to_pcm(
+            audio_bytes, file_type, sample_rate, source_sample_rate
         )
-        audio = audio.set_channels(1).set_frame_rate(sample_rate).set_sample_width(2)
-        raw_data = audio.raw_data
         pcm_to_data_stream(raw_data, is_opus, callback, sample_rate, opus_encoder)
 
 
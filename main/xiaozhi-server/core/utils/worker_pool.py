@@ -0,0 +1,230 @@
+"""
+Thread pool dùng chung cho toàn bộ process, thay cho ThreadPoolExecutor riêng của từng kết nối
+Số thread có giới hạn, công việc của mỗi kết nối nằm trong hàng đợi riêng và được lấy lần lượt (round-robin),
+nên một kết nối gửi nhiều việc cũng không làm các kết nối khác phải chờ lâu
+"""
+
+import asyncio
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Callable, Deque, Dict, Optional
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+DEFAULT_MAX_WORKERS = 64
+
+
+class _WorkItem:
+    __slots__ = ("future", "fn", "args", "kwargs")
+
+    def __init__(self, future: Future, fn: Callable, args, kwargs):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except BaseException as e:
+            self.future.set_exception(e)
+        else:
+            self.future.set_result(result)
+
+
+class FairWorkerPool:
+    """Thread pool có giới hạn, chia lượt công bằng giữa các kết nối"""
+
+    def __init__(self, name: str = "worker", max_workers: int = DEFAULT_MAX_WORKERS):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        # Hàng đợi công việc của từng kết nối và thứ tự lượt của các kết nối đang có việc chờ
+        self._pending: Dict[int, Deque[_WorkItem]] = {}
+        self._ready: Deque[int] = deque()
+        self._pending_total = 0
+        self._threads = []
+        self._idle_workers = 0
+        self._owner_ids = itertools.count(1)
+
+        self._stats = {"submitted": 0, "completed": 0, "max_pending": 0}
+
+    def executor_for(self, owner: str = "") -> "ConnectionExecutor":
+        """Tạo executor cho một kết nối, dùng thay cho ThreadPoolExecutor riêng"""
+        return ConnectionExecutor(self, next(self._owner_ids), owner)
+
+    def _submit(self, owner_id: int, item: _WorkItem):
+        with self._lock:
+            owner_queue = self._pending.get(owner_id)
+            if owner_queue is None:
+                owner_queue = deque()
+                self._pending[owner_id] = owner_queue
+                self._ready.append(owner_id)
+            owner_queue.append(item)
+            self._pending_total += 1
+            self._stats["submitted"] += 1
+            if self._pending_total > self._stats["max_pending"]:
+                self._stats["max_pending"] = self._pending_total
+            self._adjust_thread_count()
+            self._not_empty.notify()
+
+    def _adjust_thread_count(self):
+        """Chỉ tạo thêm thread khi số việc chờ vượt số thread rảnh và chưa đạt giới hạn (gọi khi đang giữ lock)"""
+        if (
+            self._pending_total <= self._idle_workers
+            or len(self._threads) >= self.max_workers
+        ):
+            return
+        thread = threading.Thread(
+            target=self._worker,
+            name=f"{self.name}-{len(self._threads)}",
+            daemon=True,
+        )
+        self._threads.append(thread)
+        thread.start()
+
+    def _next_item(self) -> _WorkItem:
+        """Lấy việc tiếp theo theo lượt của từng kết nối, chặn khi không có việc"""
+        with self._lock:
+            while not self._ready:
+                self._idle_workers += 1
+                self._not_empty.wait()
+                self._idle_workers -= 1
+            owner_id = self._ready.popleft()
+            owner_queue = self._pending[owner_id]
+            item = owner_queue.popleft()
+            self._pending_total -= 1
+            if owner_queue:
+                # Kết nối còn việc thì xếp xuống cuối lượt
+                self._ready.append(owner_id)
+            else:
+                del self._pending[owner_id]
+            return item
+
+    def _worker(self):
+        while True:
+            item = self._next_item()
+            try:
+                item.run()
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Worker {self.name} xử lý công việc lỗi: {e}")
+            finally:
+                with self._lock:
+                    self._stats["completed"] += 1
+            del item
+
+    def _cancel_owner(self, owner_id: int) -> int:
+        """Hủy các việc đang chờ của một kết nối, trả về số việc đã hủy"""
+        with self._lock:
+            owner_queue = self._pending.pop(owner_id, None)
+            if not owner_queue:
+                return 0
+            self._pending_total -= len(owner_queue)
+            try:
+                self._ready.remove(owner_id)
+            except ValueError:
+                pass
+        for item in owner_queue:
+            item.future.cancel()
+        return len(owner_queue)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "threads": len(self._threads),
+                "max_workers": self.max_workers,
+                "idle": self._idle_workers,
+                "pending": self._pending_total,
+                "owners_waiting": len(self._ready),
+                **self._stats,
+            }
+
+
+class ConnectionExecutor(Executor):
+    """Executor của một kết nối: gửi việc vào pool dùng chung, không tự tạo thread"""
+
+    def __init__(self, pool: FairWorkerPool, owner_id: int, owner: str = ""):
+        self._pool = pool
+        self._owner_id = owner_id
+        self.owner = owner
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        future = Future()
+        self._pool._submit(self._owner_id, _WorkItem(future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """Ngừng nhận việc mới; thread thuộc pool dùng chung nên không cần chờ thread kết thúc"""
+        self._shutdown = True
+        if cancel_futures:
+            self._pool._cancel_owner(self._owner_id)
+
+
+_worker_pool: Optional[FairWorkerPool] = None
+_worker_pool_lock = threading.Lock()
+
+
+def get_worker_pool(config: dict = None) -> FairWorkerPool:
+    """Lấy thread pool dùng chung của process, lần gọi đầu tiên đọc cấu hình worker_pool.max_workers"""
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            pool_config = (config or {}).get("worker_pool") or {}
+            max_workers = pool_config.get("max_workers", DEFAULT_MAX_WORKERS)
+            _worker_pool = FairWorkerPool(
+                "conn-worker",
+                int(max_workers) if max_workers else DEFAULT_MAX_WORKERS,
+            )
+            logger.bind(tag=TAG).info(
+                f"Khởi tạo thread pool dùng chung: max_workers={_worker_pool.max_workers}"
+            )
+        return _worker_pool
+
+
+_llm_pool: Optional[FairWorkerPool] = None
+DEFAULT_LLM_MAX_WORKERS = 32
+
+
+def get_llm_pool(config: dict = None) -> FairWorkerPool:
+    """Lấy thread pool riêng cho các lượt trò chuyện với LLM không có giao diện streaming bất đồng bộ
+
+    Một lượt như vậy giữ thread trong suốt thời gian LLM trả lời, nên tách khỏi pool dùng chung để tổng hợp
+    giọng nói và khởi tạo module không phải chờ sau các lượt LLM; đọc cấu hình worker_pool.llm_max_workers
+    """
+    global _llm_pool
+    with _worker_pool_lock:
+        if _llm_pool is None:
+            pool_config = (config or {}).get("worker_pool") or {}
+            max_workers = pool_config.get("llm_max_workers", DEFAULT_LLM_MAX_WORKERS)
+            _llm_pool = FairWorkerPool(
+                "llm-worker",
+                int(max_workers) if max_workers else DEFAULT_LLM_MAX_WORKERS,
+            )
+            logger.bind(tag=TAG).info(
+                f"Khởi tạo thread pool cho lượt LLM đồng bộ: max_workers={_llm_pool.max_workers}"
+            )
+        return _llm_pool
+
+
+_worker_local = threading.local()
+
+
+def run_in_worker_loop(coro):
+    """Chạy coroutine trên event loop cố định của thread hiện tại (tái sử dụng, không tạo loop cho mỗi lần gọi)"""
+    loop = getattr(_worker_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _worker_local.loop = loop
+    return loop.run_until_complete(coro)
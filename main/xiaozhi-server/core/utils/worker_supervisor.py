@@ -0,0 +1,269 @@
+"""
+Chế độ đa process: tiến trình chính tạo N worker, mỗi worker chạy WebSocketServer và SimpleHttpServer riêng
+trên cùng cổng nhờ SO_REUSEPORT (kernel chia kết nối giữa các worker), nhờ đó tận dụng được nhiều CPU dù có GIL
+Tiến trình chính chỉ giám sát: khởi động lại worker bị thoát bất thường và ghi log thống kê của từng worker
+Ngoài worker, tiến trình chính còn có thể giám sát các dịch vụ phụ (ví dụ model server dùng chung), được khởi động trước worker
+"""
+
+import os
+import sys
+import time
+import queue
+import signal
+import socket
+import multiprocessing
+from typing import Callable, Dict, Optional, Tuple
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+# Worker thoát trong khoảng này sau khi khởi động được xem là lỗi khởi động, thời gian chờ khởi động lại tăng dần
+MIN_UPTIME_SECONDS = 10
+MAX_RESTART_DELAY = 60
+
+
+def reuse_port_supported() -> bool:
+    """SO_REUSEPORT chỉ có trên Linux/BSD/macOS (Windows không hỗ trợ)"""
+    return sys.platform != "win32" and hasattr(socket, "SO_REUSEPORT")
+
+
+def get_worker_count(config: dict) -> int:
+    server_config = config.get("server") or {}
+    try:
+        workers = int(server_config.get("workers") or 1)
+    except (TypeError, ValueError):
+        workers = 1
+    if workers <= 0:
+        # 0 hoặc số âm: dùng số CPU
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def read_process_stats(pid: Optional[int] = None) -> Dict[str, float]:
+    """Đọc số thread và RSS của một process từ /proc (Linux), trả về 0 nếu không đọc được"""
+    stats = {"threads": 0, "rss_mb": 0.0}
+    try:
+        with open(f"/proc/{pid or 'self'}/status", "r") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    stats["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return stats
+
+
+def running_as_worker(config: dict) -> bool:
+    """Process hiện tại là worker của WorkerSupervisor (tiến trình chính đặt server.reuse_port)"""
+    return bool((config.get("server") or {}).get("reuse_port"))
+
+
+def request_supervisor_restart():
+    """Worker yêu cầu tiến trình giám sát khởi động lại toàn bộ server (SIGHUP tới tiến trình cha)"""
+    os.kill(os.getppid(), signal.SIGHUP)
+
+
+class _WorkerSlot:
+    __slots__ = (
+        "index", "name", "target", "args", "process", "started_at",
+        "restarts", "restart_delay", "restart_at", "stats",
+    )
+
+    def __init__(self, index: int, name: str, target: Callable, args: Tuple):
+        self.index = index
+        self.name = name
+        self.target = target
+        self.args = args
+        self.process = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.restart_delay = 1.0
+        self.restart_at = 0.0
+        self.stats: Dict = {}
+
+
+class WorkerSupervisor:
+    """Tạo và giám sát các worker process"""
+
+    def __init__(
+        self,
+        config: dict,
+        workers: int,
+        target: Callable,
+        services: Optional[Dict[str, Callable]] = None,
+    ):
+        """
+        Args:
+            config: Cấu hình đã chuẩn bị ở tiến trình chính (auth_key phải giống nhau giữa các worker)
+            workers: Số worker
+            target: Hàm chạy trong worker, nhận (worker_id, config, stats_queue), phải import được ở cấp module
+            services: Dịch vụ phụ {tên: hàm nhận (config)}, khởi động trước worker và cũng được khởi động lại khi thoát
+        """
+        self.config = config
+        self.workers = workers
+        self.target = target
+        server_config = config.get("server") or {}
+        self.stats_interval = float(server_config.get("worker_stats_interval", 60) or 0)
+        # Dùng spawn để worker không kế thừa thread/lock của tiến trình chính
+        self._ctx = multiprocessing.get_context("spawn")
+        self.stats_queue = self._ctx.Queue()
+        self._slots = [
+            _WorkerSlot(i, f"Worker {i}", target, (i, config, self.stats_queue))
+            for i in range(workers)
+        ]
+        self._services = [
+            _WorkerSlot(-1, f"Dịch vụ {name}", service_target, (config,))
+            for name, service_target in (services or {}).items()
+        ]
+        self._stopping = False
+        self._restart_requested = False
+        self._last_stats_log = time.monotonic()
+
+    def _start_worker(self, slot: _WorkerSlot):
+        process = self._ctx.Process(
+            target=slot.target,
+            args=slot.args,
+            name=(
+                f"xiaozhi-worker-{slot.index}" if slot.index >= 0
+                else f"xiaozhi-{slot.name.split()[-1]}"
+            ),
+            daemon=False,
+        )
+        process.start()
+        slot.process = process
+        slot.started_at = time.monotonic()
+        slot.restart_at = 0.0
+        logger.bind(tag=TAG).info(f"{slot.name} đã khởi động, pid={process.pid}")
+
+    def _handle_signal(self, signum, frame):
+        self._stopping = True
+
+    def _handle_restart_signal(self, signum, frame):
+        # Lệnh khởi động lại từ thiết bị (qua worker): dừng mọi worker và dịch vụ rồi chạy lại chính tiến trình giám sát
+        self._restart_requested = True
+        self._stopping = True
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for slot in self._services + self._slots:
+            process = slot.process
+            if process is not None and process.is_alive():
+                # Chạy ổn định đủ lâu thì đặt lại thời gian chờ khởi động lại
+                if now - slot.started_at > MIN_UPTIME_SECONDS:
+                    slot.restart_delay = 1.0
+                continue
+
+            if process is not None:
+                exitcode = process.exitcode
+                process.join(timeout=0)
+                slot.process = None
+                uptime = now - slot.started_at
+                if uptime < MIN_UPTIME_SECONDS:
+                    slot.restart_delay = min(slot.restart_delay * 2, MAX_RESTART_DELAY)
+                slot.restart_at = now + slot.restart_delay
+                logger.bind(tag=TAG).error(
+                    f"{slot.name} (pid={process.pid}) thoát bất thường, exitcode={exitcode}, "
+                    f"thời gian chạy {uptime:.1f} giây, sẽ khởi động lại sau {slot.restart_delay:.0f} giây"
+                )
+
+            if slot.process is None and now >= slot.restart_at:
+                slot.restarts += 1
+                self._start_worker(slot)
+
+    def _drain_stats(self):
+        while True:
+            try:
+                stats = self.stats_queue.get_nowait()
+            except queue.Empty:
+                break
+            except (EOFError, OSError):
+                break
+            index = stats.get("worker")
+            if isinstance(index, int) and 0 <= index < len(self._slots):
+                self._slots[index].stats = stats
+
+        if self.stats_interval <= 0:
+            return
+        now = time.monotonic()
+        if now - self._last_stats_log < self.stats_interval:
+            return
+        self._last_stats_log = now
+        total_connections = 0
+        for slot in self._slots:
+            stats = slot.stats
+            alive = slot.process is not None and slot.process.is_alive()
+            total_connections += stats.get("connections", 0) if alive else 0
+            logger.bind(tag=TAG).info(
+                f"Worker {slot.index}: pid={slot.process.pid if alive else '-'}, "
+                f"kết nối={stats.get('connections', 0)}, thread={stats.get('threads', 0)}, "
+                f"RSS={stats.get('rss_mb', 0)}MB, việc chờ trong pool={stats.get('pool_pending', 0)}, "
+                f"kết nối bị từ chối={stats.get('rejected', 0)}, "
+                f"pool WebSocket ASR hit/miss={stats.get('ws_pool_hits', 0)}/{stats.get('ws_pool_misses', 0)} "
+                f"({stats.get('ws_pool_hit_rate', 0):.0%}), "
+                f"số lần khởi động lại={slot.restarts}"
+            )
+        logger.bind(tag=TAG).info(
+            f"Tổng số kết nối trên {self.workers} worker: {total_connections}"
+        )
+
+    def get_stats(self):
+        """Thống kê mới nhất của từng worker"""
+        return [
+            {
+                "worker": slot.index,
+                "pid": slot.process.pid if slot.process is not None else None,
+                "alive": slot.process is not None and slot.process.is_alive(),
+                "restarts": slot.restarts,
+                **slot.stats,
+            }
+            for slot in self._slots
+        ]
+
+    def _stop_workers(self, timeout: float = 10.0):
+        # Dừng worker trước, dịch vụ phụ sau (worker có thể vẫn đang dùng dịch vụ)
+        for slots in (self._slots, self._services):
+            self._stop_slots(slots, timeout)
+
+    def _stop_slots(self, slots, timeout: float):
+        for slot in slots:
+            if slot.process is not None and slot.process.is_alive():
+                slot.process.terminate()
+        deadline = time.monotonic() + timeout
+        for slot in slots:
+            if slot.process is None:
+                continue
+            slot.process.join(max(0.0, deadline - time.monotonic()))
+            if slot.process.is_alive():
+                logger.bind(tag=TAG).warning(
+                    f"{slot.name} (pid={slot.process.pid}) không thoát kịp, buộc dừng"
+                )
+                slot.process.kill()
+                slot.process.join(1.0)
+
+    def run(self):
+        """Chạy vòng giám sát cho đến khi nhận SIGINT/SIGTERM"""
+        signal.signal(signal.SIGINT, self._handle_signal)
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGHUP, self._handle_restart_signal)
+
+        logger.bind(tag=TAG).info(
+            f"Chế độ đa process: {self.workers} worker dùng chung cổng (SO_REUSEPORT)"
+        )
+        for slot in self._services + self._slots:
+            self._start_worker(slot)
+
+        try:
+            while not self._stopping:
+                time.sleep(0.5)
+                self._drain_stats()
+                self._check_workers()
+        finally:
+            logger.bind(tag=TAG).info("Đang dừng các worker...")
+            self._stop_workers()
+            if self._restart_requested:
+                # Thay thế tiến trình hiện tại (giữ nguyên pid), chỉ còn một cây server sau khi khởi động lại
+                logger.bind(tag=TAG).info("Khởi động lại server...")
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+            print("Server đã đóng, chương trình thoát.")
@@ -0,0 +1,248 @@
+"""
+Pool kết nối WebSocket dùng chung cho các dịch vụ ASR streaming
+Giữ sẵn một số kết nối đã bắt tay TLS và xác thực, khi người dùng bắt đầu nói chỉ cần lấy ra dùng ngay
+Phiên ASR của nhà cung cấp chỉ dùng một lần, nên kết nối đã lấy ra không trả lại pool
+"""
+
+import time
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+class WebSocketPool:
+    """Pool kết nối dự phòng cho một endpoint + thông tin xác thực"""
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Awaitable[Any]],
+        spares: int = 1,
+        max_idle_s: float = 8,
+        check_interval_s: float = 1,
+        stats_interval: float = 60,
+        keep_warm_s: float = 60,
+    ):
+        """
+        Khởi tạo pool
+
+        Args:
+            name: Tên pool, dùng cho log và thống kê
+            connect: Hàm bất đồng bộ tạo một kết nối mới đã xác thực
+            spares: Số kết nối dự phòng cần giữ sẵn
+            max_idle_s: Thời gian tối đa một kết nối được giữ rảnh, quá thời gian thì đóng và tạo lại
+                (nhà cung cấp thường tự đóng kết nối rảnh, URL/token ký tên cũng có hạn)
+            check_interval_s: Chu kỳ kiểm tra và bổ sung kết nối dự phòng
+            stats_interval: Khoảng thời gian ghi log thống kê (giây)
+            keep_warm_s: Kết nối dự phòng hết hạn chỉ được tạo lại nếu có lần lấy kết nối trong khoảng này (giây),
+                không có người dùng thì pool để trống thay vì đóng/mở lại kết nối tới nhà cung cấp mãi mãi
+        """
+        self.name = name
+        self._connect = connect
+        self.spares = max(0, int(spares))
+        self.max_idle_s = float(max_idle_s)
+        self.check_interval_s = float(check_interval_s)
+        self.stats_interval = stats_interval
+        self.keep_warm_s = float(keep_warm_s)
+        self._last_acquire = time.monotonic()
+
+        self._idle: List[Tuple[Any, float]] = []
+        self._connecting = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "connect_failures": 0,
+        }
+        self._last_stats_time = time.monotonic()
+        self._last_logged_total = 0
+
+    @staticmethod
+    def _is_open(ws) -> bool:
+        state = getattr(ws, "state", None)
+        if state is not None:
+            return getattr(state, "name", "") == "OPEN"
+        return not getattr(ws, "closed", False)
+
+    def _ensure_started(self, loop: asyncio.AbstractEventLoop):
+        if self._task is None or self._task.done():
+            self._loop = loop
+            self._task = loop.create_task(self._maintain())
+            logger.bind(tag=TAG).info(
+                f"Khởi động pool WebSocket {self.name}: spares={self.spares}, max_idle_s={self.max_idle_s}"
+            )
+
+    async def acquire(self):
+        """Lấy một kết nối: ưu tiên kết nối dự phòng còn hạn, nếu không có thì kết nối mới ngay"""
+        loop = asyncio.get_running_loop()
+        self._last_acquire = time.monotonic()
+        if self.spares > 0:
+            self._ensure_started(loop)
+
+        if loop is self._loop:
+            now = time.monotonic()
+            while self._idle:
+                ws, created = self._idle.pop()
+                if now - created < self.max_idle_s and self._is_open(ws):
+                    self._stats["hits"] += 1
+                    self._schedule_refill()
+                    return ws
+                self._stats["expired"] += 1
+                asyncio.create_task(self._close(ws))
+
+        self._stats["misses"] += 1
+        self._schedule_refill()
+        return await self._connect()
+
+    def _schedule_refill(self):
+        if self._loop is not None and self.spares > 0:
+            self._loop.call_soon(self._refill)
+
+    def _refill(self):
+        """Bổ sung kết nối dự phòng cho đủ số lượng"""
+        missing = self.spares - len(self._idle) - self._connecting
+        for _ in range(max(0, missing)):
+            self._connecting += 1
+            self._loop.create_task(self._open_spare())
+
+    async def _open_spare(self):
+        try:
+            ws = await self._connect()
+            self._idle.append((ws, time.monotonic()))
+        except Exception as e:
+            self._stats["connect_failures"] += 1
+            logger.bind(tag=TAG).warning(f"Pool {self.name} tạo kết nối dự phòng thất bại: {e}")
+            # Tránh kết nối lại liên tục khi dịch vụ lỗi
+            await asyncio.sleep(self.check_interval_s * 5)
+        finally:
+            self._connecting -= 1
+
+    async def _close(self, ws):
+        try:
+            await asyncio.wait_for(ws.close(), timeout=2)
+        except Exception:
+            pass
+
+    async def _maintain(self):
+        """Định kỳ thu hồi kết nối hết hạn/đã đóng và bổ sung kết nối dự phòng"""
+        while True:
+            try:
+                now = time.monotonic()
+                alive = []
+                for ws, created in self._idle:
+                    if now - created < self.max_idle_s and self._is_open(ws):
+                        alive.append((ws, created))
+                    else:
+                        self._stats["expired"] += 1
+                        asyncio.create_task(self._close(ws))
+                self._idle = alive
+                # Chỉ giữ kết nối dự phòng khi gần đây có phiên sử dụng, sau khi lấy kết nối luôn bổ sung ngay
+                if now - self._last_acquire < self.keep_warm_s:
+                    self._refill()
+                self._maybe_log_stats()
+                await asyncio.sleep(self.check_interval_s)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.bind(tag=TAG).error(f"Pool {self.name} bảo trì lỗi: {e}")
+                await asyncio.sleep(self.check_interval_s)
+
+    def _maybe_log_stats(self):
+        now = time.monotonic()
+        if now - self._last_stats_time < self.stats_interval:
+            return
+        self._last_stats_time = now
+        stats = self.get_stats()
+        total = stats["hits"] + stats["misses"]
+        # Chỉ ghi log khi có phiên mới kể từ lần ghi trước, tránh log lặp khi rảnh
+        if total == self._last_logged_total:
+            return
+        self._last_logged_total = total
+        logger.bind(tag=TAG).info(f"Thống kê pool WebSocket {self.name}: {stats}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Lấy thống kê của pool"""
+        hits = self._stats["hits"]
+        misses = self._stats["misses"]
+        total = hits + misses
+        return {
+            "name": self.name,
+            "idle": len(self._idle),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0,
+            "expired": self._stats["expired"],
+            "connect_failures": self._stats["connect_failures"],
+        }
+
+    async def stop(self):
+        """Dừng pool và đóng các kết nối dự phòng"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        idle, self._idle = self._idle, []
+        for ws, _ in idle:
+            await self._close(ws)
+
+
+_pools: Dict[str, WebSocketPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_ws_pool(
+    key: str, connect: Callable[[], Awaitable[Any]], config: dict = None
+) -> WebSocketPool:
+    """Lấy pool dùng chung của cả process theo key (endpoint + định danh xác thực)
+
+    :param key: Khóa định danh pool
+    :param connect: Hàm tạo kết nối, chỉ dùng khi pool chưa tồn tại. Pool sống cùng process nên hàm này
+        chỉ được giữ giá trị cấu hình (URL, thông tin xác thực), không được giữ provider của một phiên
+    :param config: Cấu hình provider, đọc ws_pool_size, ws_pool_max_idle_s và ws_pool_keep_warm_s
+    """
+    config = config or {}
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            spares = config.get("ws_pool_size", "1")
+            max_idle_s = config.get("ws_pool_max_idle_s", "8")
+            keep_warm_s = config.get("ws_pool_keep_warm_s", "60")
+            pool = WebSocketPool(
+                key.split(":")[0],
+                connect,
+                spares=int(spares) if spares not in (None, "") else 1,
+                max_idle_s=float(max_idle_s) if max_idle_s else 8,
+                keep_warm_s=float(keep_warm_s) if keep_warm_s not in (None, "") else 60,
+            )
+            _pools[key] = pool
+        return pool
+
+
+def get_all_pool_stats() -> List[Dict[str, Any]]:
+    """Thống kê của tất cả pool trong process"""
+    with _pools_lock:
+        return [pool.get_stats() for pool in _pools.values()]
+
+
+def get_pool_summary() -> Dict[str, Any]:
+    """Tổng hợp số lần lấy được kết nối dự phòng (hits) và phải kết nối mới (misses) của mọi pool"""
+    hits = misses = 0
+    for stats in get_all_pool_stats():
+        hits += stats["hits"]
+        misses += stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / total, 3) if total else 0,
+    }
@@ -33,6 +33,8 @@ _setup_websockets_logger()
 from core.connection import ConnectionHandler
 from config.config_loader import get_config_from_api_async
 from core.auth import AuthManager, AuthenticationError
+from core.utils.admission import AdmissionController, CLOSE_CODE_TRY_AGAIN_LATER
+from core.utils.provider_scheduler import get_provider_scheduler
 from core.utils.modules_initialize import initialize_modules
 from core.utils.util import check_vad_update, check_asr_update
 
@@ -44,6 +46,12 @@ class WebSocketServer:
         self.config = config
         self.logger = setup_logging()
         self.config_lock = asyncio.Lock()
+        # Số kết nối đang mở trên process này (dùng cho thống kê worker)
+        self.active_connections = 0
+        # Giới hạn tiếp nhận kết nối khi server quá tải
+        self.admission = AdmissionController(self.config)
+        # Giới hạn đồng thời theo provider dùng chung cho cả process
+        get_provider_scheduler(self.config)
         modules = initialize_modules(
             self.logger,
             self.config,
@@ -72,9 +80,15 @@ class WebSocketServer:
         server_config = self.config["server"]
         host = server_config.get("ip", "0.0.0.0")
         port = int(server_config.get("port", 8000))
+        # Chế độ đa process: các worker cùng lắng nghe một cổng, kernel chia kết nối
+        reuse_port = bool(server_config.get("reuse_port", False))
 
         async with websockets.serve(
-            self._handle_connection, host, port, process_request=self._http_response
+            self._handle_connection,
+            host,
+            port,
+            process_request=self._http_response,
+            reuse_port=reuse_port or None,
         ):
             await asyncio.Future()
 
@@ -113,21 +127,37 @@ class WebSocketServer:
             await websocket.send("Xác thực thất bại")
             await websocket.close()
             return
-        # Khi tạo ConnectionHandler, truyền vào instance server hiện tại
-        handler = ConnectionHandler(
-            self.config,
-            self._vad,
-            self._asr,
-            self._llm,
-            self._memory,
-            self._intent,
-            self,  # Truyền vào instance server
-        )
+
+        # Kiểm tra tải trước khi tạo ConnectionHandler, quá tải thì đóng với mã 1013 để thiết bị thử lại sau
+        reject_reason = await self.admission.acquire()
+        if reject_reason is not None:
+            try:
+                await websocket.close(
+                    code=CLOSE_CODE_TRY_AGAIN_LATER,
+                    reason=f"server busy ({reject_reason}), retry later",
+                )
+            except Exception:
+                pass
+            return
+
+        self.active_connections += 1
         try:
+            # Khi tạo ConnectionHandler, truyền vào instance server hiện tại
+            handler = ConnectionHandler(
+                self.config,
+                self._vad,
+                self._asr,
+                self._llm,
+                self._memory,
+                self._intent,
+                self,  # Truyền vào instance server
+            )
             await handler.handle_connection(websocket)
         except Exception as e:
             self.logger.bind(tag=TAG).error(f"Lỗi khi xử lý kết nối: {e}")
         finally:
+            self.active_connections -= 1
+            self.admission.release()
             # Buộc đóng kết nối (nếu chưa đóng)
             try:
                 # Kiểm tra trạng thái WebSocket một cách an toàn và đóng
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import os
+import statistics
+import sys
+import time
+import wave
+from typing import List
+from tabulate import tabulate
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.insert(0, project_root)
+
+import numpy as np
+from pydub import AudioSegment
+from core.utils.audio_decode import decode_to_pcm
+
+description = "So sánh thời gian giải mã audio TTS bằng pydub (ffmpeg) và giải mã trong process"
+
+
+class AudioDecodeTester:
+    """
+    Giải mã cùng một file audio nhiều lần bằng hai cách, đo thời gian mỗi lần:
+    - pydub: AudioSegment.from_file tạo tiến trình ffmpeg, sau đó chuyển mono/tần số/16-bit
+    - trong process: core.utils.audio_decode.decode_to_pcm (wave, PCM thô, miniaudio cho MP3)
+    """
+
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+
+    @staticmethod
+    def make_wav(seconds: float, src_rate: int) -> bytes:
+        """Tạo file WAV mẫu (tiếng sin 440Hz, stereo) khi không chỉ định file"""
+        t = np.arange(int(seconds * src_rate)) / src_rate
+        tone = (np.sin(2 * np.pi * 440 * t) * 12000).astype("<i2")
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(src_rate)
+            wav_file.writeframes(np.repeat(tone, 2).tobytes())
+        return buffer.getvalue()
+
+    def _pydub(self, data: bytes, file_type: str) -> bytes:
+        audio = AudioSegment.from_file(
+            io.BytesIO(data), format=file_type, parameters=["-nostdin"]
+        )
+        audio = audio.set_channels(1).set_frame_rate(self.sample_rate).set_sample_width(2)
+        return audio.raw_data
+
+    def _in_process(self, data: bytes, file_type: str) -> bytes:
+        pcm = decode_to_pcm(data, file_type, self.sample_rate)
+        if pcm is None:
+            raise RuntimeError(
+                f"Định dạng {file_type} không giải mã được trong process (MP3 cần cài miniaudio)"
+            )
+        return pcm
+
+    @staticmethod
+    def _summary(name: str, times: List[float], size: int):
+        ordered = sorted(times)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return [
+            name,
+            len(times),
+            f"{statistics.mean(ordered):.2f}",
+            f"{statistics.median(ordered):.2f}",
+            f"{p95:.2f}",
+            size,
+        ]
+
+    def run(self, data: bytes, file_type: str, iterations: int):
+        rows = []
+        results = {}
+        for name, decode in (("pydub (ffmpeg)", self._pydub), ("Trong process", self._in_process)):
+            times = []
+            pcm = b""
+            for _ in range(iterations):
+                start = time.perf_counter()
+                pcm = decode(data, file_type)
+                times.append((time.perf_counter() - start) * 1000)
+            results[name] = (statistics.mean(times), pcm)
+            rows.append(self._summary(name, times, len(pcm)))
+
+        print(
+            tabulate(
+                rows,
+                headers=["Cách giải mã", "Số lần", "TB (ms)", "P50 (ms)", "P95 (ms)", "Byte PCM"],
+                tablefmt="github",
+            )
+        )
+        (old_avg, old_pcm), (new_avg, new_pcm) = results.values()
+        if new_avg > 0:
+            print(f"\nNhanh hơn {old_avg / new_avg:.1f} lần")
+        # Độ dài PCM có thể lệch vài mẫu do cách làm tròn khi chuyển tần số
+        diff = abs(len(old_pcm) - len(new_pcm)) // 2
+        print(f"Chênh lệch độ dài: {diff} mẫu")
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Công cụ so sánh thời gian giải mã audio TTS")
+    parser.add_argument("--file", help="File audio cần giải mã (wav/mp3/pcm), mặc định tạo file WAV mẫu")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Tần số lấy mẫu đích")
+    parser.add_argument("--source-rate", type=int, default=24000, help="Tần số lấy mẫu của file WAV mẫu")
+    parser.add_argument("--seconds", type=float, default=3, help="Độ dài (giây) của file WAV mẫu")
+    parser.add_argument("--iterations", type=int, default=50, help="Số lần giải mã mỗi cách")
+
+    args = parser.parse_args()
+    if args.file:
+        with open(args.file, "rb") as f:
+            data = f.read()
+        file_type = os.path.splitext(args.file)[1].lstrip(".")
+    else:
+        data = AudioDecodeTester.make_wav(args.seconds, args.source_rate)
+        file_type = "wav"
+    print(f"Định dạng: {file_type}, kích thước: {len(data)} byte, tần số đích: {args.sample_rate}Hz")
+    AudioDecodeTester(args.sample_rate).run(data, file_type, args.iterations)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+import websockets
+from typing import Dict, List, Optional
+from tabulate import tabulate
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.insert(0, project_root)
+
+from config.settings import load_config
+
+description = "Kiểm tra số thread và bộ nhớ (RSS) của server theo số lượng kết nối"
+
+
+class ConnectionScaleTester:
+    def __init__(self, url: Optional[str] = None, pid: Optional[int] = None, token: str = ""):
+        self.config = load_config()
+        port = self.config.get("server", {}).get("port", 8000)
+        self.url = url or f"ws://127.0.0.1:{port}/xiaozhi/v1/"
+        self.pid = pid or self._find_server_pid()
+        self.token = token
+        self.connections: List = []
+        self.reader_tasks: List[asyncio.Task] = []
+        self.results = []
+
+    @staticmethod
+    def _find_server_pid() -> Optional[int]:
+        """Tìm tiến trình server (python ... app.py) trong /proc"""
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit() or int(entry) == os.getpid():
+                continue
+            try:
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    cmdline = f.read().replace(b"\x00", b" ").decode(errors="ignore")
+            except OSError:
+                continue
+            if "python" in cmdline and "app.py" in cmdline:
+                return int(entry)
+        return None
+
+    def _read_process_stats(self) -> Dict[str, float]:
+        """Đọc số thread và RSS của tiến trình server từ /proc/<pid>/status"""
+        stats = {"threads": 0, "rss_mb": 0.0}
+        with open(f"/proc/{self.pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    stats["threads"] = int(line.split()[1])
+                elif line.startswith("VmRSS:"):
+                    stats["rss_mb"] = int(line.split()[1]) / 1024
+        return stats
+
+    async def _drain(self, ws):
+        """Đọc và bỏ qua tin nhắn từ server để kết nối không bị nghẽn"""
+        try:
+            async for _ in ws:
+                pass
+        except Exception:
+            pass
+
+    async def _open_connection(self, index: int):
+        device_id = f"perf-{index:05d}-{uuid.uuid4().hex[:6]}"
+        headers = {
+            "device-id": device_id,
+            "client-id": str(uuid.uuid4()),
+            "protocol-version": "1",
+        }
+        if self.token:
+            headers["authorization"] = f"Bearer {self.token}"
+        ws = await websockets.connect(self.url, additional_headers=headers, max_size=None)
+        hello = {
+            "type": "hello",
+            "version": 1,
+            "transport": "websocket",
+            "audio_params": {
+                "format": "opus",
+                "sample_rate": 16000,
+                "channels": 1,
+                "frame_duration": 60,
+            },
+        }
+        await ws.send(json.dumps(hello))
+        self.connections.append(ws)
+        self.reader_tasks.append(asyncio.create_task(self._drain(ws)))
+
+    async def _grow_to(self, target: int, batch: int = 20):
+        """Mở thêm kết nối cho đến khi đạt target, mỗi lần mở song song một nhóm"""
+        failures = 0
+        while len(self.connections) < target:
+            count = min(batch, target - len(self.connections))
+            start = len(self.connections)
+            results = await asyncio.gather(
+                *(self._open_connection(start + i) for i in range(count)),
+                return_exceptions=True,
+            )
+            errors = [r for r in results if isinstance(r, Exception)]
+            failures += len(errors)
+            if errors and len(errors) == count:
+                print(f"Mở kết nối thất bại: {errors[0]}")
+                break
+        return failures
+
+    async def _close_all(self):
+        for task in self.reader_tasks:
+            task.cancel()
+        await asyncio.gather(
+            *(ws.close() for ws in self.connections), return_exceptions=True
+        )
+        self.connections.clear()
+        self.reader_tasks.clear()
+
+    async def run(self, steps: List[int], hold: float):
+        if not self.pid:
+            print("Không tìm thấy tiến trình server, vui lòng chỉ định --pid")
+            return
+        print(f"Địa chỉ kiểm tra: {self.url}")
+        print(f"PID server: {self.pid}")
+
+        baseline = self._read_process_stats()
+        self.results.append([0, baseline["threads"], f"{baseline['rss_mb']:.1f}", "-", "-", 0, "-"])
+
+        try:
+            for target in steps:
+                start_time = time.time()
+                failures = await self._grow_to(target)
+                open_time = time.time() - start_time
+                # Chờ server khởi tạo xong component của các kết nối rồi mới đo
+                await asyncio.sleep(hold)
+                stats = self._read_process_stats()
+                opened = len(self.connections)
+                if opened == 0:
+                    break
+                threads_per_conn = (stats["threads"] - baseline["threads"]) / opened
+                rss_per_conn_kb = (stats["rss_mb"] - baseline["rss_mb"]) * 1024 / opened
+                self.results.append(
+                    [
+                        opened,
+                        stats["threads"],
+                        f"{stats['rss_mb']:.1f}",
+                        f"{threads_per_conn:.2f}",
+                        f"{rss_per_conn_kb:.0f}",
+                        failures,
+                        f"{open_time:.2f}",
+                    ]
+                )
+                print(f"Đã mở {opened} kết nối, thread={stats['threads']}, RSS={stats['rss_mb']:.1f}MB")
+                if opened < target:
+                    break
+        finally:
+            await self._close_all()
+
+        print(
+            tabulate(
+                self.results,
+                headers=[
+                    "Số kết nối",
+                    "Thread",
+                    "RSS (MB)",
+                    "Thread/kết nối",
+                    "RSS/kết nối (KB)",
+                    "Thất bại",
+                    "Thời gian mở (s)",
+                ],
+                tablefmt="github",
+            )
+        )
+        print("\nThread/kết nối và RSS/kết nối được tính theo phần tăng so với lúc chưa có kết nối")
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Công cụ kiểm tra số thread và bộ nhớ theo số lượng kết nối")
+    parser.add_argument("--url", help="Địa chỉ websocket của server, mặc định ws://127.0.0.1:<port>/xiaozhi/v1/")
+    parser.add_argument("--pid", type=int, help="PID tiến trình server, mặc định tự tìm tiến trình app.py")
+    parser.add_argument("--steps", default="10,50,100,200", help="Các mốc số kết nối, phân tách bằng dấu phẩy")
+    parser.add_argument("--hold", type=float, default=5, help="Thời gian chờ (giây) trước khi đo ở mỗi mốc")
+    parser.add_argument("--token", default="", help="Token xác thực (nếu server bật auth)")
+
+    args = parser.parse_args()
+    steps = sorted(int(s) for s in args.steps.split(",") if s.strip())
+    await ConnectionScaleTester(args.url, args.pid, args.token).run(steps, args.hold)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+import websockets
+from typing import List, Optional
+from tabulate import tabulate
+
+# Thêm thư mục gốc dự án vào đường dẫn Python
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, ".."))
+sys.path.insert(0, project_root)
+
+from config.settings import load_config
+
+description = "Kiểm tra độ trễ event loop của server khi các kết nối khác đang nhận dạng ý định"
+
+
+class LoopLagTester:
+    """
+    Kết nối thăm dò gửi ping định kỳ và đo thời gian nhận pong (server cần bật enable_websocket_ping)
+    Đo hai giai đoạn: lúc server rảnh và lúc các kết nối khác liên tục gửi câu hỏi kích hoạt nhận dạng ý định
+    Nếu nhận dạng ý định chặn event loop, thời gian pong ở giai đoạn hai sẽ tăng theo thời gian gọi LLM
+    """
+
+    def __init__(self, url: Optional[str] = None, token: str = ""):
+        self.config = load_config()
+        port = self.config.get("server", {}).get("port", 8000)
+        self.url = url or f"ws://127.0.0.1:{port}/xiaozhi/v1/"
+        self.token = token
+
+    def _headers(self, prefix: str):
+        headers = {
+            "device-id": f"{prefix}-{uuid.uuid4().hex[:8]}",
+            "client-id": str(uuid.uuid4()),
+            "protocol-version": "1",
+        }
+        if self.token:
+            headers["authorization"] = f"Bearer {self.token}"
+        return headers
+
+    async def _connect(self, prefix: str):
+        ws = await websockets.connect(
+            self.url, additional_headers=self._headers(prefix), max_size=None
+        )
+        hello = {
+            "type": "hello",
+            "version": 1,
+            "transport": "websocket",
+            "audio_params": {
+                "format": "opus",
+                "sample_rate": 16000,
+                "channels": 1,
+                "frame_duration": 60,
+            },
+        }
+        await ws.send(json.dumps(hello))
+        return ws
+
+    async def _probe(self, ws, duration: float, interval: float) -> List[float]:
+        """Gửi ping định kỳ, trả về danh sách thời gian chờ pong (ms)"""
+        pong_event = asyncio.Event()
+
+        async def reader():
+            try:
+                async for message in ws:
+                    if isinstance(message, str):
+                        try:
+                            if json.loads(message).get("type") == "pong":
+                                pong_event.set()
+                        except json.JSONDecodeError:
+                            pass
+            except Exception:
+                pass
+
+        reader_task = asyncio.create_task(reader())
+        rtts = []
+        end_time = time.time() + duration
+        try:
+            while time.time() < end_time:
+                pong_event.clear()
+                start = time.perf_counter()
+                await ws.send(json.dumps({"type": "ping"}))
+                try:
+                    await asyncio.wait_for(pong_event.wait(), timeout=10)
+                    rtts.append((time.perf_counter() - start) * 1000)
+                except asyncio.TimeoutError:
+                    rtts.append(10000.0)
+                await asyncio.sleep(interval)
+        finally:
+            reader_task.cancel()
+        return rtts
+
+    async def _intent_load(self, ws, text: str, stop: asyncio.Event, gap: float):
+        """Liên tục gửi câu hỏi dạng văn bản để server chạy nhận dạng ý định"""
+        async def drain():
+            try:
+                async for _ in ws:
+                    pass
+            except Exception:
+                pass
+
+        drain_task = asyncio.create_task(drain())
+        sent = 0
+        try:
+            while not stop.is_set():
+                await ws.send(json.dumps({"type": "listen", "state": "detect", "text": text}))
+                sent += 1
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=gap)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            drain_task.cancel()
+        return sent
+
+    @staticmethod
+    def _summary(name: str, rtts: List[float]):
+        if not rtts:
+            return [name, 0, "-", "-", "-"]
+        ordered = sorted(rtts)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return [
+            name,
+            len(rtts),
+            f"{statistics.median(ordered):.1f}",
+            f"{p95:.1f}",
+            f"{ordered[-1]:.1f}",
+        ]
+
+    async def run(self, probes: int, loaders: int, duration: float, interval: float, text: str, gap: float):
+        print(f"Địa chỉ kiểm tra: {self.url}")
+        probe_conns = [await self._connect("lag-probe") for _ in range(probes)]
+        load_conns = []
+        try:
+            # Giai đoạn 1: server rảnh
+            baseline = await asyncio.gather(
+                *(self._probe(ws, duration, interval) for ws in probe_conns)
+            )
+            baseline_rtts = [v for rtts in baseline for v in rtts]
+            if baseline_rtts and min(baseline_rtts) >= 10000:
+                print("Không nhận được pong, vui lòng bật enable_websocket_ping trong cấu hình server")
+                return
+
+            # Giai đoạn 2: các kết nối khác chạy nhận dạng ý định
+            load_conns = [await self._connect("lag-intent") for _ in range(loaders)]
+            stop = asyncio.Event()
+            load_tasks = [
+                asyncio.create_task(self._intent_load(ws, text, stop, gap))
+                for ws in load_conns
+            ]
+            loaded = await asyncio.gather(
+                *(self._probe(ws, duration, interval) for ws in probe_conns)
+            )
+            stop.set()
+            sent = sum(await asyncio.gather(*load_tasks))
+            loaded_rtts = [v for rtts in loaded for v in rtts]
+        finally:
+            await asyncio.gather(
+                *(ws.close() for ws in probe_conns + load_conns),
+                return_exceptions=True,
+            )
+
+        print(
+            tabulate(
+                [
+                    self._summary("Server rảnh", baseline_rtts),
+                    self._summary("Đang nhận dạng ý định", loaded_rtts),
+                ],
+                headers=["Giai đoạn", "Số ping", "P50 (ms)", "P95 (ms)", "Max (ms)"],
+                tablefmt="github",
+            )
+        )
+        print(f"\nĐã gửi {sent} câu hỏi kích hoạt nhận dạng ý định")
+        if baseline_rtts and loaded_rtts:
+            base_p95 = float(self._summary("", baseline_rtts)[3])
+            load_p95 = float(self._summary("", loaded_rtts)[3])
+            if load_p95 > max(base_p95 * 5, base_p95 + 200):
+                print("Cảnh báo: độ trễ pong tăng mạnh khi nhận dạng ý định, event loop có thể đang bị chặn")
+            else:
+                print("Event loop không bị chặn bởi nhận dạng ý định")
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Công cụ kiểm tra độ trễ event loop khi nhận dạng ý định")
+    parser.add_argument("--url", help="Địa chỉ websocket của server, mặc định ws://127.0.0.1:<port>/xiaozhi/v1/")
+    parser.add_argument("--token", default="", help="Token xác thực (nếu server bật auth)")
+    parser.add_argument("--probes", type=int, default=3, help="Số kết nối thăm dò gửi ping")
+    parser.add_argument("--loaders", type=int, default=3, help="Số kết nối gửi câu hỏi kích hoạt nhận dạng ý định")
+    parser.add_argument("--duration", type=float, default=15, help="Thời gian đo (giây) mỗi giai đoạn")
+    parser.add_argument("--interval", type=float, default=0.1, help="Khoảng cách (giây) giữa các lần ping")
+    parser.add_argument("--gap", type=float, default=2, help="Khoảng cách (giây) giữa các câu hỏi của mỗi kết nối tải")
+    parser.add_argument("--text", default="Bật nhạc cho tôi nghe", help="Câu hỏi dùng để kích hoạt nhận dạng ý định")
+
+    args = parser.parse_args()
+    await LoopLagTester(args.url, args.token).run(
+        args.probes, args.loaders, args.duration, args.interval, args.text, args.gap
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,6 @@
 from plugins_func.register import register_function, ToolType, ActionResponse, Action
 from plugins_func.functions.hass_init import initialize_hass_handler
 from config.logger import setup_logging
-import asyncio
 import requests
 from typing import TYPE_CHECKING
 
@@ -39,11 +38,8 @@ hass_play_music_function_desc = {
 )
 def hass_play_music(conn: "ConnectionHandler", entity_id="", media_content_id="random"):
     try:
-        # Thực thi lệnh phát nhạc
-        future = asyncio.run_coroutine_threadsafe(
-            handle_hass_play_music(conn, entity_id, media_content_id), conn.loop
-        )
-        ha_response = future.result()
+        # Thực thi lệnh phát nhạc (plugin đồng bộ, chạy trong thread pool của plugin, không chặn event loop)
+        ha_response = handle_hass_play_music(conn, entity_id, media_content_id)
         return ActionResponse(
             action=Action.RESPONSE, result="Ý định thoát đã được xử lý", response=ha_response
         )
@@ -51,7 +47,7 @@ def hass_play_music(conn: "ConnectionHandler", entity_id="", media_content_id="r
         logger.bind(tag=TAG).error(f"Lỗi xử lý ý định phát nhạc: {e}")
 
 
-async def handle_hass_play_music(
+def handle_hass_play_music(
     conn: "ConnectionHandler", entity_id, media_content_id
 ):
     ha_config = initialize_hass_handler(conn)
@@ -60,7 +56,7 @@ async def handle_hass_play_music(
     url = f"{base_url}/api/services/music_assistant/play_media"
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     data = {"entity_id": entity_id, "media_id": media_content_id}
-    response = requests.post(url, headers=headers, json=data)
+    response = requests.post(url, headers=headers, json=data, timeout=5)
     if response.status_code == 200:
         return f"Đang phát nhạc {media_content_id}"
     else:
@@ -38,20 +38,13 @@ play_music_function_desc = {
 
 
 @register_function("play_music", play_music_function_desc, ToolType.SYSTEM_CTL)
-def play_music(conn: "ConnectionHandler", song_name: str):
+async def play_music(conn: "ConnectionHandler", song_name: str):
     try:
         music_intent = (
             f"Phát nhạc {song_name}" if song_name != "random" else "Phát nhạc ngẫu nhiên"
         )
 
-        # Kiểm tra trạng thái vòng lặp sự kiện
-        if not conn.loop.is_running():
-            conn.logger.bind(tag=TAG).error("Vòng lặp sự kiện chưa chạy, không thể gửi tác vụ")
-            return ActionResponse(
-                action=Action.RESPONSE, result="Hệ thống đang bận", response="Vui lòng thử lại sau"
-            )
-
-        # Gửi tác vụ bất đồng bộ
+        # Plugin async chạy trên event loop của kết nối, tạo tác vụ phát nhạc trực tiếp
         task = conn.loop.create_task(
             handle_music_command(conn, music_intent)  # Đóng gói logic bất đồng bộ
         )
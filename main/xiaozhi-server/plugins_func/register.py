@@ -1,3 +1,4 @@
+import inspect
 from config.logger import setup_logging
 from enum import Enum
 
@@ -42,11 +43,16 @@ class ActionResponse:
 
 
 class FunctionItem:
-    def __init__(self, name, description, func, type):
+    def __init__(self, name, description, func, type, timeout=None, max_concurrency=None):
         self.name = name
         self.description = description
         self.func = func
         self.type = type
+        # Hàm async chạy trực tiếp trên event loop, hàm đồng bộ chạy trong thread pool của plugin
+        self.is_async = inspect.iscoroutinefunction(func)
+        # Thời gian chờ (giây) và số lần gọi đồng thời tối đa, None thì dùng giá trị trong cấu hình
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
 
 
 class DeviceTypeRegistry:
@@ -79,11 +85,17 @@ class DeviceTypeRegistry:
 all_function_registry = {}
 
 
-def register_function(name, desc, type=None):
-    """Decorator đăng ký hàm vào từ điển đăng ký hàm"""
+def register_function(name, desc, type=None, timeout=None, max_concurrency=None):
+    """
+    Decorator đăng ký hàm vào từ điển đăng ký hàm
+    Hỗ trợ cả hàm đồng bộ và hàm async (async def)
+    timeout/max_concurrency: giới hạn riêng của plugin, có thể ghi đè bằng plugins.<tên>.timeout/max_concurrency trong cấu hình
+    """
 
     def decorator(func):
-        all_function_registry[name] = FunctionItem(name, desc, func, type)
+        all_function_registry[name] = FunctionItem(
+            name, desc, func, type, timeout=timeout, max_concurrency=max_concurrency
+        )
         logger.bind(tag=TAG).debug(f"Hàm '{name}' đã được tải, có thể đăng ký sử dụng")
         return func
 